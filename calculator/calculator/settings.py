@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -11,6 +12,10 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Set PRODUCTION=1 in deployed environments; startup is refused while any
+# development-only setting is still active (see core/checks.py).
+PRODUCTION = os.environ.get("PRODUCTION", "").lower() in {"1", "true", "yes"}
+
 
 # Application definition
 
@@ -25,11 +30,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -57,14 +66,114 @@ WSGI_APPLICATION = "calculator.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE selects the database profile: "sqlite" (default) or "postgresql".
+DB_ENGINE = os.environ.get("DB_ENGINE", "sqlite").lower()
+
+if DB_ENGINE in {"postgres", "postgresql"}:
+    # Django 5.1+ connection pool (requires psycopg[pool]). The pool replaces
+    # persistent connections, so CONN_MAX_AGE is only used when it is off.
+    DB_POOL = os.environ.get("DB_POOL", "1") == "1"
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "calculator"),
+            "USER": os.environ.get("DB_USER", "calculator"),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", "localhost"),
+            "PORT": os.environ.get("DB_PORT", "5432"),
+            "CONN_MAX_AGE": 0 if DB_POOL else int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": (
+                {
+                    "pool": {
+                        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+                        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+                        "timeout": int(os.environ.get("DB_POOL_TIMEOUT", "10")),
+                    }
+                }
+                if DB_POOL
+                else {}
+            ),
+        }
+    }
+else:
+    # WAL lets readers run alongside a writer; IMMEDIATE transactions take the
+    # write lock up front so busy_timeout applies instead of failing mid-way.
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS};"
+                    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE};"
+                ),
+            },
+        }
+    }
+
+
+# Optional read replica. DB_REPLICA_NAME (a second SQLite file, or the database
+# name on DB_REPLICA_HOST for PostgreSQL) enables routing of read-only views.
+DB_REPLICA_NAME = os.environ.get("DB_REPLICA_NAME")
+DB_REPLICA_ALIAS = "replica"
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get("DB_REPLICA_STICKY_SECONDS", "10"))
+
+if DB_REPLICA_NAME:
+    DATABASES[DB_REPLICA_ALIAS] = {
+        **DATABASES["default"],
+        "NAME": DB_REPLICA_NAME,
+        "HOST": os.environ.get("DB_REPLICA_HOST", DATABASES["default"].get("HOST", "")),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_ROUTERS = ["core.db_routers.PrimaryReplicaRouter"]
+
+
+# Cache
+# CACHE_BACKEND selects "file" (default), "redis" or "locmem". CACHE_LOCATION
+# is the cache directory, or the Redis URL (e.g. redis://127.0.0.1:6379/1;
+# requires redis-py). The default is shared by every worker on the host, so
+# the cached user lookup below stays on; "locmem" is per process and turns it
+# off.
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "file").lower()
+CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "redis": "django.core.cache.backends.redis.RedisCache",
+}
+CACHE_LOCATIONS = {
+    "locmem": "calculator-default",
+    "file": str(BASE_DIR / ".cache"),
+    "redis": "redis://127.0.0.1:6379/1",
+}
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND],
+        "LOCATION": os.environ.get("CACHE_LOCATION", CACHE_LOCATIONS[CACHE_BACKEND]),
+        "TIMEOUT": 300,
     }
 }
 
 
+# Sessions and authentication are served from the cache first; the database
+# is only read on a cache miss. The user cache is skipped unless the cache is
+# shared by all workers (redis or file), so a change seen by one worker is
+# seen by all.
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+AUTHENTICATION_BACKENDS = ["core.auth_backends.CachedModelBackend"]
+AUTH_USER_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -96,6 +205,70 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Response compression (core.middleware.CompressionMiddleware)
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+
+# Per-request performance instrumentation (core.middleware.PerformanceMiddleware).
+# Budgets are keyed by URL name; the default applies to every other view.
+
+PERF_INSTRUMENTATION = os.environ.get("PERF_INSTRUMENTATION", "1" if DEBUG else "0") == "1"
+PERF_DUPLICATE_THRESHOLD = 5
+PERF_DEFAULT_BUDGET = {"queries": 30, "ms": 500}
+PERF_BUDGETS = {
+    "piece_export": {"queries": 10, "ms": 5000},
+    "piece_import": {"queries": 2000, "ms": 10000},
+}
+
+
+# Prometheus metrics at /metrics (core.metrics). Each worker process writes its
+# numbers to METRICS_DIR; the endpoint merges them. Only METRICS_ALLOWED_IPS
+# may scrape. The test runner (core.test_runner) turns METRICS_WRITE_FILES off.
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_WRITE_FILES = True
+METRICS_FLUSH_INTERVAL = 1.0
+METRICS_ALLOWED_IPS = os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+
+
+# Background tasks (core.tasks), run by `manage.py runworker`. A running task
+# whose claim is older than TASK_CLAIM_TIMEOUT seconds is taken over by another
+# worker; failed attempts are retried after TASK_RETRY_BACKOFF * 2**n seconds.
+
+TASK_CLAIM_TIMEOUT = int(os.environ.get("TASK_CLAIM_TIMEOUT", "600"))
+TASK_RETRY_BACKOFF = 10
+TASK_POLL_INTERVAL = 1.0
+
+
+# Print jobs older than this and not in inventory are moved to the archive
+# table by `manage.py archive_pieces`.
+
+PIECE_ARCHIVE_AFTER_DAYS = int(os.environ.get("PIECE_ARCHIVE_AFTER_DAYS", "365"))
+
+
+# Processes used to analyze the files of a batch quote (0 = one per CPU core).
+
+BATCH_QUOTE_WORKERS = int(os.environ.get("BATCH_QUOTE_WORKERS", "0"))
+
+
+# Analyses of uploaded model files, keyed by SHA-256 of the content. Entries
+# unused for MAX_AGE_DAYS are dropped, and only the MAX_ENTRIES most
+# recently used are kept.
+
+FILE_ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("FILE_ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+FILE_ANALYSIS_CACHE_MAX_AGE_DAYS = int(os.environ.get("FILE_ANALYSIS_CACHE_MAX_AGE_DAYS", "90"))
+
+
+# Incremental piece exports (core.changelog). Each export also re-sends the
+# changes logged this many seconds before the client's token, so a transaction
+# that commits after a newer change was exported is not skipped.
+
+PIECE_CHANGES_SAFETY_SECONDS = int(os.environ.get("PIECE_CHANGES_SAFETY_SECONDS", "300"))
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -109,3 +282,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "login"
+
+
+# Tests
+
+TEST_RUNNER = "core.test_runner.TestRunner"
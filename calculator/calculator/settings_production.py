@@ -0,0 +1,98 @@
+"""
+Production settings. Select with DJANGO_SETTINGS_MODULE=calculator.settings_production
+and PRODUCTION=1; every value that differs per deployment comes from the
+environment.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, TEMPLATES
+
+
+def env_list(name: str, default: str = "") -> list[str]:
+    return [item.strip() for item in os.environ.get(name, default).split(",") if item.strip()]
+
+
+PRODUCTION = True
+
+# With DEBUG on, every SQL statement is kept in connection.queries and errors
+# render the technical 500 page; neither belongs in production.
+DEBUG = False
+PERF_INSTRUMENTATION = os.environ.get("PERF_INSTRUMENTATION", "0") == "1"
+
+try:
+    SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
+except KeyError as exc:
+    raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set in production.") from exc
+
+ALLOWED_HOSTS = env_list("DJANGO_ALLOWED_HOSTS")
+CSRF_TRUSTED_ORIGINS = env_list("DJANGO_CSRF_TRUSTED_ORIGINS")
+
+
+# Templates: compile each template once per process. Django enables the cached
+# loader implicitly when DEBUG is off; it is spelled out here so the behaviour
+# does not depend on DEBUG. APP_DIRS must be off when loaders are given.
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        "APP_DIRS": False,
+        "OPTIONS": {
+            **TEMPLATES[0]["OPTIONS"],
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
+        },
+    },
+]
+
+
+# Sessions: the cache and cached_db engine come from the base settings
+# (CACHE_BACKEND); production only hardens the cookies.
+
+SESSION_COOKIE_SECURE = os.environ.get("DJANGO_SECURE_COOKIES", "1") == "1"
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
+
+
+# Static files: collected once with hashed names and pre-compressed .gz/.br
+# variants. SERVE_STATIC lets Django serve them when no proxy sits in front.
+
+STATIC_ROOT = os.environ.get("DJANGO_STATIC_ROOT", BASE_DIR / "staticfiles")
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "core.staticfiles.CompressedManifestStaticFilesStorage",
+    },
+}
+SERVE_STATIC = os.environ.get("DJANGO_SERVE_STATIC", "1") == "1"
+
+
+# Logging: one console handler, no SQL logging and no request bodies.
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "root": {
+        "handlers": ["console"],
+        "level": os.environ.get("DJANGO_LOG_LEVEL", "WARNING"),
+    },
+    "loggers": {
+        "django.db.backends": {"level": "WARNING", "propagate": True},
+        "django.request": {"level": "ERROR", "propagate": True},
+    },
+}
@@ -1,8 +1,16 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from core.staticfiles import serve_static
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("accounts/", include("django.contrib.auth.urls")),
     path("", include("core.urls")),
 ]
+
+if not settings.DEBUG and getattr(settings, "SERVE_STATIC", False):
+    urlpatterns.insert(
+        0, re_path(rf"^{settings.STATIC_URL.lstrip('/')}(?P<path>.*)$", serve_static)
+    )
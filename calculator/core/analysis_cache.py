@@ -0,0 +1,135 @@
+"""Persistent cache of model file analyses, keyed by SHA-256 of the content.
+
+Quote revisions and colleagues quoting the same part re-send identical
+files, so every analysis (grams, hours and geometry stats) is stored in
+``FileAnalysis`` together with the parameters that produced it. A hit skips
+parsing entirely. Uploads are hashed from the same memory map the parser
+reads, so a file is read from disk once whether it hits or misses.
+
+Entries are evicted by age (``FILE_ANALYSIS_CACHE_MAX_AGE_DAYS`` since the
+last use) and by count (only the ``FILE_ANALYSIS_CACHE_MAX_ENTRIES`` most
+recently used are kept) whenever new results are stored.
+"""
+
+import hashlib
+import mmap
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FileAnalysis
+
+DECIMAL_KEYS = {"filament_weight_g", "print_time_hours", "volume_cm3", "surface_cm2"}
+
+
+def analysis_parameters(kind: str, **params) -> str:
+    """Stable key for everything besides the content that shapes a result."""
+    values = ";".join(f"{name}={float(value):g}" for name, value in sorted(params.items()))
+    return f"{kind}:{values}"
+
+
+def restore(details: dict) -> dict:
+    """Turn the decimals the JSON encoder wrote as strings back into Decimal."""
+    analysis = {
+        key: Decimal(value) if key in DECIMAL_KEYS else value for key, value in details.items()
+    }
+    if "plates" in analysis:
+        analysis["plates"] = [restore(plate) for plate in analysis["plates"]]
+    return analysis
+
+
+def totals(analysis: dict) -> tuple[Decimal, Decimal]:
+    plates = analysis.get("plates") or [analysis]
+    return (
+        sum((plate["filament_weight_g"] for plate in plates), Decimal("0")),
+        sum((plate["print_time_hours"] for plate in plates), Decimal("0")),
+    )
+
+
+def lookup(sha256s, parameters: str) -> dict[str, dict]:
+    """Return ``{sha256: analysis}`` for the cached files and mark them used."""
+    rows = list(
+        FileAnalysis.objects.filter(sha256__in=set(sha256s), parameters=parameters).only(
+            "pk", "sha256", "details"
+        )
+    )
+    if rows:
+        FileAnalysis.objects.filter(pk__in=[row.pk for row in rows]).update(
+            last_used_at=timezone.now(), hits=F("hits") + 1
+        )
+    return {row.sha256: restore(row.details) for row in rows}
+
+
+def store(results: dict[str, tuple[int, dict]], parameters: str) -> None:
+    """Save ``{sha256: (size_bytes, analysis)}`` and evict old entries."""
+    if not results:
+        return
+    now = timezone.now()
+    entries = []
+    for sha256, (size_bytes, analysis) in results.items():
+        weight, hours = totals(analysis)
+        entries.append(
+            FileAnalysis(
+                sha256=sha256,
+                parameters=parameters,
+                size_bytes=size_bytes,
+                filament_weight_g=weight,
+                print_time_hours=hours,
+                details=analysis,
+                last_used_at=now,
+            )
+        )
+    # Another request may have stored the same file meanwhile.
+    FileAnalysis.objects.bulk_create(entries, ignore_conflicts=True)
+    evict(now)
+
+
+def evict(now=None) -> int:
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.FILE_ANALYSIS_CACHE_MAX_AGE_DAYS)
+    deleted, _ = FileAnalysis.objects.filter(last_used_at__lt=cutoff).delete()
+    boundary = (
+        FileAnalysis.objects.order_by("-last_used_at", "-pk")
+        .values_list("last_used_at", "pk")[settings.FILE_ANALYSIS_CACHE_MAX_ENTRIES :]
+        .first()
+    )
+    if boundary is not None:
+        last_used_at, pk = boundary
+        evicted, _ = FileAnalysis.objects.filter(
+            last_used_at__lte=last_used_at
+        ).exclude(last_used_at=last_used_at, pk__gt=pk).delete()
+        deleted += evicted
+    return deleted
+
+
+def cached_analysis(buffer, parameters: str, analyze_buffer) -> dict:
+    sha256 = hashlib.sha256(buffer).hexdigest()
+    hit = lookup([sha256], parameters).get(sha256)
+    if hit is not None:
+        return hit
+    analysis = analyze_buffer(buffer)
+    store({sha256: (len(buffer), analysis)}, parameters)
+    return analysis
+
+
+def analyze_upload(uploaded_file, parameters: str, analyze_buffer) -> dict:
+    """Analyze an upload with ``analyze_buffer`` unless its content is cached.
+
+    Uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are already on disk and are
+    memory-mapped from there; small in-memory uploads are read directly.
+    The parser's own error is raised for empty files.
+    """
+    path = getattr(uploaded_file, "temporary_file_path", None)
+    if path is None:
+        uploaded_file.seek(0)
+        return cached_analysis(uploaded_file.read(), parameters, analyze_buffer)
+    with open(path(), "rb") as handle:
+        try:
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return analyze_buffer(b"")
+        with buffer:
+            return cached_analysis(buffer, parameters, analyze_buffer)
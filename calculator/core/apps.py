@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import auth_backends  # noqa: F401  (connects cache invalidation)
+        from . import changelog  # noqa: F401  (logs print job changes)
+        from . import middleware  # noqa: F401  (observes the SQL queries of requests)
+        from . import pricing  # noqa: F401  (records filament price history)
+        from . import search  # noqa: F401  (registers the normalized lookup)
+        from . import tasks  # noqa: F401  (fills the task registry)
+        from .checks import check_production_settings
+
+        # System checks only run for management commands; raise here so a
+        # WSGI/ASGI server also refuses to start with debug-only settings.
+        if getattr(settings, "PRODUCTION", False):
+            errors = check_production_settings(None)
+            if errors:
+                raise ImproperlyConfigured(
+                    " ".join(f"{error.id}: {error.msg}" for error in errors)
+                )
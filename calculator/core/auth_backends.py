@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Each process has its own copy of these, so a save in one worker could not
+# drop the entry cached by another.
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+def user_cache_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def cache_is_shared() -> bool:
+    return not isinstance(caches["default"], PROCESS_LOCAL_CACHES)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that keeps the user row resolved from the session in the
+    cache, so authenticated requests skip the ``auth_user`` query.
+
+    Entries are dropped whenever the user is saved or deleted, which also
+    covers password changes and the ``last_login`` update on login. That
+    only reaches every worker through a shared cache (CACHE_BACKEND=redis or
+    file); with a per-process cache the user is read from the database on
+    every request, like ``ModelBackend``. ``QuerySet.update()`` sends no
+    signal, so users must be changed with ``save()``.
+    """
+
+    def get_user(self, user_id):
+        if not cache_is_shared():
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300))
+        return user if self.user_can_authenticate(user) else None
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
@@ -0,0 +1,198 @@
+"""Analyze every model file in a zip archive or folder in parallel.
+
+Archive members are streamed to a temporary directory and hashed on the
+way, then analyzed in a process pool so the work spreads over every core.
+Results are kept in the ``core.analysis_cache`` table by SHA-256 of the
+content, so re-sending the same file skips the analysis. A 3MF project
+yields one estimate per plate, under ``analysis["plates"]``. Pricing and
+saving the pieces is left to the caller.
+"""
+
+import hashlib
+import mmap
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.conf import settings
+
+from .gcode import GcodeError, analyze_gcode_buffer
+from .stl import (
+    DEFAULT_INFILL_PERCENTAGE,
+    DEFAULT_SHELL_THICKNESS_MM,
+    StlError,
+    analyze_stl_buffer,
+)
+from .threemf import ThreeMFError, read_3mf_plates
+
+GCODE_EXTENSIONS = {".gcode", ".gco", ".g"}
+MODEL_EXTENSIONS = GCODE_EXTENSIONS | {".stl", ".3mf"}
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ModelError(ValueError):
+    pass
+
+
+def is_model_name(name: str) -> bool:
+    path = Path(name)
+    if any(part.startswith((".", "__MACOSX")) for part in path.parts):
+        return False
+    return path.suffix.lower() in MODEL_EXTENSIONS
+
+
+def copy_and_hash(source, target: Path) -> str:
+    digest = hashlib.sha256()
+    with open(target, "wb") as handle:
+        while chunk := source.read(COPY_CHUNK_SIZE):
+            digest.update(chunk)
+            handle.write(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        while chunk := handle.read(COPY_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_model(upload, name: str, directory: Path) -> list[dict]:
+    """Copy a single uploaded model (e.g. one .3mf project) into ``directory``."""
+    target = directory / f"0{Path(name).suffix.lower()}"
+    return [{"name": name, "path": str(target), "sha256": copy_and_hash(upload, target)}]
+
+
+def extract_models(archive, directory: Path) -> list[dict]:
+    """Stream the model members of a zip file into ``directory``.
+
+    Members are written under generated names, so paths inside the archive
+    can never escape the directory. A .3mf file is itself a zip, so it is
+    stored whole instead of being opened.
+    """
+    name = getattr(archive, "name", "") or ""
+    if Path(name).suffix.lower() == ".3mf":
+        archive.seek(0)
+        return store_model(archive, Path(name).name, directory)
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as exc:
+        raise ModelError("O ficheiro nao e um arquivo zip valido.") from exc
+    models = []
+    with zip_file:
+        for info in zip_file.infolist():
+            if info.is_dir() or not is_model_name(info.filename):
+                continue
+            target = directory / f"{len(models)}{Path(info.filename).suffix.lower()}"
+            with zip_file.open(info) as member:
+                sha256 = copy_and_hash(member, target)
+            models.append({"name": info.filename, "path": str(target), "sha256": sha256})
+    return models
+
+
+def collect_folder_models(folder: Path) -> list[dict]:
+    return [
+        {"name": str(path.relative_to(folder)), "path": str(path), "sha256": hash_file(path)}
+        for path in sorted(folder.rglob("*"))
+        if path.is_file() and is_model_name(str(path.relative_to(folder)))
+    ]
+
+
+def analyze_model_file(path: str, density: float) -> dict:
+    """Analyze one file; runs inside a pool worker."""
+    suffix = Path(path).suffix.lower()
+    if os.path.getsize(path) == 0:
+        raise ModelError("O ficheiro esta vazio.")
+    if suffix == ".3mf":
+        # Zip members are streamed from the file; only metadata is read.
+        return {"plates": read_3mf_plates(path, density)}
+    with open(path, "rb") as handle, mmap.mmap(
+        handle.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buffer:
+        if suffix in GCODE_EXTENSIONS:
+            return analyze_gcode_buffer(buffer, density=density)
+        if suffix == ".stl":
+            return analyze_stl_buffer(buffer, density=density)
+    raise ModelError("Formato nao suportado.")
+
+
+def model_parameters(name: str, density: float) -> str:
+    """Cache parameters matching what ``analyze_model_file`` will do."""
+    from .analysis_cache import analysis_parameters
+
+    suffix = Path(name).suffix.lower()
+    if suffix == ".stl":
+        return analysis_parameters(
+            "stl",
+            density=density,
+            infill_percentage=DEFAULT_INFILL_PERCENTAGE,
+            shell_thickness_mm=DEFAULT_SHELL_THICKNESS_MM,
+        )
+    kind = "gcode" if suffix in GCODE_EXTENSIONS else suffix.lstrip(".")
+    return analysis_parameters(kind, density=density)
+
+
+def analyze_models(models: list[dict], density: float, workers: int | None = None) -> None:
+    """Fill ``analysis`` (or ``error``) and ``cached`` on every model dict."""
+    # Imported here: pool workers load this module without the app registry.
+    from .analysis_cache import lookup, store
+
+    by_parameters: dict[str, list[dict]] = {}
+    for model in models:
+        by_parameters.setdefault(model_parameters(model["path"], density), []).append(model)
+    cached = {
+        parameters: lookup([model["sha256"] for model in group], parameters)
+        for parameters, group in by_parameters.items()
+    }
+    pending = []
+    for model in models:
+        hit = cached[model_parameters(model["path"], density)].get(model["sha256"])
+        model["cached"] = hit is not None
+        if hit is not None:
+            model["analysis"] = hit
+        else:
+            pending.append(model)
+
+    # Identical files in one archive are analyzed once.
+    unique = {model["sha256"]: model for model in pending}
+    if not unique:
+        return
+    workers = workers or settings.BATCH_QUOTE_WORKERS or os.cpu_count() or 1
+    workers = min(workers, len(unique))
+    results = {}
+    if workers == 1:
+        for sha256, model in unique.items():
+            results[sha256] = run_analysis(model["path"], density)
+    else:
+        # "spawn" children import only the parsers, never a copy of the
+        # parent's threads or database connections.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            futures = {
+                sha256: pool.submit(run_analysis, model["path"], density)
+                for sha256, model in unique.items()
+            }
+            results = {sha256: future.result() for sha256, future in futures.items()}
+
+    analyzed: dict[str, dict] = {}
+    for sha256, model in unique.items():
+        if "analysis" in results[sha256]:
+            analyzed.setdefault(model_parameters(model["path"], density), {})[sha256] = (
+                os.path.getsize(model["path"]),
+                results[sha256]["analysis"],
+            )
+    for parameters, entries in analyzed.items():
+        store(entries, parameters)
+    for model in pending:
+        model.update(results[model["sha256"]])
+
+
+def run_analysis(path: str, density: float) -> dict:
+    try:
+        return {"analysis": analyze_model_file(path, density)}
+    except (GcodeError, StlError, ThreeMFError, ModelError) as exc:
+        return {"error": str(exc)}
+    except (OSError, ValueError, ArithmeticError) as exc:
+        return {"error": f"Erro ao ler o ficheiro: {exc}"}
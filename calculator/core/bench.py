@@ -0,0 +1,162 @@
+"""Synthetic data and measurement helpers for the benchmark commands."""
+
+import io
+import math
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from .forms import FILAMENT_TYPE_CHOICES
+from .models import FilamentType, InventoryItem, PrintJob
+from .views import IMPORT_COLUMNS, calculate_print_job
+
+BENCH_USER_PREFIX = "bench-user-"
+
+
+def random_piece_values(rng: random.Random, price_per_kg: Decimal) -> dict:
+    values = {
+        "filament_price_per_kg": price_per_kg,
+        "filament_weight_g": Decimal(rng.randint(500, 50000)) / 100,
+        "print_time_hours": Decimal(rng.randint(10, 4000)) / 100,
+        "labour_time_minutes": Decimal(rng.randint(0, 120)),
+        "margin_percentage": Decimal(rng.randint(10, 60)),
+    }
+    values.update(calculate_print_job(values))
+    return values
+
+
+def create_pieces(user, filament, count: int, rng=None, start: int = 0) -> list[PrintJob]:
+    rng = rng or random.Random(0)
+    return PrintJob.objects.bulk_create(
+        [
+            PrintJob(
+                user=user,
+                filament_type=filament,
+                name=f"Peça {number:06d}",
+                **random_piece_values(rng, filament.price_per_kg),
+            )
+            for number in range(start, start + count)
+        ],
+        batch_size=500,
+    )
+
+
+def generate_dataset(
+    users: int, filaments: int, pieces: int, inventory_ratio: float = 0.3, seed: int = 0
+) -> list:
+    """Create ``users`` users, each with ``filaments`` filaments and ``pieces``
+    pieces; ``inventory_ratio`` of the pieces also get an inventory item."""
+    rng = random.Random(seed)
+    user_model = get_user_model()
+    created_users = []
+    for user_no in range(users):
+        user = user_model.objects.create_user(username=f"{BENCH_USER_PREFIX}{user_no}")
+        user_filaments = FilamentType.objects.bulk_create(
+            [
+                FilamentType(
+                    user=user,
+                    name=FILAMENT_TYPE_CHOICES[n % len(FILAMENT_TYPE_CHOICES)][0],
+                    color=f"Cor {n}",
+                    price_per_kg=Decimal(rng.randint(1500, 6000)) / 100,
+                    weight_kg=Decimal("1"),
+                )
+                for n in range(filaments)
+            ]
+        )
+        user_pieces = []
+        per_filament = math.ceil(pieces / max(filaments, 1))
+        for index, filament in enumerate(user_filaments):
+            count = min(per_filament, pieces - len(user_pieces))
+            user_pieces += create_pieces(
+                user, filament, count, rng, start=index * per_filament
+            )
+        stocked = rng.sample(user_pieces, int(len(user_pieces) * inventory_ratio))
+        InventoryItem.objects.bulk_create(
+            [
+                InventoryItem(
+                    user=user,
+                    print_job=piece,
+                    piece_name=piece.name,
+                    quantity=rng.randint(1, 50),
+                )
+                for piece in stocked
+            ],
+            batch_size=500,
+        )
+        created_users.append(user)
+    return created_users
+
+
+def build_import_file(rows: int, prefix: str = "Importada", seed: int = 0) -> bytes:
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Peças")
+    ws.append(IMPORT_COLUMNS)
+    for number in range(rows):
+        ws.append(
+            [
+                f"{prefix} {number:06d}",
+                rng.randint(1500, 6000) / 100,
+                rng.randint(500, 50000) / 100,
+                rng.randint(10, 4000) / 100,
+                rng.randint(0, 120),
+                rng.randint(10, 60),
+            ]
+        )
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@contextmanager
+def rolled_back(keep: bool = False):
+    """Run the block in a transaction that is rolled back at the end, unless
+    ``keep``, so benchmark data never stays in the database."""
+    with transaction.atomic():
+        yield
+        if not keep:
+            transaction.set_rollback(True)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    index = max(math.ceil(fraction * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def measure(action, repeat: int) -> dict:
+    """Run ``action`` ``repeat`` times for latency and query counts, then once
+    more under tracemalloc for peak Python memory."""
+    latencies = []
+    query_counts = []
+    status_codes = set()
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = action()
+            latencies.append(time.perf_counter() - started)
+        query_counts.append(len(queries))
+        status_codes.add(response.status_code)
+
+    tracemalloc.start()
+    try:
+        action()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "queries": max(query_counts),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "status": sorted(status_codes),
+    }
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+INSECURE_SECRET_KEY_PREFIX = "django-insecure-"
+
+
+@register(Tags.security)
+def check_production_settings(app_configs, **kwargs):
+    if not getattr(settings, "PRODUCTION", False):
+        return []
+
+    errors = []
+    if settings.DEBUG:
+        errors.append(
+            Error(
+                "DEBUG is enabled while PRODUCTION is set.",
+                hint="Use DJANGO_SETTINGS_MODULE=calculator.settings_production.",
+                id="core.E001",
+            )
+        )
+    if not settings.ALLOWED_HOSTS:
+        errors.append(
+            Error(
+                "ALLOWED_HOSTS is empty while PRODUCTION is set.",
+                hint="Set DJANGO_ALLOWED_HOSTS.",
+                id="core.E002",
+            )
+        )
+    if settings.SECRET_KEY.startswith(INSECURE_SECRET_KEY_PREFIX):
+        errors.append(
+            Error(
+                "The development SECRET_KEY is in use while PRODUCTION is set.",
+                hint="Set DJANGO_SECRET_KEY.",
+                id="core.E003",
+            )
+        )
+    return errors
@@ -0,0 +1,34 @@
+from contextvars import ContextVar
+
+# Alias used for reads while the current request is routed to the replica.
+# ReplicaRoutingMiddleware sets it only for safe requests to views marked with
+# ``replica_read``; everything else keeps the router's default (the primary).
+read_alias: ContextVar[str | None] = ContextVar("read_alias", default=None)
+
+# Sessions and auth are read before and after every login/logout; they must
+# never lag behind the primary.
+PRIMARY_ONLY_APPS = {"auth", "contenttypes", "sessions"}
+
+
+def replica_read(view_func):
+    view_func.use_replica = True
+    return view_func
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return "default"
+        return read_alias.get() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Allowed everywhere so a local SQLite replica can be built with
+        # ``migrate --database replica``; real replicas receive the schema
+        # through replication.
+        return True
@@ -1,6 +1,19 @@
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import partial
+
 from django import forms
 
-from .models import FilamentType, PrintJob
+from .analysis_cache import analysis_parameters, analyze_upload
+from .gcode import DEFAULT_FILAMENT_DENSITY, FILAMENT_DENSITY, GcodeError, analyze_gcode_buffer
+from .models import FilamentType, PrintJob, fits_print_job_columns
+from .scheduler import Printer
+from .stl import (
+    DEFAULT_INFILL_PERCENTAGE,
+    DEFAULT_SHELL_THICKNESS_MM,
+    StlError,
+    analyze_stl_buffer,
+)
 
 FILAMENT_TYPE_CHOICES = [
     ("PLA", "PLA"),
@@ -129,6 +142,379 @@ class PrintJobForm(forms.Form):
         return value
 
 
+class GcodePrintJobForm(PrintJobForm):
+    """Calculator form that can read weight and print time from a G-code file."""
+
+    gcode_file = forms.FileField(
+        label="G-code (opcional)",
+        required=False,
+        help_text="Preenche o filamento (g) e o tempo (h) a partir do ficheiro do slicer.",
+    )
+
+    field_order = [
+        "piece_name",
+        "filament_type",
+        "gcode_file",
+        "filament_weight_g",
+        "print_time_hours",
+    ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gcode_analysis = None
+        self.fields["gcode_file"].widget.attrs.setdefault("accept", ".gcode,.gco,.g")
+        for name in ("filament_weight_g", "print_time_hours"):
+            self.fields[name].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        gcode_file = cleaned_data.get("gcode_file")
+        if gcode_file:
+            filament = cleaned_data.get("filament_type")
+            density = FILAMENT_DENSITY.get(
+                getattr(filament, "name", None), DEFAULT_FILAMENT_DENSITY
+            )
+            try:
+                self.gcode_analysis = analyze_upload(
+                    gcode_file,
+                    analysis_parameters("gcode", density=density),
+                    partial(analyze_gcode_buffer, density=density),
+                )
+            except GcodeError as exc:
+                self.add_error("gcode_file", str(exc))
+            else:
+                measured = {
+                    name: self.gcode_analysis[name]
+                    for name in ("filament_weight_g", "print_time_hours")
+                }
+                if not fits_print_job_columns(measured):
+                    self.add_error(
+                        "gcode_file", "O ficheiro G-code indica valores demasiado grandes."
+                    )
+                    return cleaned_data
+                cleaned_data["filament_weight_g"] = self.gcode_analysis["filament_weight_g"]
+                cleaned_data["print_time_hours"] = self.gcode_analysis["print_time_hours"]
+                return cleaned_data
+
+        for name in ("filament_weight_g", "print_time_hours"):
+            if cleaned_data.get(name) is None and name not in self.errors:
+                self.add_error(name, self.fields[name].error_messages["required"])
+        return cleaned_data
+
+
+def user_filament_queryset(user):
+    filament_qs = FilamentType.objects.all().order_by("name")
+    if user and not getattr(user, "is_superuser", False):
+        filament_qs = filament_qs.filter(user=user)
+    return filament_qs
+
+
+def apply_widget_classes(form) -> None:
+    for field in form.fields.values():
+        if isinstance(field.widget, forms.Select):
+            field.widget.attrs.setdefault("class", "form-select")
+        else:
+            field.widget.attrs.setdefault("class", "form-control")
+        if isinstance(field.widget, forms.NumberInput):
+            field.widget.attrs.setdefault("step", "0.01")
+
+
+class StlEstimateForm(forms.Form):
+    """Estimate the filament weight of an STL mesh to pre-fill the calculator."""
+
+    stl_file = forms.FileField(label="Modelo STL")
+    filament_type = forms.ModelChoiceField(
+        label="Filamento",
+        queryset=FilamentType.objects.none(),
+        empty_label="Escolha um filamento",
+    )
+    infill_percentage = forms.DecimalField(
+        label="Enchimento (%)",
+        min_value=0,
+        max_value=100,
+        decimal_places=2,
+        max_digits=5,
+        initial=DEFAULT_INFILL_PERCENTAGE,
+    )
+    shell_thickness_mm = forms.DecimalField(
+        label="Paredes (mm)",
+        min_value=0,
+        decimal_places=2,
+        max_digits=5,
+        initial=DEFAULT_SHELL_THICKNESS_MM,
+        help_text="Espessura das paredes e camadas de topo/base.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop("user", None)
+        super().__init__(*args, **kwargs)
+        self.estimate = None
+        self.fields["filament_type"].queryset = user_filament_queryset(user)
+        self.fields["stl_file"].widget.attrs.setdefault("accept", ".stl")
+        apply_widget_classes(self)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        stl_file = cleaned_data.get("stl_file")
+        filament = cleaned_data.get("filament_type")
+        if stl_file and filament and not self.errors:
+            try:
+                params = {
+                    "density": FILAMENT_DENSITY.get(filament.name, DEFAULT_FILAMENT_DENSITY),
+                    "infill_percentage": float(cleaned_data["infill_percentage"]),
+                    "shell_thickness_mm": float(cleaned_data["shell_thickness_mm"]),
+                }
+                self.estimate = analyze_upload(
+                    stl_file,
+                    analysis_parameters("stl", **params),
+                    partial(analyze_stl_buffer, **params),
+                )
+            except StlError as exc:
+                self.add_error("stl_file", str(exc))
+        return cleaned_data
+
+
+class BatchQuoteForm(forms.Form):
+    archive = forms.FileField(
+        label="Arquivo zip ou projeto 3MF",
+        help_text=(
+            "Zip com ficheiros .gcode, .stl ou .3mf; cada ficheiro origina uma peça "
+            "e cada placa de um projeto 3MF também."
+        ),
+    )
+    filament_type = forms.ModelChoiceField(
+        label="Filamento",
+        queryset=FilamentType.objects.none(),
+        empty_label="Escolha um filamento",
+    )
+    labour_time_minutes = forms.DecimalField(
+        label="Mão de Obra por peça (min)",
+        min_value=0,
+        decimal_places=2,
+        max_digits=10,
+        initial=0,
+    )
+    margin_percentage = forms.DecimalField(
+        label="Margem (%)",
+        min_value=0,
+        max_value=99,
+        decimal_places=2,
+        max_digits=5,
+    )
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop("user", None)
+        super().__init__(*args, **kwargs)
+        self.fields["filament_type"].queryset = user_filament_queryset(user)
+        self.fields["archive"].widget.attrs.setdefault("accept", ".zip,.3mf")
+        apply_widget_classes(self)
+
+
+def parse_assignments(value: str, label: str) -> list[tuple[str, str]]:
+    """Split "key = value" lines (or ";"-separated pairs) into tuples."""
+    pairs = []
+    for line in value.replace(";", "\n").splitlines():
+        if not line.strip():
+            continue
+        key, separator, raw = line.rpartition("=")
+        if not separator or not key.strip() or not raw.strip():
+            raise forms.ValidationError(f"Linha invalida: \"{line.strip()}\". Use {label}.")
+        pairs.append((key.strip(), raw.strip()))
+    return pairs
+
+
+def parse_piece_quantities(value: str) -> dict[int, int]:
+    quantities = {}
+    for raw_id, raw_quantity in parse_assignments(value, "id = quantidade"):
+        if not raw_id.isdigit() or not raw_quantity.isdigit() or int(raw_quantity) < 1:
+            raise forms.ValidationError(f"Linha invalida: \"{raw_id} = {raw_quantity}\".")
+        quantities[int(raw_id)] = quantities.get(int(raw_id), 0) + int(raw_quantity)
+    return quantities
+
+
+class ScheduleForm(forms.Form):
+    printers = forms.CharField(
+        label="Impressoras",
+        widget=forms.Textarea(attrs={"rows": 4}),
+        initial="Impressora 1 = 168\nImpressora 2 = 168",
+        help_text="Uma impressora por linha: nome = horas disponiveis.",
+    )
+    changeover_hours = forms.DecimalField(
+        label="Troca de filamento (h)",
+        min_value=0,
+        decimal_places=2,
+        max_digits=6,
+        initial=Decimal("0.25"),
+    )
+    pieces = forms.CharField(
+        label="Pecas a imprimir",
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 4}),
+        help_text="Uma peca por linha: id = quantidade. Vazio usa as quantidades do inventario.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        apply_widget_classes(self)
+
+    def clean_printers(self):
+        printers = []
+        for name, raw in parse_assignments(self.cleaned_data["printers"], "nome = horas"):
+            try:
+                hours = Decimal(raw.replace(",", "."))
+            except InvalidOperation:
+                hours = None
+            if hours is None or not hours.is_finite() or hours <= 0:
+                raise forms.ValidationError(f"Horas invalidas para \"{name}\".")
+            printers.append(Printer(name[:100], float(hours)))
+        if not printers:
+            raise forms.ValidationError("Indique pelo menos uma impressora.")
+        return printers
+
+    def clean_pieces(self):
+        return parse_piece_quantities(self.cleaned_data["pieces"])
+
+
+class PrintRunForm(forms.Form):
+    name = forms.CharField(label="Nome da tiragem", max_length=100)
+    print_time_hours = forms.DecimalField(
+        label="Tempo da tiragem (h)",
+        min_value=Decimal("0.01"),
+        decimal_places=2,
+        max_digits=10,
+        help_text="Tempo de impressao de todas as pecas juntas (ex.: a placa inteira).",
+    )
+    labour_time_minutes = forms.DecimalField(
+        label="Mão de Obra da tiragem (min)",
+        min_value=0,
+        decimal_places=2,
+        max_digits=10,
+        initial=0,
+    )
+    pieces = forms.CharField(
+        label="Pecas",
+        widget=forms.Textarea(attrs={"rows": 4}),
+        help_text="Uma peca por linha: id = quantidade.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        apply_widget_classes(self)
+
+    def clean_pieces(self):
+        quantities = parse_piece_quantities(self.cleaned_data["pieces"])
+        if not quantities:
+            raise forms.ValidationError("Indique pelo menos uma peca.")
+        return quantities
+
+
+VARIANT_FIELDS = {
+    "filament_weight_g",
+    "print_time_hours",
+    "labour_time_minutes",
+    "margin_percentage",
+}
+MAX_VARIANTS = 500
+# PrintJob inputs are DecimalField(max_digits=10, decimal_places=2).
+MAX_VALUE = Decimal("1e8")
+MAX_SCALE = Decimal("1000")
+NUMBER = r"\s*(\d+(?:[.,]\d+)?)\s*"
+# "inicio-fim/passo", e.g. "50-150/10".
+SCALE_RANGE = re.compile(f"^{NUMBER}-{NUMBER}/{NUMBER}$")
+
+
+def to_decimal(raw: str) -> Decimal | None:
+    try:
+        value = Decimal(raw.strip().replace(",", "."))
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+class PieceVariantsForm(forms.Form):
+    """Variants of one piece: percentage scales and/or explicit overrides."""
+
+    scales = forms.CharField(
+        label="Escalas (%)",
+        required=False,
+        help_text=(
+            "Escala o filamento e o tempo da peça base: uma lista (50; 75; 125) "
+            "ou um intervalo inicio-fim/passo (50-150/10)."
+        ),
+    )
+    overrides = forms.CharField(
+        label="Variantes",
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 4}),
+        help_text=(
+            "Uma variante por linha com os valores a alterar, ex.: "
+            "filament_weight_g=12; print_time_hours=1.5. Campos: "
+            + ", ".join(sorted(VARIANT_FIELDS))
+            + "."
+        ),
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        apply_widget_classes(self)
+
+    def clean_scales(self):
+        raw = self.cleaned_data["scales"].strip()
+        if not raw:
+            return []
+        match = SCALE_RANGE.match(raw)
+        if match:
+            start, end, step = (to_decimal(group) for group in match.groups())
+            if step <= 0 or end < start or start <= 0 or end > MAX_SCALE:
+                raise forms.ValidationError(
+                    f"Intervalo invalido: use percentagens entre 0 e {MAX_SCALE}."
+                )
+            if (end - start) / step >= MAX_VARIANTS:
+                raise forms.ValidationError(f"No maximo {MAX_VARIANTS} variantes.")
+            scales = []
+            while start <= end:
+                scales.append(start)
+                start += step
+            return scales
+        scales = [to_decimal(part) for part in raw.split(";") if part.strip()]
+        if any(scale is None or not 0 < scale <= MAX_SCALE for scale in scales):
+            raise forms.ValidationError(
+                f"Indique percentagens entre 0 e {MAX_SCALE} separadas por ;."
+            )
+        return scales
+
+    def clean_overrides(self):
+        variants = []
+        for line in self.cleaned_data["overrides"].splitlines():
+            if not line.strip():
+                continue
+            variant = {}
+            for part in line.split(";"):
+                if not part.strip():
+                    continue
+                key, separator, raw = part.partition("=")
+                key = key.strip()
+                value = to_decimal(raw) if separator else None
+                if key not in VARIANT_FIELDS or value is None or not 0 <= value < MAX_VALUE:
+                    raise forms.ValidationError(f"Valor invalido: \"{part.strip()}\".")
+                # Checked as stored, so 99.999% cannot round up to 100%.
+                value = value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+                if key == "margin_percentage" and value >= 100:
+                    raise forms.ValidationError("A margem deve ser inferior a 100%.")
+                variant[key] = value
+            variants.append(variant)
+        return variants
+
+    def clean(self):
+        cleaned_data = super().clean()
+        total = len(cleaned_data.get("scales") or []) + len(cleaned_data.get("overrides") or [])
+        if not self.errors and not total:
+            raise forms.ValidationError("Indique escalas ou variantes.")
+        if total > MAX_VARIANTS:
+            raise forms.ValidationError(f"No maximo {MAX_VARIANTS} variantes.")
+        return cleaned_data
+
+
 class PieceImportForm(forms.Form):
     file = forms.FileField(
         label="Ficheiro Excel",
@@ -0,0 +1,256 @@
+"""Extract filament weight and print time from sliced G-code.
+
+Slicers write their own estimates as comments, at the top (Cura,
+Simplify3D) or at the bottom (PrusaSlicer, OrcaSlicer, Bambu Studio), so
+only the first and last ``HEADER_SCAN_BYTES`` of the file are searched for
+them first. Without those comments every G0-G3 move is replayed: extrusion
+(E) is summed and the time is estimated from distance and feedrate,
+ignoring acceleration, so it tends to come out a little short.
+
+Files are memory-mapped and scanned in ``CHUNK_SIZE`` slices, so memory use
+does not depend on the file size.
+"""
+
+import math
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+HEADER_SCAN_BYTES = 256 * 1024
+CHUNK_SIZE = 16 * 1024 * 1024
+
+DEFAULT_FILAMENT_DIAMETER_MM = 1.75
+DEFAULT_FILAMENT_DENSITY = 1.24
+
+# g/cm3, keyed by the names in forms.FILAMENT_TYPE_CHOICES.
+FILAMENT_DENSITY = {
+    "PLA": 1.24,
+    "PLA+": 1.24,
+    "PLA Silk": 1.24,
+    "PLA Wood": 1.15,
+    "PLA Metal": 2.5,
+    "PLA Glow": 1.3,
+    "PLA Transparente": 1.24,
+    "ABS": 1.04,
+    "PETG": 1.27,
+    "TPU / TPE": 1.21,
+    "Nylon (PA)": 1.14,
+    "Carbon Fiber": 1.3,
+    "Glass Fiber": 1.4,
+    "Metal Filled": 3.0,
+    "Wood Filled": 1.15,
+}
+
+WEIGHT_PATTERNS = [
+    # PrusaSlicer / OrcaSlicer / Bambu Studio: "; filament used [g] = 1.2, 3.4"
+    # The values are captured loosely and parsed by parse_number, so "1e5" is
+    # read whole and a malformed value is reported instead of cut short.
+    re.compile(rb";[^\n]*?filament (?:used|weight) \[g\]\s*[=:][ \t]*([^\n;]+)", re.I),
+    # Simplify3D: ";   Plastic weight: 12.34g"
+    re.compile(rb";\s*Plastic weight:[ \t]*(\S+?)\s*g\b", re.I),
+]
+LENGTH_PATTERNS = [
+    # Cura: ";Filament used: 1.2345m"
+    re.compile(rb";\s*Filament used:[ \t]*([^\n;]+?)\s*m\b", re.I),
+]
+TIME_PATTERNS = [
+    # Cura: ";TIME:3600" (seconds)
+    (re.compile(rb"^;TIME:[ \t]*(\S+)", re.M), "seconds"),
+    # PrusaSlicer: "; estimated printing time (normal mode) = 1d 2h 3m 4s"
+    (re.compile(rb";\s*estimated printing time \(normal mode\)\s*=\s*([^\n]+)", re.I), "duration"),
+    # OrcaSlicer / Bambu Studio: "; total estimated time: 1h 2m 3s"
+    (re.compile(rb"total estimated time\s*[:=]\s*([^;\n]+)", re.I), "duration"),
+    # Simplify3D: ";   Build time: 1 hours 2 minutes"
+    (re.compile(rb";\s*Build time:\s*([^\n]+)", re.I), "duration"),
+]
+DURATION_PART = re.compile(rb"(\d+(?:\.\d+)?)\s*(d|h|m|s)", re.I)
+
+# Slicers write move parameters in a fixed order (F first for Cura, last for
+# PrusaSlicer), so the common lines are parsed by a single match; anything
+# left in the last group is parsed word by word.
+COMMAND_LINE = re.compile(
+    rb"^[ \t]*(G0?[0-3]|G4|G9[012]|M8[23])(?![\d.])[ \t]*"
+    rb"(?:F(-?[\d.]+)[ \t]*)?(?:X(-?[\d.]+)[ \t]*)?(?:Y(-?[\d.]+)[ \t]*)?"
+    rb"(?:Z(-?[\d.]+)[ \t]*)?(?:E(-?[\d.]+)[ \t]*)?(?:F(-?[\d.]+)[ \t]*)?([^;\n]*)",
+    re.M | re.I,
+)
+PARAMETER = re.compile(rb"([XYZEFPS])\s*(-?\d*\.?\d+)", re.I)
+
+
+class GcodeError(ValueError):
+    pass
+
+
+def parse_number(raw: bytes) -> float:
+    try:
+        value = float(raw)
+    except ValueError:
+        value = math.nan
+    if not math.isfinite(value):
+        text = raw.decode("ascii", "replace").strip()[:40]
+        raise GcodeError(f"O ficheiro G-code contem um valor invalido: {text}.")
+    return value
+
+
+def parse_number_list(raw: bytes) -> float:
+    return sum(parse_number(part) for part in raw.split(b",") if part.strip())
+
+
+def parse_duration(raw: bytes) -> float:
+    units = {b"d": 86400, b"h": 3600, b"m": 60, b"s": 1}
+    return sum(
+        float(value) * units[unit.lower()[:1]] for value, unit in DURATION_PART.findall(raw)
+    )
+
+
+def filament_weight_from_length(length_mm: float, diameter_mm: float, density: float) -> float:
+    volume_cm3 = length_mm * math.pi * (diameter_mm / 2) ** 2 / 1000
+    return volume_cm3 * density
+
+
+def read_slicer_comments(buffer, diameter_mm: float, density: float) -> tuple:
+    """Return ``(weight_g, seconds)`` from slicer comments; either may be None."""
+    size = len(buffer)
+    regions = [buffer[:HEADER_SCAN_BYTES]]
+    if size > HEADER_SCAN_BYTES:
+        regions.append(buffer[max(size - HEADER_SCAN_BYTES, HEADER_SCAN_BYTES):])
+
+    weight = seconds = None
+    for region in regions:
+        for pattern in WEIGHT_PATTERNS:
+            match = weight is None and pattern.search(region)
+            if match:
+                weight = parse_number_list(match.group(1)) or None
+        for pattern in LENGTH_PATTERNS:
+            match = weight is None and pattern.search(region)
+            if match:
+                length_mm = parse_number_list(match.group(1)) * 1000
+                weight = filament_weight_from_length(length_mm, diameter_mm, density) or None
+        for pattern, kind in TIME_PATTERNS:
+            match = seconds is None and pattern.search(region)
+            if match:
+                raw = match.group(1)
+                seconds = (parse_number(raw) if kind == "seconds" else parse_duration(raw)) or None
+    return weight, seconds
+
+
+def replay_moves(buffer) -> tuple[float, float]:
+    """Replay the motion commands; return ``(extruded_mm, seconds)``."""
+    x = y = z = 0.0
+    feedrate = 1500.0  # mm/min until the file sets one
+    extruded = last_e = seconds = 0.0
+    relative_xyz = relative_e = False
+    sqrt = math.sqrt
+
+    size = len(buffer)
+    start = 0
+    while start < size:
+        end = min(start + CHUNK_SIZE, size)
+        chunk = buffer[start:end]
+        if end < size:
+            # Keep the chunk on a line boundary; the rest goes in the next one.
+            cut = chunk.rfind(b"\n") + 1
+            if cut:
+                chunk = chunk[:cut]
+                end = start + cut
+        start = end
+
+        for command, f1, px, py, pz, pe, f2, rest in COMMAND_LINE.findall(chunk):
+            command = command.upper()
+            if rest.strip():
+                words = {key.upper(): value for key, value in PARAMETER.findall(rest)}
+                f1 = words.get(b"F", f1 or f2)
+                px = words.get(b"X", px)
+                py = words.get(b"Y", py)
+                pz = words.get(b"Z", pz)
+                pe = words.get(b"E", pe)
+                if command == b"G4":
+                    seconds += float(words.get(b"S", 0)) + float(words.get(b"P", 0)) / 1000
+                    continue
+            if command == b"G90":
+                relative_xyz = relative_e = False
+                continue
+            if command == b"G91":
+                relative_xyz = relative_e = True
+                continue
+            if command == b"M82":
+                relative_e = False
+                continue
+            if command == b"M83":
+                relative_e = True
+                continue
+            if command in (b"G4", b"G04"):
+                continue
+            if command == b"G92":
+                if pe:
+                    last_e = float(pe)
+                if px:
+                    x = float(px)
+                if py:
+                    y = float(py)
+                if pz:
+                    z = float(pz)
+                continue
+
+            # G0/G1 moves; G2/G3 arcs are counted by their chord.
+            feed = f1 or f2
+            if feed and float(feed) > 0:
+                feedrate = float(feed)
+            dx = dy = dz = 0.0
+            if px:
+                target = float(px) + x if relative_xyz else float(px)
+                dx, x = target - x, target
+            if py:
+                target = float(py) + y if relative_xyz else float(py)
+                dy, y = target - y, target
+            if pz:
+                target = float(pz) + z if relative_xyz else float(pz)
+                dz, z = target - z, target
+            delta_e = 0.0
+            if pe:
+                if relative_e:
+                    delta_e = float(pe)
+                else:
+                    delta_e = float(pe) - last_e
+                    last_e = float(pe)
+                extruded += delta_e
+            distance = sqrt(dx * dx + dy * dy + dz * dz) or abs(delta_e)
+            seconds += distance * 60 / feedrate
+    return extruded, seconds
+
+
+def analyze_gcode_buffer(
+    buffer,
+    diameter_mm: float = DEFAULT_FILAMENT_DIAMETER_MM,
+    density: float = DEFAULT_FILAMENT_DENSITY,
+) -> dict:
+    """Estimate ``filament_weight_g`` and ``print_time_hours``.
+
+    Every parse failure raises ``GcodeError``. Whether the values fit the
+    ``PrintJob`` columns is left to the caller (``fits_print_job_columns``),
+    since pool workers load this module without the app registry.
+    """
+    try:
+        weight, seconds = read_slicer_comments(buffer, diameter_mm, density)
+        source = "slicer"
+        if weight is None or seconds is None:
+            extruded, estimated_seconds = replay_moves(buffer)
+            source = "moves" if weight is None and seconds is None else "mixed"
+            if weight is None:
+                weight = filament_weight_from_length(extruded, diameter_mm, density)
+            if seconds is None:
+                seconds = estimated_seconds
+        if not (math.isfinite(weight) and math.isfinite(seconds)):
+            raise GcodeError("O ficheiro G-code contem valores fora do intervalo valido.")
+        if weight <= 0 or seconds <= 0:
+            raise GcodeError("O ficheiro nao contem movimentos de impressao.")
+        hours = Decimal(str(seconds / 3600)).quantize(Decimal("0.01"), ROUND_HALF_UP)
+        weight = Decimal(str(weight)).quantize(Decimal("0.01"), ROUND_HALF_UP)
+    except GcodeError:
+        raise
+    except ValueError as exc:  # malformed numbers in the moves
+        raise GcodeError("O ficheiro G-code esta mal formado.") from exc
+    except ArithmeticError as exc:  # too large to quantize
+        raise GcodeError("O ficheiro G-code indica valores demasiado grandes.") from exc
+    if hours == 0:
+        raise GcodeError("O tempo de impressao estimado e inferior a 0.01 h.")
+    return {"filament_weight_g": weight, "print_time_hours": hours, "source": source}
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.archive import archivable_print_jobs, archive_print_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Move para a tabela de arquivo as peças mais antigas do que --days dias "
+        "que não estão no inventário, em lotes. As peças arquivadas continuam "
+        "disponíveis na API de pesquisa e na exportação com ?archived=1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Apenas contar as peças que seriam arquivadas.",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is None:
+            days = settings.PIECE_ARCHIVE_AFTER_DAYS
+        if options["dry_run"]:
+            count = archivable_print_jobs(days).count()
+            self.stdout.write(f"{count} peça(s) com mais de {days} dias seriam arquivadas.")
+            return
+
+        total = archive_print_jobs(
+            days,
+            options["batch_size"],
+            progress=lambda moved: self.stderr.write(f"{moved} peça(s) arquivadas..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"{total} peça(s) arquivadas."))
@@ -0,0 +1,69 @@
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.batch_quote import ModelError, analyze_models, collect_folder_models, extract_models
+from core.gcode import DEFAULT_FILAMENT_DENSITY, FILAMENT_DENSITY
+from core.models import FilamentType, PrintJob
+from core.views import quote_models
+
+
+class Command(BaseCommand):
+    help = (
+        "Orçamenta todos os modelos (.gcode/.stl/.3mf) de uma pasta, arquivo zip "
+        "ou projeto 3MF, analisando-os em paralelo, e cria as peças do utilizador "
+        "indicado (uma por placa nos projetos 3MF)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Pasta, ficheiro .zip ou projeto .3mf.")
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--filament", type=int, required=True, help="Id do filamento.")
+        parser.add_argument("--labour-minutes", type=Decimal, default=Decimal("0"))
+        parser.add_argument("--margin", type=Decimal, required=True)
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Mostrar o relatório sem criar peças."
+        )
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options["username"]).first()
+        if user is None:
+            raise CommandError("Utilizador não encontrado.")
+        filament = FilamentType.objects.filter(pk=options["filament"], user=user).first()
+        if filament is None:
+            raise CommandError("Filamento não encontrado para este utilizador.")
+        density = FILAMENT_DENSITY.get(filament.name, DEFAULT_FILAMENT_DENSITY)
+
+        path = Path(options["path"])
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="batch-quote-") as directory:
+            if path.is_dir():
+                models = collect_folder_models(path)
+            else:
+                try:
+                    with open(path, "rb") as archive:
+                        models = extract_models(archive, Path(directory))
+                except (OSError, ModelError) as exc:
+                    raise CommandError(str(exc)) from exc
+            analyze_models(models, density, options["workers"])
+        elapsed = time.perf_counter() - started
+
+        pieces, report = quote_models(
+            user, filament, models, options["labour_minutes"], options["margin"]
+        )
+        if not options["dry_run"]:
+            PrintJob.objects.bulk_create(pieces, batch_size=500)
+
+        for row in report:
+            detail = row.get("message") or f"{row.get('price_final')} EUR"
+            cached = " (cache)" if row["cached"] else ""
+            self.stdout.write(f"{row['status']:8} {row['file']}{cached}: {detail}")
+        self.stdout.write(
+            f"{len(pieces)} peça(s) orçamentadas de {len(models)} ficheiro(s) "
+            f"em {elapsed:.2f}s."
+        )
@@ -0,0 +1,144 @@
+import json
+import subprocess
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from core.bench import build_import_file, generate_dataset, measure, rolled_back
+from core.models import InventoryItem, PrintJob
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera dados sintéticos (utilizadores x filamentos x peças) e mede latência "
+        "p50/p95, queries e memória de pico de cada vista. Resultado em JSON; os "
+        "dados são revertidos no fim, salvo --keep."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=3)
+        parser.add_argument("--filaments", type=int, default=5)
+        parser.add_argument("--pieces", type=int, default=500, help="Peças por utilizador.")
+        parser.add_argument("--inventory-ratio", type=float, default=0.3)
+        parser.add_argument("--import-rows", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Ficheiro onde escrever o JSON.")
+        parser.add_argument(
+            "--keep", action="store_true", help="Manter os dados gerados na base de dados."
+        )
+
+    def handle(self, *args, **options):
+        with rolled_back(keep=options["keep"]):
+            report = self.run(options)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output)
+        self.stdout.write(output)
+
+    def run(self, options) -> dict:
+        users = generate_dataset(
+            options["users"],
+            options["filaments"],
+            options["pieces"],
+            options["inventory_ratio"],
+            options["seed"],
+        )
+        user = users[0]
+        filament = user.filament_types.first()
+        piece = PrintJob.objects.filter(user=user).first()
+        item = InventoryItem.objects.filter(user=user).first()
+
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+
+        # One file per run of the import (measure() runs it repeat + 1 times),
+        # built here so the timings only cover the upload and the import.
+        import_files = iter(
+            [
+                build_import_file(options["import_rows"], prefix=f"Importada {batch}")
+                for batch in range(options["repeat"] + 1)
+            ]
+        )
+
+        def import_file():
+            upload = SimpleUploadedFile("bench.xlsx", next(import_files))
+            return client.post(reverse("piece_import"), {"file": upload})
+
+        calculate_payload = {
+            "piece_name": "",
+            "filament_type": filament.pk,
+            "filament_weight_g": "120.50",
+            "print_time_hours": "6.25",
+            "labour_time_minutes": "15",
+            "margin_percentage": "35",
+        }
+        edit_payload = {**calculate_payload, "piece_id": piece.pk, "piece_name": piece.name}
+
+        scenarios = {
+            "dashboard": lambda: client.get(reverse("dashboard")),
+            "calculator": lambda: client.get(reverse("calculator")),
+            "calculator_calculate": lambda: client.post(
+                reverse("calculator"), calculate_payload
+            ),
+            "calculator_edit": lambda: client.post(reverse("calculator"), edit_payload),
+            "pieces_list": lambda: client.get(reverse("pieces_list")),
+            "pieces_list_search": lambda: client.get(
+                reverse("pieces_list"), {"search": "00"}
+            ),
+            "pieces_list_open_edit": lambda: client.get(
+                reverse("pieces_list"), {"open_edit": piece.pk}
+            ),
+            "inventory_filaments": lambda: client.get(
+                reverse("inventory"), {"tab": "filaments"}
+            ),
+            "inventory_pieces": lambda: client.get(
+                reverse("inventory"), {"tab": "pieces", "pieces_sort": "-value"}
+            ),
+            "inventory_search": lambda: client.get(
+                reverse("inventory"), {"pieces_search": "00"}
+            ),
+            "piece_search_api": lambda: client.get(
+                reverse("piece_search_api"), {"search": "00"}
+            ),
+            "piece_export": lambda: client.get(reverse("piece_export")),
+            "piece_import": import_file,
+        }
+        if item is not None:
+            scenarios["inventory_open_edit"] = lambda: client.get(
+                reverse("inventory"), {"tab": "pieces", "open_inventory_item_edit": item.pk}
+            )
+
+        results = {}
+        for name, action in scenarios.items():
+            self.stderr.write(f"A medir {name}...")
+            results[name] = measure(action, options["repeat"])
+
+        return {
+            "revision": git_revision(),
+            "dataset": {
+                "users": options["users"],
+                "filaments_per_user": options["filaments"],
+                "pieces_per_user": options["pieces"],
+                "inventory_ratio": options["inventory_ratio"],
+                "import_rows": options["import_rows"],
+                "repeat": options["repeat"],
+            },
+            "views": results,
+        }
@@ -0,0 +1,54 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.bench import rolled_back
+
+BENCH_USERNAME = "bench-auth-queries"
+
+PROFILES = {
+    "db": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+        "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+    },
+    "cached": {
+        "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+        "AUTHENTICATION_BACKENDS": ["core.auth_backends.CachedModelBackend"],
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara as queries por pedido da lista de peças com sessões/utilizador "
+        "lidos da base de dados e a partir da cache."
+    )
+
+    def handle(self, *args, **options):
+        report = {}
+        with rolled_back():
+            user = get_user_model().objects.create_user(username=BENCH_USERNAME)
+            for profile, overrides in PROFILES.items():
+                with override_settings(**overrides):
+                    report[profile] = self.measure(user)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def measure(self, user) -> dict:
+        cache.clear()
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+        url = reverse("pieces_list")
+        client.get(url)  # warm the caches
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        tables = {
+            "session": sum("django_session" in q["sql"] for q in queries),
+            "auth_user": sum('FROM "auth_user"' in q["sql"] for q in queries),
+        }
+        return {"queries": len(queries), **tables}
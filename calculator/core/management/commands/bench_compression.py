@@ -0,0 +1,66 @@
+import json
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from core.bench import create_pieces, rolled_back
+from core.models import FilamentType
+
+BENCH_USERNAME = "bench-compression"
+# "br" only differs from "identity" when the brotli package is installed.
+ENCODINGS = ("identity", "gzip", "br")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede os bytes enviados pelo CompressionMiddleware e o tempo de cada pedido "
+        "das páginas de peças, sem compressão, com gzip e com brotli, para vários "
+        "volumes de dados. Os dados gerados são revertidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="100,1000,3000",
+            help="Números de peças a gerar, separados por vírgulas.",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        report = []
+        with rolled_back():
+            user = get_user_model().objects.create_user(username=BENCH_USERNAME)
+            filament = FilamentType.objects.create(
+                user=user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+            )
+            client = Client(HTTP_HOST="localhost")
+            client.force_login(user)
+            created = 0
+            for size in sizes:
+                create_pieces(user, filament, size - created, start=created)
+                created = size
+                for url_name in ("pieces_list", "calculator"):
+                    report.append(self.measure(client, url_name, size, options["repeat"]))
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def measure(self, client, url_name: str, size: int, repeat: int) -> dict:
+        """Bytes sent by CompressionMiddleware and the request time for each
+        Accept-Encoding; "identity" is the uncompressed page."""
+        url = reverse(url_name)
+        row = {"page": url_name, "pieces": size}
+        for encoding in ENCODINGS:
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+                times.append(time.perf_counter() - started)
+            sent = response.get("Content-Encoding", "identity")
+            row[f"{encoding}_encoding"] = sent
+            row[f"{encoding}_bytes"] = len(response.content)
+            row[f"{encoding}_ms"] = round(min(times) * 1000, 2)
+        return row
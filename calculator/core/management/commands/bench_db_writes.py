@@ -0,0 +1,95 @@
+import json
+import statistics
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+
+from core.models import PrintJob
+from core.views import calculate_print_job
+
+BENCH_USERNAME = "bench-db-writes"
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o débito de escritas concorrentes na base de dados configurada. "
+        "Execute com DB_ENGINE=sqlite e DB_ENGINE=postgresql para comparar perfis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--writes", type=int, default=200, help="Escritas por thread.")
+
+    def handle(self, *args, **options):
+        threads = options["threads"]
+        writes = options["writes"]
+
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_USERNAME)
+        values = {
+            "filament_price_per_kg": Decimal("20"),
+            "filament_weight_g": Decimal("50"),
+            "print_time_hours": Decimal("2"),
+            "labour_time_minutes": Decimal("10"),
+            "margin_percentage": Decimal("30"),
+        }
+        values.update(calculate_print_job(values))
+
+        latencies: list[float] = []
+        errors: list[str] = []
+        lock = threading.Lock()
+
+        def worker(worker_no: int) -> None:
+            local_latencies = []
+            local_errors = []
+            try:
+                for write_no in range(writes):
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            job = PrintJob.objects.create(
+                                user=user, name=f"bench-{worker_no}-{write_no}", **values
+                            )
+                            PrintJob.objects.filter(pk=job.pk).update(
+                                margin_percentage=Decimal("35")
+                            )
+                    except OperationalError as exc:
+                        local_errors.append(str(exc))
+                    else:
+                        local_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(local_latencies)
+                    errors.extend(local_errors)
+
+        pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+        started = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        user.delete()
+
+        latencies.sort()
+        report = {
+            "vendor": connection.vendor,
+            "threads": threads,
+            "writes": len(latencies),
+            "errors": len(errors),
+            "locked_errors": sum("locked" in error for error in errors),
+            "elapsed_s": round(elapsed, 3),
+            "writes_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0,
+            "p50_ms": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+            "p95_ms": (
+                round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2)
+                if latencies
+                else None
+            ),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,328 @@
+import json
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.bench import create_pieces, percentile
+from core.models import FilamentType
+
+LOADTEST_USER_PREFIX = "loadtest-user-"
+LOADTEST_PASSWORD = "loadtest-password"
+
+# Relative weights of each kind of request in the generated traffic.
+SCENARIO_WEIGHTS = {
+    "calculate": 4,
+    "edit": 2,
+    "add_to_inventory": 2,
+    "list": 2,
+}
+
+# What a request that did its job answers: the status, and for a POST that
+# re-renders the page, the success message (a form error is also a 200).
+EXPECTED_OUTCOMES = {
+    "calculate": (200, b"calculada e guardada com sucesso"),
+    "edit": (302, None),
+    "add_to_inventory": (302, None),
+    "list": (200, None),
+}
+# With DEBUG off the error page says nothing; the server log still has the
+# traceback of every 500, ending with the database error.
+SERVER_ERROR_LINE = re.compile(rb"^Internal Server Error: ", re.MULTILINE)
+DATABASE_LOCKED_LINE = re.compile(
+    rb"^django\.db\.utils\.OperationalError: database is locked", re.MULTILINE
+)
+
+
+class NoRedirectHandler(HTTPRedirectHandler):
+    # A POST answered with a redirect is one request; do not follow it.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class VirtualUser:
+    """One logged-in browser session with its own cookies."""
+
+    def __init__(self, base_url: str, username: str, filament_id: int, piece_ids: list[int]):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.filament_id = filament_id
+        self.piece_ids = piece_ids
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirectHandler)
+        self.sequence = 0
+
+    def csrf_token(self) -> str:
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, path: str, data: dict | None = None) -> tuple[int, bytes]:
+        body = None
+        headers = {}
+        if data is not None:
+            body = urlencode({**data, "csrfmiddlewaretoken": self.csrf_token()}).encode()
+            headers["Referer"] = self.base_url + path
+        try:
+            request = Request(self.base_url + path, data=body, headers=headers)
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read()
+        except HTTPError as exc:
+            return exc.code, exc.read()
+
+    def login(self) -> None:
+        login_url = reverse("login")
+        self.request(login_url)
+        status, _ = self.request(
+            login_url, {"username": self.username, "password": LOADTEST_PASSWORD}
+        )
+        if status != 302:
+            raise CommandError(f"Login de {self.username} falhou (HTTP {status}).")
+
+    def piece_payload(self) -> dict:
+        return {
+            "filament_type": self.filament_id,
+            "filament_weight_g": "120.50",
+            "print_time_hours": "6.25",
+            "labour_time_minutes": "15",
+            "margin_percentage": "35",
+        }
+
+    def run(self, scenario: str, rng: random.Random) -> tuple[int, bytes]:
+        calculator_url = reverse("calculator")
+        if scenario == "calculate":
+            self.sequence += 1
+            payload = {**self.piece_payload(), "piece_name": f"Carga {self.sequence}"}
+            return self.request(calculator_url, payload)
+        if scenario == "edit":
+            piece_id = rng.choice(self.piece_ids)
+            payload = {
+                **self.piece_payload(),
+                "piece_id": piece_id,
+                "piece_name": f"Carga editada {piece_id}",
+                "margin_percentage": str(rng.randint(10, 60)),
+            }
+            return self.request(calculator_url, payload)
+        if scenario == "add_to_inventory":
+            payload = {
+                "action": "add_to_inventory",
+                "piece_id": rng.choice(self.piece_ids),
+                "quantity": 1,
+            }
+            return self.request(calculator_url, payload)
+        return self.request(reverse("pieces_list"))
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga local do caminho POST da calculadora: inicia (ou usa) um "
+        "servidor, autentica utilizadores sintéticos e envia tráfego misto de "
+        "cálculo/edição/inventário/listagem. Reporta débito, percentis de latência "
+        "e taxas de erro (incluindo 'database is locked' do SQLite)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            help="URL de um servidor já em execução. Sem esta opção é iniciado um "
+            "'runserver' local numa porta livre.",
+        )
+        parser.add_argument("--users", type=int, default=20, help="Utilizadores simultâneos.")
+        parser.add_argument("--duration", type=float, default=30, help="Duração em segundos.")
+        parser.add_argument("--pieces", type=int, default=20, help="Peças por utilizador.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Ficheiro onde escrever o JSON.")
+        parser.add_argument(
+            "--keep", action="store_true", help="Manter os utilizadores e peças gerados."
+        )
+
+    def handle(self, *args, **options):
+        users = self.create_users(options["users"], options["pieces"], options["seed"])
+        server = None
+        with tempfile.TemporaryFile() as server_log:
+            try:
+                base_url = options["url"]
+                if not base_url:
+                    server, base_url = self.start_server(server_log)
+                report = self.run(base_url, users, options)
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait(timeout=10)
+                if not options["keep"]:
+                    get_user_model().objects.filter(
+                        username__startswith=LOADTEST_USER_PREFIX
+                    ).delete()
+            if server is not None:
+                server_log.seek(0)
+                report["server_log"] = self.read_server_log(server_log.read())
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output)
+        self.stdout.write(output)
+
+    def create_users(self, count: int, pieces: int, seed: int) -> list[tuple]:
+        user_model = get_user_model()
+        user_model.objects.filter(username__startswith=LOADTEST_USER_PREFIX).delete()
+        # Hashing once keeps setup fast; every synthetic user shares the password.
+        password = make_password(LOADTEST_PASSWORD)
+        created = user_model.objects.bulk_create(
+            [
+                user_model(username=f"{LOADTEST_USER_PREFIX}{number}", password=password)
+                for number in range(count)
+            ]
+        )
+        rng = random.Random(seed)
+        users = []
+        for user in user_model.objects.filter(
+            username__in=[user.username for user in created]
+        ):
+            filament = FilamentType.objects.create(
+                user=user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+            )
+            piece_ids = [piece.pk for piece in create_pieces(user, filament, pieces, rng)]
+            users.append((user.username, filament.pk, piece_ids))
+        return users
+
+    def start_server(self, log) -> tuple[subprocess.Popen, str]:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        manage_py = Path(sys.argv[0]).resolve()
+        server = subprocess.Popen(
+            [sys.executable, str(manage_py), "runserver", f"127.0.0.1:{port}", "--noreload"],
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("O servidor local terminou durante o arranque.")
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            server.terminate()
+            raise CommandError("O servidor local não arrancou a tempo.")
+        self.stderr.write(f"Servidor local em http://127.0.0.1:{port}")
+        return server, f"http://127.0.0.1:{port}"
+
+    def run(self, base_url: str, users: list[tuple], options) -> dict:
+        virtual_users = [VirtualUser(base_url, *user) for user in users]
+        with ThreadPoolExecutor(max_workers=len(virtual_users)) as pool:
+            list(pool.map(VirtualUser.login, virtual_users))
+
+        scenarios = list(SCENARIO_WEIGHTS)
+        weights = list(SCENARIO_WEIGHTS.values())
+        results = {name: {"latencies": [], "errors": {}} for name in scenarios}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options["duration"]
+
+        def worker(index: int) -> None:
+            user = virtual_users[index]
+            rng = random.Random(options["seed"] + index)
+            while time.monotonic() < deadline:
+                scenario = rng.choices(scenarios, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status, body = user.run(scenario, rng)
+                    error = self.classify(scenario, status, body)
+                except (URLError, OSError) as exc:
+                    error = f"connection: {getattr(exc, 'reason', exc)}"
+                elapsed = time.perf_counter() - started
+                with lock:
+                    bucket = results[scenario]
+                    if error is None:
+                        bucket["latencies"].append(elapsed)
+                    else:
+                        bucket["errors"][error] = bucket["errors"].get(error, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(virtual_users)) as pool:
+            list(pool.map(worker, range(len(virtual_users))))
+        elapsed = time.perf_counter() - started
+
+        return {
+            "url": base_url,
+            "users": len(virtual_users),
+            "duration_s": round(elapsed, 2),
+            "total": self.summarize(
+                [latency for bucket in results.values() for latency in bucket["latencies"]],
+                self.merge_errors(bucket["errors"] for bucket in results.values()),
+                elapsed,
+            ),
+            "scenarios": {
+                name: self.summarize(bucket["latencies"], bucket["errors"], elapsed)
+                for name, bucket in results.items()
+            },
+        }
+
+    @staticmethod
+    def classify(scenario: str, status: int, body: bytes) -> str | None:
+        expected_status, success_marker = EXPECTED_OUTCOMES[scenario]
+        if status >= 500 and b"database is locked" in body:
+            # Only when DEBUG shows the error page; see read_server_log.
+            return "database_locked"
+        if status != expected_status:
+            return f"http_{status}"
+        if success_marker is not None and success_marker not in body:
+            return "not_saved"
+        return None
+
+    @staticmethod
+    def read_server_log(log: bytes) -> dict:
+        """Errors the local server logged, whatever DEBUG hides from the client."""
+        return {
+            "server_errors": len(SERVER_ERROR_LINE.findall(log)),
+            "database_locked": len(DATABASE_LOCKED_LINE.findall(log)),
+        }
+
+    @staticmethod
+    def merge_errors(error_maps) -> dict:
+        merged = {}
+        for errors in error_maps:
+            for key, value in errors.items():
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    @staticmethod
+    def summarize(latencies: list[float], errors: dict, elapsed: float) -> dict:
+        failed = sum(errors.values())
+        total = len(latencies) + failed
+        summary = {
+            "requests": total,
+            "requests_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0,
+            "error_rate": round(failed / total, 4) if total else 0,
+            "errors": errors,
+        }
+        if latencies:
+            summary.update(
+                {
+                    "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                    "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                    "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                    "max_ms": round(max(latencies) * 1000, 2),
+                }
+            )
+        return summary
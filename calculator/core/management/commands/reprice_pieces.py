@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import PrintJob
+from core.views import parse_moment, reprice_print_jobs
+
+UPDATED_FIELDS = [
+    "filament_price_per_kg",
+    "cost_filament",
+    "cost_energy",
+    "cost_labour",
+    "cost_machine",
+    "cost_total",
+    "price_final",
+    "consumption_kwh",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula as peças com o preço de filamento em vigor numa data "
+        "(--at AAAA-MM-DD) ou, sem data, na data de criação de cada peça. "
+        "Sem --apply apenas mostra a diferença total."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--at", default="")
+        parser.add_argument("--username", default=None)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--apply", action="store_true", help="Guardar os novos valores nas peças."
+        )
+
+    def handle(self, *args, **options):
+        at = parse_moment(options["at"])
+        if options["at"] and at is None:
+            raise CommandError("Data invalida, use AAAA-MM-DD.")
+        pieces = PrintJob.objects.order_by("pk")
+        if options["username"]:
+            user = get_user_model().objects.filter(username=options["username"]).first()
+            if user is None:
+                raise CommandError("Utilizador não encontrado.")
+            pieces = pieces.filter(user=user)
+
+        count = 0
+        before = after = 0
+        changed = []
+        for piece, result in reprice_print_jobs(pieces, at):
+            count += 1
+            before += piece.price_final
+            after += result["price_final"]
+            # The same price gives the same costs; nothing to write.
+            if options["apply"] and piece.filament_price_per_kg != piece.historical_price_per_kg:
+                piece.filament_price_per_kg = piece.historical_price_per_kg
+                for name, value in result.items():
+                    setattr(piece, name, value)
+                changed.append(piece)
+        # Written after the read finishes: SQLite does not isolate a cursor
+        # from writes to the table it is reading.
+        with transaction.atomic():
+            PrintJob.objects.bulk_update(changed, UPDATED_FIELDS, batch_size=options["batch_size"])
+
+        self.stdout.write(
+            f"{count} peça(s) analisadas, {len(changed)} atualizada(s): "
+            f"preço final total {before:.2f} -> {after:.2f} EUR."
+        )
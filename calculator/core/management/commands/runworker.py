@@ -0,0 +1,85 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+
+from core import tasks
+
+
+def work(stop, once: bool, poll_interval: float) -> None:
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            task = tasks.claim()
+            if task is None:
+                if once:
+                    return
+                stop.wait(poll_interval)
+                continue
+            tasks.run(task)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa as tarefas em segundo plano guardadas na base de dados. Vários "
+        "workers (threads, processos ou comandos em máquinas diferentes) podem "
+        "correr em simultâneo sem executar a mesma tarefa duas vezes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=2)
+        parser.add_argument(
+            "--mode",
+            choices=["thread", "process"],
+            default="thread",
+            help="Executar as tarefas em threads ou em processos separados.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Terminar quando não houver mais tarefas pendentes.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=None)
+
+    def handle(self, *args, **options):
+        concurrency = max(options["concurrency"], 1)
+        poll_interval = options["poll_interval"] or settings.TASK_POLL_INTERVAL
+        if options["mode"] == "process":
+            # Forked children must open their own database connections.
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            stop = context.Event()
+            spawn = context.Process
+        else:
+            stop = threading.Event()
+            spawn = threading.Thread
+
+        def request_stop(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        workers = [
+            spawn(
+                target=work,
+                args=(stop, options["once"], poll_interval),
+                name=f"runworker-{number}",
+            )
+            for number in range(concurrency)
+        ]
+        self.stdout.write(
+            f"A executar {concurrency} worker(s) em modo {options['mode']}..."
+        )
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(f"Workers terminados após {time.monotonic() - started:.1f}s.")
@@ -0,0 +1,317 @@
+"""In-process metrics registry rendered in the Prometheus text format.
+
+Every worker process keeps its counters and histograms in memory and
+periodically writes them to its own ``<pid>-<start ns>.json`` file under
+``METRICS_DIR``. The ``/metrics`` view merges its own numbers with the files
+of the other workers, so a scrape that lands on any gunicorn worker sees the
+totals for the whole server. No external service is involved.
+
+Like prometheus_client's multiprocess mode, the totals of processes that
+have exited (replaced workers, management commands) are kept, so counters
+never go down and Prometheus sees no reset: while collecting, their files
+are added into ``exited.json`` and deleted, under a file lock. A worker
+writes its file at most every ``METRICS_FLUSH_INTERVAL`` seconds, on a
+timer after its last change, and once more at exit. With
+``METRICS_WRITE_FILES`` off (the test runner turns it off) nothing is
+written and only this process counts.
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers are never detected there
+    fcntl = None
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+IMPORT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRICS = {
+    "calculator_http_requests_total": (
+        "counter",
+        "HTTP requests by URL name, method and status.",
+        None,
+    ),
+    "calculator_http_request_duration_seconds": (
+        "histogram",
+        "HTTP request latency by URL name.",
+        LATENCY_BUCKETS,
+    ),
+    "calculator_db_queries_total": ("counter", "SQL queries by URL name.", None),
+    "calculator_db_queries_per_request": (
+        "histogram",
+        "SQL queries per request by URL name.",
+        QUERY_BUCKETS,
+    ),
+    "calculator_import_rows_total": ("counter", "Pieces created by imports.", None),
+    "calculator_import_duration_seconds": (
+        "histogram",
+        "Time spent processing import files.",
+        IMPORT_BUCKETS,
+    ),
+    "calculator_export_bytes_total": ("counter", "Bytes of exported workbooks.", None),
+    "calculator_export_rows_total": ("counter", "Rows of exported workbooks.", None),
+    "calculator_schedule_jobs_total": ("counter", "Print jobs planned by the scheduler.", None),
+}
+
+
+def labels_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels, extra=()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in pairs) + "}"
+
+
+EXITED_FILE = "exited.json"
+LOCK_FILE = ".lock"
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(path: Path, data: dict) -> None:
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(temporary, path)
+
+
+def merge(sources: list[dict]) -> tuple[dict, dict]:
+    """Sum the counters and histograms of several snapshots."""
+    counters: dict[tuple, float] = {}
+    histograms: dict[tuple, list] = {}
+    for data in sources:
+        for name, labels, value in data.get("counters", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, bucket_counts, total, count in data.get("histograms", []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            state = histograms.setdefault(key, [[0] * len(bucket_counts), 0.0, 0])
+            for index, bucket_count in enumerate(bucket_counts):
+                state[0][index] += bucket_count
+            state[1] += total
+            state[2] += count
+    return counters, histograms
+
+
+def to_data(counters: dict, histograms: dict) -> dict:
+    """The snapshot format of ``MetricsRegistry.snapshot``."""
+    return {
+        "counters": [[name, list(labels), value] for (name, labels), value in counters.items()],
+        "histograms": [
+            [name, list(labels), list(state[0]), state[1], state[2]]
+            for (name, labels), state in histograms.items()
+        ],
+    }
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None, flush_interval: float | None = None):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.file_name = f"{self.pid}-{time.time_ns()}.json"
+        self.counters: dict[tuple, float] = {}
+        self.histograms: dict[tuple, list] = {}
+        self.last_flush = 0.0
+        self.dirty = False
+        self.timer: threading.Timer | None = None
+
+    def get_directory(self) -> Path:
+        directory = self.directory or getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            directory = Path(tempfile.gettempdir()) / "calculator-metrics"
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    def check_fork(self) -> None:
+        # A forked worker must not report the parent's numbers as its own.
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, labels_key(labels))
+        with self.lock:
+            self.check_fork()
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.dirty = True
+        self.maybe_flush()
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        buckets = METRICS[name][2]
+        key = (name, labels_key(labels))
+        with self.lock:
+            self.check_fork()
+            state = self.histograms.get(key)
+            if state is None:
+                state = self.histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+            self.dirty = True
+        self.maybe_flush()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return to_data(self.counters, self.histograms)
+
+    def maybe_flush(self, force: bool = False) -> None:
+        if not getattr(settings, "METRICS_WRITE_FILES", True):
+            return
+        interval = self.flush_interval
+        if interval is None:
+            interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0)
+        now = time.monotonic()
+        if not force and now - self.last_flush < interval:
+            self.schedule_flush(self.last_flush + interval - now)
+            return
+        if not self.flush_lock.acquire(blocking=force):
+            self.schedule_flush(interval)
+            return
+        try:
+            self.last_flush = now
+            self.dirty = False
+            write_json(self.get_directory() / self.file_name, self.snapshot())
+        finally:
+            self.flush_lock.release()
+
+    def schedule_flush(self, delay: float) -> None:
+        """Write the pending changes later, even if nothing else happens."""
+        with self.lock:
+            if self.timer is not None and self.timer.is_alive():
+                return
+            self.timer = threading.Timer(delay, self.flush_pending)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush_pending(self) -> None:
+        if self.dirty and os.getpid() == self.pid:
+            self.maybe_flush(force=True)
+
+    @contextmanager
+    def locked_directory(self):
+        directory = self.get_directory()
+        with open(directory / LOCK_FILE, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield directory
+
+    def worker_files(self, directory: Path) -> list[Path]:
+        """Files of the other live processes, plus ``EXITED_FILE``.
+
+        Files of exited processes are added into ``EXITED_FILE`` and deleted;
+        the caller holds the directory lock.
+        """
+        newest: dict[int, tuple[int, Path]] = {}
+        exited = []
+        for path in directory.glob("*.json"):
+            if path.name in (self.file_name, EXITED_FILE):
+                continue
+            try:
+                pid, started = (int(part) for part in path.stem.split("-"))
+            except ValueError:
+                continue
+            # Our own pid on another file is an earlier process that had it.
+            if pid == self.pid or not process_alive(pid):
+                exited.append(path)
+            elif pid in newest and newest[pid][0] > started:
+                exited.append(path)
+            else:
+                if pid in newest:
+                    exited.append(newest[pid][1])
+                newest[pid] = (started, path)
+        if exited:
+            sources = [read_json(path) for path in [directory / EXITED_FILE, *exited]]
+            write_json(directory / EXITED_FILE, to_data(*merge(sources)))
+            for path in exited:
+                path.unlink(missing_ok=True)
+        return [directory / EXITED_FILE, *(path for started, path in newest.values())]
+
+    def collect(self) -> tuple[dict, dict]:
+        """Merge this process's numbers with those of the other workers and
+        of the processes that have exited."""
+        with self.lock:
+            self.check_fork()
+        if not getattr(settings, "METRICS_WRITE_FILES", True):
+            return merge([self.snapshot()])
+        self.maybe_flush(force=True)
+        sources = [self.snapshot()]
+        with self.locked_directory() as directory:
+            sources += [read_json(path) for path in self.worker_files(directory)]
+        return merge(sources)
+
+    def render(self) -> str:
+        counters, histograms = self.collect()
+        lines = []
+        for name, (metric_type, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                continue
+            for (metric, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, bucket_counts):
+                    cumulative += bucket_count
+                    le = format_labels(labels, [("le", format_value(bound))])
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                inf = format_labels(labels, [("le", "+Inf")])
+                lines.append(f"{name}_bucket{inf} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+atexit.register(registry.flush_pending)
@@ -0,0 +1,396 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.middleware.gzip import GZipMiddleware
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.cache import patch_vary_headers
+
+from .db_routers import read_alias
+from .metrics import registry
+
+performance_logger = logging.getLogger("core.performance")
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+PRIMARY_PIN_COOKIE = "db_primary_until"
+
+COMPRESSIBLE_CONTENT_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+}
+re_accepts_brotli = re.compile(r"\bbr\b")
+
+
+class HybridMiddleware:
+    """Base for middleware that runs in both modes, like Django's own
+    ``MiddlewareMixin``: under ASGI the chain stays async, so async views
+    run on the event loop instead of one thread each.
+
+    Subclasses implement ``__call__`` and ``__acall__``; ``__call__`` must
+    start with ``if self.is_async: return self.__acall__(request)``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+
+# Observers of every SQL query run in the current request. The wrapper is
+# installed on each connection once, rather than per request with
+# ``execute_wrapper``, because under ASGI the queries of a view run on a
+# worker thread whose connections the middleware never sees; context
+# variables follow the request there.
+query_observers: ContextVar[tuple] = ContextVar("query_observers", default=())
+
+
+def observe_queries(execute, sql, params, many, context):
+    observers = query_observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        for observer in observers:
+            observer(sql, elapsed)
+
+
+@receiver(connection_created)
+def install_query_observer(sender, connection, **kwargs):
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_queries)
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """Send reads of ``replica_read`` views to the replica alias.
+
+    After a write the client gets a short-lived cookie that pins its reads to
+    the primary, so it always sees its own changes despite replication lag.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.replica_alias = getattr(settings, "DB_REPLICA_ALIAS", "replica")
+        self.sticky_seconds = getattr(settings, "DB_REPLICA_STICKY_SECONDS", 10)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        return self.pin_after_write(request, response)
+
+    async def __acall__(self, request):
+        token = read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        return self.pin_after_write(request, response)
+
+    def pin_after_write(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                str(int(time.time()) + self.sticky_seconds),
+                max_age=self.sticky_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in SAFE_METHODS
+            and getattr(view_func, "use_replica", False)
+            and self.replica_alias in settings.DATABASES
+            and not self.is_pinned_to_primary(request)
+        ):
+            read_alias.set(self.replica_alias)
+        return None
+
+    def is_pinned_to_primary(self, request) -> bool:
+        try:
+            pinned_until = int(request.COOKIES.get(PRIMARY_PIN_COOKIE, "0"))
+        except ValueError:
+            return False
+        return pinned_until > time.time()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compress text responses above ``COMPRESSION_MIN_SIZE`` bytes.
+
+    Uses brotli when the package is installed and the client accepts it,
+    else Django's gzip. Like ``GZipMiddleware``, pages with a CSRF token are
+    compressed too and rely on Django's BREACH defences: the token is masked
+    afresh in every response, and gzip output gets random padding.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+        self.brotli_quality = getattr(settings, "COMPRESSION_BROTLI_QUALITY", 5)
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        self.brotli = brotli
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type not in COMPRESSIBLE_CONTENT_TYPES:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        if (
+            self.brotli is not None
+            and not response.streaming
+            and re_accepts_brotli.search(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        ):
+            patch_vary_headers(response, ("Accept-Encoding",))
+            compressed_content = self.brotli.compress(
+                response.content, quality=self.brotli_quality
+            )
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(compressed_content))
+            etag = response.get("ETag")
+            if etag and etag.startswith('"'):
+                response.headers["ETag"] = "W/" + etag
+            response.headers["Content-Encoding"] = "br"
+            return response
+
+        return super().process_response(request, response)
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "query_time", "sql_counts", "template_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.sql_counts = Counter()
+        self.template_time = 0.0
+
+    def __call__(self, sql, elapsed):
+        self.query_time += elapsed
+        self.queries += 1
+        self.sql_counts[sql] += 1
+
+
+current_metrics: ContextVar[RequestMetrics | None] = ContextVar(
+    "current_metrics", default=None
+)
+
+
+def install_template_timer() -> None:
+    """Wrap the Django template backend once so top-level renders are timed
+    for whichever request is active. Includes are part of their parent's time."""
+    if getattr(DjangoTemplate.render, "timed", False):
+        return
+    original_render = DjangoTemplate.render
+
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return original_render(self, context, request)
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+    render.timed = True
+    DjangoTemplate.render = render
+
+
+class PerformanceMiddleware(HybridMiddleware):
+    """Record SQL count/time, duplicated queries, template time and total time
+    per request.
+
+    Results go to a ``Server-Timing`` header and a JSON log line on the
+    ``core.performance`` logger; requests over their budget (``PERF_BUDGETS``
+    per URL name, else ``PERF_DEFAULT_BUDGET``) are logged as warnings. With
+    ``PERF_INSTRUMENTATION`` off the middleware removes itself at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERF_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.duplicate_threshold = getattr(settings, "PERF_DUPLICATE_THRESHOLD", 5)
+        self.default_budget = getattr(settings, "PERF_DEFAULT_BUDGET", {})
+        self.budgets = getattr(settings, "PERF_BUDGETS", {})
+        install_template_timer()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        tokens = self.start(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(tokens)
+        return self.report(request, response, metrics, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        tokens = self.start(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(tokens)
+        return self.report(request, response, metrics, time.perf_counter() - started)
+
+    @staticmethod
+    def start(metrics: RequestMetrics) -> tuple:
+        return (
+            current_metrics.set(metrics),
+            query_observers.set((*query_observers.get(), metrics)),
+        )
+
+    @staticmethod
+    def stop(tokens: tuple) -> None:
+        metrics_token, observers_token = tokens
+        query_observers.reset(observers_token)
+        current_metrics.reset(metrics_token)
+
+    def report(self, request, response, metrics: RequestMetrics, total_time: float):
+        match = getattr(request, "resolver_match", None)
+        view_name = (match.view_name if match else None) or request.path
+        duplicates = {
+            sql: count
+            for sql, count in metrics.sql_counts.most_common()
+            if count >= self.duplicate_threshold
+        }
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={metrics.query_time * 1000:.1f};desc="{metrics.queries} queries"',
+                f"tpl;dur={metrics.template_time * 1000:.1f}",
+                f"total;dur={total_time * 1000:.1f}",
+            ]
+        )
+
+        record = {
+            "view": view_name,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": metrics.queries,
+            "db_ms": round(metrics.query_time * 1000, 2),
+            "template_ms": round(metrics.template_time * 1000, 2),
+            "total_ms": round(total_time * 1000, 2),
+            "duplicate_queries": sum(duplicates.values()),
+        }
+        performance_logger.info(json.dumps(record))
+
+        budget = self.budgets.get(view_name, self.default_budget)
+        over_budget = [
+            key
+            for key, measured in (("queries", metrics.queries), ("ms", record["total_ms"]))
+            if key in budget and measured > budget[key]
+        ]
+        if over_budget or duplicates:
+            performance_logger.warning(
+                json.dumps(
+                    {
+                        **record,
+                        "over_budget": over_budget,
+                        "budget": budget,
+                        "duplicates": [
+                            {"count": count, "sql": sql[:300]}
+                            for sql, count in list(duplicates.items())[:5]
+                        ],
+                    }
+                )
+            )
+        return response
+
+
+class QueryCounter:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, sql, elapsed):
+        self.count += 1
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Feed request rate, latency and query counts per URL name into the
+    metrics registry served at ``/metrics``."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = query_observers.set((*query_observers.get(), counter))
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            query_observers.reset(token)
+        return self.record(request, response, counter, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = query_observers.set((*query_observers.get(), counter))
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_observers.reset(token)
+        return self.record(request, response, counter, time.perf_counter() - started)
+
+    def record(self, request, response, counter: QueryCounter, duration: float):
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name if match else None) or "unmatched"
+        if view == "metrics":
+            return response
+        registry.inc(
+            "calculator_http_requests_total",
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        registry.observe("calculator_http_request_duration_seconds", duration, view=view)
+        registry.inc("calculator_db_queries_total", counter.count, view=view)
+        registry.observe("calculator_db_queries_per_request", counter.count, view=view)
+        return response
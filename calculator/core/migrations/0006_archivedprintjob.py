@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_task'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPrintJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filament_price_per_kg', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('filament_weight_g', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('print_time_hours', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('labour_time_minutes', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('margin_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('cost_filament', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_energy', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_labour', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_machine', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_final', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('consumption_kwh', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('name', models.CharField(blank=True, max_length=100, verbose_name='Nome da peça')),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('filament_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_print_jobs', to='core.filamenttype')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_print_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
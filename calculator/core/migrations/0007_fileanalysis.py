@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:28
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_archivedprintjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('parameters', models.CharField(max_length=200)),
+                ('size_bytes', models.PositiveBigIntegerField()),
+                ('filament_weight_g', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('print_time_hours', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('details', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sha256', 'parameters'), name='unique_file_analysis')],
+            },
+        ),
+    ]
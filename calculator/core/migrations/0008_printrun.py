@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_fileanalysis'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrintRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome da tiragem')),
+                ('print_time_hours', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('labour_time_minutes', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='print_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PrintRunItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filament_price_per_kg', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('filament_weight_g', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('print_time_hours', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('labour_time_minutes', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('margin_percentage', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('cost_filament', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_energy', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_labour', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_machine', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost_total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('price_final', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('consumption_kwh', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('print_job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='print_run_items', to='core.printjob')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.printrun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'print_job'), name='uniq_print_run_item_piece')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def record_current_prices(apps, schema_editor):
+    # The current price is only known to be in effect from now on; earlier
+    # quotes have no recorded price and are left as they were quoted.
+    FilamentType = apps.get_model('core', 'FilamentType')
+    FilamentPrice = apps.get_model('core', 'FilamentPrice')
+    now = django.utils.timezone.now()
+    FilamentPrice.objects.bulk_create(
+        [
+            FilamentPrice(
+                filament_id=filament.pk,
+                price_per_kg=filament.price_per_kg,
+                effective_from=now,
+            )
+            for filament in FilamentType.objects.only('pk', 'price_per_kg')
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_printrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilamentPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_per_kg', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('filament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='core.filamenttype')),
+            ],
+            options={
+                'ordering': ['-effective_from'],
+                'indexes': [models.Index(fields=['filament', 'effective_from'], name='core_filame_filamen_dc25cb_idx')],
+            },
+        ),
+        migrations.RunPython(record_current_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:52
+
+from django.db import migrations
+from django.db.models import F
+
+# Values that grow with the number of units; price per kg and margin do not.
+LINE_FIELDS = [
+    'filament_weight_g',
+    'print_time_hours',
+    'labour_time_minutes',
+    'cost_filament',
+    'cost_energy',
+    'cost_labour',
+    'cost_machine',
+    'cost_total',
+    'price_final',
+    'consumption_kwh',
+]
+
+
+def per_unit_to_line_totals(apps, schema_editor):
+    # Run items used to store per-unit values; they now cover every unit.
+    PrintRunItem = apps.get_model('core', 'PrintRunItem')
+    PrintRunItem.objects.update(**{name: F(name) * F('quantity') for name in LINE_FIELDS})
+
+
+def line_totals_to_per_unit(apps, schema_editor):
+    PrintRunItem = apps.get_model('core', 'PrintRunItem')
+    PrintRunItem.objects.update(**{name: F(name) / F('quantity') for name in LINE_FIELDS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_printjob_updated_at_printjobchange'),
+    ]
+
+    operations = [
+        migrations.RunPython(per_unit_to_line_totals, line_totals_to_per_unit),
+    ]
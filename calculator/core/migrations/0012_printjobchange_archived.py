@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_printrunitem_line_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='printjobchange',
+            name='action',
+            field=models.CharField(choices=[('created', 'Criada'), ('updated', 'Alterada'), ('deleted', 'Apagada'), ('archived', 'Arquivada')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='printjobchange',
+            index=models.Index(fields=['user', 'changed_at'], name='core_printj_user_id_5d6689_idx'),
+        ),
+    ]
@@ -1,8 +1,52 @@
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
+
+
+class PrintJobValues(models.Model):
+    """Inputs and computed costs shared by live and archived print jobs."""
+
+    filament_price_per_kg = models.DecimalField(max_digits=10, decimal_places=2)
+    filament_weight_g = models.DecimalField(max_digits=10, decimal_places=2)
+    print_time_hours = models.DecimalField(max_digits=10, decimal_places=2)
+    labour_time_minutes = models.DecimalField(max_digits=10, decimal_places=2)
+    margin_percentage = models.DecimalField(max_digits=5, decimal_places=2)
+
+    cost_filament = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_energy = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_labour = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_machine = models.DecimalField(max_digits=10, decimal_places=2)
+    cost_total = models.DecimalField(max_digits=10, decimal_places=2)
+    price_final = models.DecimalField(max_digits=10, decimal_places=2)
+    consumption_kwh = models.DecimalField(max_digits=10, decimal_places=4)
+
+    class Meta:
+        abstract = True
+
 
+class PrintJobQuerySet(models.QuerySet):
+    """Bulk writes skip ``save()`` and its signals, so they log their own
+    changes (and stamp ``updated_at``, which ``auto_now`` only sets on save)."""
 
-class PrintJob(models.Model):
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        PrintJobChange.record(created, PrintJobChange.CREATED)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        updated = super().bulk_update(objs, [*fields, "updated_at"], *args, **kwargs)
+        PrintJobChange.record(objs, PrintJobChange.UPDATED)
+        return updated
+
+
+class PrintJob(PrintJobValues):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -18,21 +62,11 @@ class PrintJob(models.Model):
         blank=True,
         related_name='print_jobs',
     )
-    filament_price_per_kg = models.DecimalField(max_digits=10, decimal_places=2)
-    filament_weight_g = models.DecimalField(max_digits=10, decimal_places=2)
-    print_time_hours = models.DecimalField(max_digits=10, decimal_places=2)
-    labour_time_minutes = models.DecimalField(max_digits=10, decimal_places=2)
-    margin_percentage = models.DecimalField(max_digits=5, decimal_places=2)
-
-    cost_filament = models.DecimalField(max_digits=10, decimal_places=2)
-    cost_energy = models.DecimalField(max_digits=10, decimal_places=2)
-    cost_labour = models.DecimalField(max_digits=10, decimal_places=2)
-    cost_machine = models.DecimalField(max_digits=10, decimal_places=2)
-    cost_total = models.DecimalField(max_digits=10, decimal_places=2)
-    price_final = models.DecimalField(max_digits=10, decimal_places=2)
-    consumption_kwh = models.DecimalField(max_digits=10, decimal_places=4)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PrintJobQuerySet.as_manager()
 
     class Meta:
         ordering = ["-created_at"]
@@ -42,6 +76,104 @@ class PrintJob(models.Model):
             return self.name
         return f"Peça #{self.pk}"
 
+
+def fits_print_job_columns(values: dict) -> bool:
+    """Whether every value fits its ``PrintJob`` DecimalField, like the form
+    fields' ``max_digits`` check, so nothing overflows the column."""
+    for name, value in values.items():
+        field = PrintJob._meta.get_field(name)
+        if abs(value) >= Decimal(10) ** (field.max_digits - field.decimal_places):
+            return False
+    return True
+
+
+class PrintJobChange(models.Model):
+    """Append-only log of every create, update and delete of a ``PrintJob``.
+
+    Rows are written by ``core.changelog`` and ``PrintJobQuerySet``. The
+    auto-increment id orders the log, so a client that remembers the last id
+    it saw can ask for just the changes after it. The log outlives the print
+    job (and its owner), which is how deletes are reported as tombstones.
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    ARCHIVED = "archived"
+    ACTION_CHOICES = [
+        (CREATED, "Criada"),
+        (UPDATED, "Alterada"),
+        (DELETED, "Apagada"),
+        (ARCHIVED, "Arquivada"),
+    ]
+
+    print_job_id = models.BigIntegerField()
+    # No database constraint: rows must survive the deletion of the owner,
+    # whose pieces are logged as deleted in the same transaction.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        null=True,
+        blank=True,
+    )
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+            # The safety window of core.changelog.changes_since.
+            models.Index(fields=['user', 'changed_at']),
+        ]
+
+    @classmethod
+    def record(cls, print_jobs, action: str) -> None:
+        now = timezone.now()
+        cls.objects.bulk_create(
+            [
+                cls(print_job_id=job.pk, user_id=job.user_id, action=action, changed_at=now)
+                for job in print_jobs
+            ],
+            batch_size=500,
+        )
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"#{self.print_job_id} {self.action} {self.changed_at:%Y-%m-%d %H:%M}"
+
+
+class ArchivedPrintJob(PrintJobValues):
+    """Print job moved out of the hot table by ``manage.py archive_pieces``."""
+
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_print_jobs",
+        null=True,
+        blank=True,
+    )
+    name = models.CharField("Nome da peça", max_length=100, blank=True)
+    filament_type = models.ForeignKey(
+        'FilamentType',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_print_jobs',
+    )
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self) -> str:  # pragma: no cover
+        if self.name:
+            return self.name
+        return f"Peça #{self.original_id}"
+
 class FilamentType(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -61,6 +193,35 @@ class FilamentType(models.Model):
         return f"{self.name} ({self.color})" if self.color else self.name
 
 
+class FilamentPrice(models.Model):
+    """Append-only history of a filament's ``price_per_kg``.
+
+    A row is added by ``core.pricing`` whenever a filament is created or its
+    price changes; rows are never edited, so past quotes can be repriced
+    with the price that was in effect at any date.
+    """
+
+    filament = models.ForeignKey(
+        FilamentType,
+        on_delete=models.CASCADE,
+        related_name='price_history',
+    )
+    price_per_kg = models.DecimalField(max_digits=8, decimal_places=2)
+    effective_from = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-effective_from']
+        indexes = [models.Index(fields=['filament', 'effective_from'])]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("O historico de precos nao pode ser alterado.")
+        super().save(*args, **kwargs)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.filament}: {self.price_per_kg} desde {self.effective_from:%Y-%m-%d}"
+
+
 class InventoryItem(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -88,3 +249,129 @@ class InventoryItem(models.Model):
 
     def __str__(self) -> str:  # pragma: no cover
         return f"{self.piece_name} x{self.quantity}"
+
+
+class PrintRun(models.Model):
+    """Pieces printed together (copies or parts on one plate).
+
+    The run's print time and labour are shared by every unit in it and are
+    allocated to the items by ``views.price_print_run``.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='print_runs',
+    )
+    name = models.CharField("Nome da tiragem", max_length=100)
+    print_time_hours = models.DecimalField(max_digits=10, decimal_places=2)
+    labour_time_minutes = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self) -> str:  # pragma: no cover
+        return self.name
+
+
+class PrintRunItem(PrintJobValues):
+    """A piece and its quantity in a run; the values cover all its units."""
+
+    run = models.ForeignKey(PrintRun, on_delete=models.CASCADE, related_name='items')
+    print_job = models.ForeignKey(
+        PrintJob,
+        on_delete=models.CASCADE,
+        related_name='print_run_items',
+    )
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['run', 'print_job'],
+                name='uniq_print_run_item_piece',
+            )
+        ]
+
+    @property
+    def unit_price_final(self):
+        return (self.price_final / self.quantity).quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.print_job} x{self.quantity}"
+
+
+class Task(models.Model):
+    """Background job stored in the database and run by ``manage.py runworker``."""
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pendente"),
+        (STATUS_RUNNING, "Em execução"),
+        (STATUS_SUCCEEDED, "Concluída"),
+        (STATUS_FAILED, "Falhada"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='tasks',
+        null=True,
+        blank=True,
+    )
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    progress = models.PositiveSmallIntegerField(default=0)
+    progress_message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField()
+    claim_token = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class FileAnalysis(models.Model):
+    """Parsed estimate of an uploaded model file, keyed by its SHA-256.
+
+    ``parameters`` holds everything besides the content that changes the
+    result (file kind, filament density, infill...). Rows are evicted by
+    age and count in ``core.analysis_cache``.
+    """
+
+    sha256 = models.CharField(max_length=64)
+    parameters = models.CharField(max_length=200)
+    size_bytes = models.PositiveBigIntegerField()
+    filament_weight_g = models.DecimalField(max_digits=10, decimal_places=2)
+    print_time_hours = models.DecimalField(max_digits=10, decimal_places=2)
+    details = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sha256', 'parameters'], name='unique_file_analysis'
+            )
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.sha256[:12]} ({self.parameters})"
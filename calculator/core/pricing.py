@@ -0,0 +1,79 @@
+"""Filament price history and point-in-time price lookups.
+
+Every create or price change of a ``FilamentType`` appends a
+``FilamentPrice`` row. The price in effect at a moment is the newest row
+whose ``effective_from`` is not after it. ``effective_price`` expresses that
+as a correlated subquery (``ORDER BY effective_from DESC LIMIT 1``, the
+portable form of a lateral join). Each row is then resolved with one seek
+on the (filament, effective_from) index, and any number of print jobs are
+repriced in a single SQL statement instead of a query per job.
+"""
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import FilamentPrice, FilamentType
+
+
+@receiver(post_save, sender=FilamentType)
+def record_filament_price(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    latest = (
+        FilamentPrice.objects.filter(filament=instance)
+        .order_by("-effective_from")
+        .values_list("price_per_kg", flat=True)
+        .first()
+    )
+    if created or latest != instance.price_per_kg:
+        FilamentPrice.objects.create(filament=instance, price_per_kg=instance.price_per_kg)
+
+
+def effective_price(at, filament=OuterRef("filament_type")) -> Subquery:
+    """Price per kg of ``filament`` in effect at ``at``.
+
+    ``at`` may be a datetime or an expression such as ``OuterRef("created_at")``.
+    """
+    return Subquery(
+        FilamentPrice.objects.filter(filament=filament, effective_from__lte=at)
+        .order_by("-effective_from")
+        .values("price_per_kg")[:1],
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def print_jobs_priced_at(queryset, at=None):
+    """Annotate ``historical_price_per_kg`` on a PrintJob queryset.
+
+    With ``at`` the price in effect at that moment is used; without it, the
+    price in effect when each job was created. Jobs without a filament, or
+    older than the filament's history, keep the price they were quoted with.
+    """
+    moment = OuterRef("created_at") if at is None else at
+    return queryset.annotate(
+        historical_price_per_kg=Coalesce(
+            effective_price(moment),
+            F("filament_price_per_kg"),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    )
+
+
+def price_history(filament: FilamentType, start=None, end=None):
+    """The rows in effect at any time between ``start`` and ``end``."""
+    history = FilamentPrice.objects.filter(filament=filament)
+    if end is not None:
+        history = history.filter(effective_from__lte=end)
+    if start is not None:
+        # Keep the row already in effect at ``start``, not just newer ones.
+        in_effect_since = (
+            FilamentPrice.objects.filter(filament=filament, effective_from__lte=start)
+            .order_by("-effective_from")
+            .values("effective_from")[:1]
+        )
+        history = history.filter(
+            effective_from__gte=Coalesce(Subquery(in_effect_since), Value(start))
+        )
+    return history.order_by("effective_from")
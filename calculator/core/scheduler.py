@@ -0,0 +1,336 @@
+"""Plan print jobs across several printers to finish everything early.
+
+Every copy of a piece is one job of ``print_time_hours``. A printer's load is
+the sum of its jobs plus one filament changeover for each filament beyond
+the first, since jobs on a printer are run grouped by filament. The goal is
+the smallest makespan (the load of the busiest printer) without exceeding
+any printer's available hours.
+
+The plan starts with LPT (longest processing time first): jobs are sorted by
+duration and each goes to the printer where it would finish earliest. A
+local search then keeps moving one job, or swapping two, off the busiest
+printer while that lowers its load by at least ``MIN_IMPROVEMENT_HOURS``,
+until no move helps or ``time_limit`` runs out. Copies of the same piece
+are interchangeable, so each printer keeps a count per piece and the search
+only looks at distinct pieces; swap partners are found by bisecting a
+per-printer list sorted by duration. Nothing here touches the database.
+"""
+
+import bisect
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+EPSILON = 1e-9
+# Smaller gains (under a minute) are not worth another search round.
+MIN_IMPROVEMENT_HOURS = 0.01
+DEFAULT_TIME_LIMIT = 0.3
+# Swap partners checked on each side of the ideal duration.
+SWAP_NEIGHBOURS = 2
+
+
+@dataclass
+class Job:
+    key: object
+    name: str
+    hours: float
+    filament: object = None
+    quantity: int = 1
+
+
+@dataclass
+class Printer:
+    name: str
+    available_hours: float
+
+
+@dataclass
+class PrinterState:
+    printer: Printer
+    changeover_hours: float
+    hours: float = 0.0
+    load: float = 0.0
+    pieces: Counter = field(default_factory=Counter)
+    filaments: Counter = field(default_factory=Counter)
+    # (hours, job index) of every piece with at least one copy here.
+    sorted_pieces: list = field(default_factory=list)
+
+    def changeovers(self, distinct: int) -> float:
+        return max(distinct - 1, 0) * self.changeover_hours
+
+    def load_with(self, removed: Job = None, added: Job = None) -> float:
+        """Load after removing one copy of ``removed`` and adding ``added``."""
+        hours = self.hours
+        distinct = len(self.filaments)
+        if removed is not None:
+            hours -= removed.hours
+            if self.filaments[removed.filament] == 1:
+                distinct -= 1
+        if added is not None:
+            hours += added.hours
+            left = self.filaments[added.filament]
+            if removed is not None and removed.filament == added.filament:
+                left -= 1
+            if left == 0:
+                distinct += 1
+        return hours + self.changeovers(distinct)
+
+    def add(self, job: Job, index: int, copies: int = 1) -> None:
+        self.hours += job.hours * copies
+        self.filaments[job.filament] += copies
+        self.pieces[index] += copies
+        if self.pieces[index] == copies:
+            bisect.insort(self.sorted_pieces, (job.hours, index))
+        self.load = self.hours + self.changeovers(len(self.filaments))
+
+    def remove(self, job: Job, index: int) -> None:
+        self.hours -= job.hours
+        self.filaments[job.filament] -= 1
+        if not self.filaments[job.filament]:
+            del self.filaments[job.filament]
+        self.pieces[index] -= 1
+        if not self.pieces[index]:
+            del self.pieces[index]
+            self.sorted_pieces.remove((job.hours, index))
+        self.load = self.hours + self.changeovers(len(self.filaments))
+
+    def load_adding(self, job: Job) -> float:
+        """Fast path of ``load_with(None, job)`` for the greedy pass."""
+        if self.filaments and job.filament not in self.filaments:
+            return self.load + job.hours + self.changeover_hours
+        return self.load + job.hours
+
+    def fits(self, load: float) -> bool:
+        return load <= self.printer.available_hours + EPSILON
+
+
+def greedy(jobs: list[Job], states: list[PrinterState]) -> dict:
+    """LPT: longest jobs first, each on the printer where it ends earliest.
+
+    Copies of a job are placed in bulk: placing them one at a time always
+    takes the earliest free end time left, so the copies go to the
+    ``quantity`` earliest of every printer's successive end times.
+    """
+    unscheduled = Counter()
+    order = sorted(range(len(jobs)), key=lambda index: -jobs[index].hours)
+    for index in order:
+        job = jobs[index]
+        firsts = [state.load_adding(job) for state in states]
+        capacities = [copies_that_fit(job, state, first) for state, first in zip(states, firsts)]
+        if sum(capacities) <= job.quantity:
+            counts = capacities
+            unscheduled[index] = job.quantity - sum(capacities)
+        else:
+            counts = earliest_copies(job, firsts, capacities)
+        for state, count in zip(states, counts):
+            if count:
+                state.add(job, index, count)
+        if not unscheduled[index]:
+            del unscheduled[index]
+    return unscheduled
+
+
+def copies_that_fit(job: Job, state: PrinterState, first: float) -> int:
+    if not state.fits(first):
+        return 0
+    if job.hours <= EPSILON:
+        return job.quantity
+    copies = 1 + int((state.printer.available_hours + EPSILON - first) // job.hours)
+    while copies > 1 and not state.fits(first + (copies - 1) * job.hours):
+        copies -= 1
+    return min(copies, job.quantity)
+
+
+def earliest_copies(job: Job, firsts: list[float], capacities: list[int]) -> list[int]:
+    """How many copies each printer takes among the ``quantity`` earliest ends."""
+    if job.hours <= EPSILON:
+        best = min(
+            (position for position, capacity in enumerate(capacities) if capacity),
+            key=lambda position: firsts[position],
+        )
+        return [job.quantity if position == best else 0 for position in range(len(firsts))]
+
+    def copies_by(level: float) -> list[int]:
+        return [
+            0 if level < first else min(capacity, 1 + int((level - first) // job.hours))
+            for first, capacity in zip(firsts, capacities)
+        ]
+
+    # The end time of the last copy placed, found by bisection.
+    low = min(first for first, capacity in zip(firsts, capacities) if capacity)
+    high = max(
+        first + (capacity - 1) * job.hours
+        for first, capacity in zip(firsts, capacities)
+        if capacity
+    )
+    while high - low > EPSILON:
+        middle = (low + high) / 2
+        if sum(copies_by(middle)) >= job.quantity:
+            high = middle
+        else:
+            low = middle
+    counts = copies_by(high - EPSILON)
+    # Printers tied at that end time take the rest in order, as one at a time.
+    left = job.quantity - sum(counts)
+    for position, count in enumerate(copies_by(high + EPSILON)):
+        if left and count > counts[position]:
+            counts[position] += 1
+            left -= 1
+    return counts
+
+
+def try_move(jobs: list[Job], states: list[PrinterState], busiest: PrinterState) -> bool:
+    target = busiest.load
+    best = None
+    for index in list(busiest.pieces):
+        job = jobs[index]
+        source_load = busiest.load_with(job)
+        for state in states:
+            if state is busiest:
+                continue
+            load = state.load_with(None, job)
+            peak = max(source_load, load)
+            if state.fits(load) and peak < target - MIN_IMPROVEMENT_HOURS:
+                target, best = peak, (index, state)
+    if best is None:
+        return False
+    index, state = best
+    busiest.remove(jobs[index], index)
+    state.add(jobs[index], index)
+    return True
+
+
+def try_swap(
+    jobs: list[Job], states: list[PrinterState], busiest: PrinterState, deadline: float
+) -> bool:
+    busiest_load = target = busiest.load
+    best = None
+    # Copies with the same duration and filament are interchangeable here.
+    candidates = {(jobs[index].hours, jobs[index].filament): index for index in busiest.pieces}
+    for state in states:
+        if state is busiest or not state.sorted_pieces:
+            continue
+        gap = busiest_load - state.load
+        # A swap must shorten the busiest printer by less than the gap; one
+        # changeover saved is the most a change of filaments can add to that.
+        window = gap + state.changeover_hours - MIN_IMPROVEMENT_HOURS
+        for index in candidates.values():
+            job = jobs[index]
+            # Trading job for a piece shorter by half the gap evens both loads.
+            position = bisect.bisect_left(state.sorted_pieces, (job.hours - gap / 2, -1))
+            low = max(position - SWAP_NEIGHBOURS, 0)
+            for hours, other_index in state.sorted_pieces[low : position + SWAP_NEIGHBOURS]:
+                other = jobs[other_index]
+                # Equal durations only help by merging filaments.
+                if hours > job.hours or job.hours - hours >= window or (
+                    hours == job.hours and other.filament == job.filament
+                ):
+                    continue
+                source_load = busiest.load_with(job, other)
+                load = state.load_with(other, job)
+                peak = max(source_load, load)
+                if (
+                    peak < target - MIN_IMPROVEMENT_HOURS
+                    and busiest.fits(source_load)
+                    and state.fits(load)
+                ):
+                    target, best = peak, (index, state, other_index)
+        if time.perf_counter() > deadline:
+            break
+    if best is None:
+        return False
+    index, state, other_index = best
+    busiest.remove(jobs[index], index)
+    state.remove(jobs[other_index], other_index)
+    busiest.add(jobs[other_index], other_index)
+    state.add(jobs[index], index)
+    return True
+
+
+def local_search(jobs: list[Job], states: list[PrinterState], time_limit: float) -> int:
+    deadline = time.perf_counter() + time_limit
+    improvements = 0
+    while time.perf_counter() < deadline:
+        busiest = max(states, key=lambda state: state.load)
+        if not (
+            try_move(jobs, states, busiest) or try_swap(jobs, states, busiest, deadline)
+        ):
+            break
+        improvements += 1
+    return improvements
+
+
+def sequence(jobs: list[Job], state: PrinterState) -> list[dict]:
+    """Run order for one printer: grouped by filament, longest jobs first."""
+    by_filament = {}
+    for index, count in state.pieces.items():
+        by_filament.setdefault(jobs[index].filament, []).append((index, count))
+    groups = sorted(
+        by_filament.values(),
+        key=lambda group: -sum(jobs[index].hours * count for index, count in group),
+    )
+    entries = []
+    clock = 0.0
+    for position, group in enumerate(groups):
+        if position:
+            clock += state.changeover_hours
+        for index, count in sorted(group, key=lambda item: -jobs[item[0]].hours):
+            job = jobs[index]
+            entries.append(
+                {
+                    "key": job.key,
+                    "name": job.name,
+                    "filament": job.filament,
+                    "quantity": count,
+                    "start_hours": round(clock, 4),
+                    "end_hours": round(clock + job.hours * count, 4),
+                }
+            )
+            clock += job.hours * count
+    return entries
+
+
+def schedule(
+    jobs: list[Job],
+    printers: list[Printer],
+    changeover_hours: float = 0.0,
+    time_limit: float = DEFAULT_TIME_LIMIT,
+) -> dict:
+    """Assign every copy of every job to a printer; see the module docstring."""
+    started = time.perf_counter()
+    jobs = [job for job in jobs if job.quantity > 0]
+    states = [PrinterState(printer, changeover_hours) for printer in printers]
+    unscheduled = greedy(jobs, states) if states else Counter(
+        {index: job.quantity for index, job in enumerate(jobs)}
+    )
+    greedy_makespan = max((state.load for state in states), default=0.0)
+    improvements = local_search(jobs, states, time_limit) if states else 0
+
+    scheduled = [
+        (job.hours, job.quantity - unscheduled[index]) for index, job in enumerate(jobs)
+    ]
+    total_hours = sum(hours * count for hours, count in scheduled)
+    longest = max((hours for hours, count in scheduled if count), default=0.0)
+    return {
+        "makespan_hours": round(max((state.load for state in states), default=0.0), 4),
+        "greedy_makespan_hours": round(greedy_makespan, 4),
+        # No plan can beat a perfectly even split or the longest single job.
+        "lower_bound_hours": round(max(total_hours / len(states), longest) if states else 0, 4),
+        "improvements": improvements,
+        "jobs": sum(job.quantity for job in jobs),
+        "printers": [
+            {
+                "name": state.printer.name,
+                "available_hours": state.printer.available_hours,
+                "load_hours": round(state.load, 4),
+                "changeovers": max(len(state.filaments) - 1, 0),
+                "jobs": sequence(jobs, state),
+            }
+            for state in states
+        ],
+        "unscheduled": [
+            {"key": jobs[index].key, "name": jobs[index].name, "quantity": count}
+            for index, count in unscheduled.items()
+        ],
+        "elapsed_seconds": round(time.perf_counter() - started, 4),
+    }
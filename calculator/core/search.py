@@ -0,0 +1,71 @@
+"""
+Accent- and case-insensitive text search in the database.
+
+``normalize_text`` is the matching rule used across the views: NFKD, drop the
+combining marks, lower case. The ``normalized`` transform applies the same
+rule in SQL, so ``name__normalized__contains=normalize_text(query)`` finds
+"Peça" when searching for "peca" or "PEÇA". SQLite gets the Python function
+itself (registered on every new connection); PostgreSQL uses lower() and
+translate() over the accented Latin letters, which needs no extension.
+"""
+
+import unicodedata
+
+from django.db.backends.signals import connection_created
+from django.db.models import CharField, TextField, Transform
+from django.dispatch import receiver
+
+SQLITE_FUNCTION = "core_normalize_text"
+
+
+def normalize_text(value: str) -> str:
+    if not value:
+        return ""
+    normalized = unicodedata.normalize("NFKD", value)
+    stripped = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return stripped.lower()
+
+
+# Accented lower-case Latin letters and their normalize_text() result, for
+# databases without the Python function.
+ACCENTED = "".join(
+    ch
+    for ch in map(chr, range(0xE0, 0x180))
+    if ch.islower() and len(normalize_text(ch)) == 1 and normalize_text(ch) != ch
+)
+PLAIN = "".join(normalize_text(ch) for ch in ACCENTED)
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    if connection.vendor == "sqlite":
+        connection.connection.create_function(
+            SQLITE_FUNCTION, 1, sqlite_normalize_text, deterministic=True
+        )
+
+
+def sqlite_normalize_text(value):
+    if value is None:
+        return None
+    return normalize_text(str(value))
+
+
+class Normalized(Transform):
+    lookup_name = "normalized"
+    function = "LOWER"
+    output_field = CharField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function=SQLITE_FUNCTION, **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template=f"translate(LOWER(%(expressions)s), '{ACCENTED}', '{PLAIN}')",
+            **extra_context,
+        )
+
+
+CharField.register_lookup(Normalized)
+TextField.register_lookup(Normalized)
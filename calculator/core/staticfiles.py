@@ -0,0 +1,93 @@
+import gzip
+import mimetypes
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".map", ".svg", ".txt", ".json", ".html", ".xml"}
+COMPRESS_MIN_SIZE = 1024
+
+# Hashed names never change content, so browsers may keep them for a year.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=3600"
+
+
+def brotli_compress(data: bytes) -> bytes | None:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes ``.gz`` (and ``.br`` when the brotli
+    package is installed) next to every hashed text asset at collectstatic
+    time, so requests never pay for compression."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            self.write_compressed_variants(hashed_name)
+
+    def write_compressed_variants(self, name: str) -> None:
+        if Path(name).suffix.lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+        variants = {
+            ".gz": gzip.compress(data, compresslevel=9, mtime=0),
+            ".br": brotli_compress(data),
+        }
+        for suffix, compressed in variants.items():
+            if compressed is not None and len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
+
+
+@lru_cache(maxsize=1)
+def get_immutable_names() -> frozenset[str]:
+    hashed_files = getattr(staticfiles_storage, "hashed_files", None) or {}
+    return frozenset(hashed_files.values())
+
+
+def serve_static(request, path):
+    """Serve collected files from STATIC_ROOT, preferring the pre-compressed
+    variant the client accepts. Meant for deployments without a front proxy."""
+    full_path = Path(safe_join(settings.STATIC_ROOT, path))
+    if not full_path.is_file():
+        raise Http404("Ficheiro nao encontrado.")
+
+    stat = full_path.stat()
+    if not was_modified_since(request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(full_path.name)
+    accepted = request.META.get("HTTP_ACCEPT_ENCODING", "")
+    served_path, encoding = full_path, None
+    for suffix, name in ((".br", "br"), (".gz", "gzip")):
+        candidate = full_path.with_name(full_path.name + suffix)
+        if name in accepted and candidate.is_file():
+            served_path, encoding = candidate, name
+            break
+
+    response = FileResponse(
+        open(served_path, "rb"), content_type=content_type or "application/octet-stream"
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Last-Modified"] = http_date(stat.st_mtime)
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = (
+        IMMUTABLE_CACHE_CONTROL if path in get_immutable_names() else DEFAULT_CACHE_CONTROL
+    )
+    return response
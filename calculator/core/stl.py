@@ -0,0 +1,143 @@
+"""Estimate filament weight straight from an STL mesh.
+
+The mesh volume is the sum of the signed volumes of the tetrahedra formed by
+each triangle and the origin, which is exact for a closed mesh. Slicers do
+not print that volume solid: walls and top/bottom layers are solid and the
+rest is filled at the infill percentage, so the estimate splits the volume
+into a shell (surface area x shell thickness) and an infilled core. The
+print time is only a rough figure: that volume at a typical nozzle flow.
+
+NumPy is optional. With it, binary STL files are viewed in place with
+``np.frombuffer`` over a memory map and every sum is vectorized; without
+it the same maths runs in pure Python, which is far slower on big meshes.
+Coordinates are taken to be millimetres.
+"""
+
+import math
+import re
+import struct
+from decimal import Decimal, ROUND_HALF_UP
+
+from .gcode import DEFAULT_FILAMENT_DENSITY
+
+HEADER_SIZE = 80
+TRIANGLE_SIZE = 50
+DEFAULT_INFILL_PERCENTAGE = 20
+DEFAULT_SHELL_THICKNESS_MM = 1.2
+# Typical sustained flow of a 0.4 mm nozzle; only used for a rough time.
+DEFAULT_VOLUMETRIC_FLOW_MM3_S = 8
+
+VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)", re.I)
+NON_FINITE_MESSAGE = "O ficheiro STL contem coordenadas invalidas (NaN ou infinito)."
+
+
+class StlError(ValueError):
+    pass
+
+
+def is_binary_stl(buffer) -> bool:
+    if len(buffer) < HEADER_SIZE + 4:
+        return False
+    (count,) = struct.unpack_from("<I", buffer, HEADER_SIZE)
+    # ASCII files may also start with "solid", so trust the size instead.
+    return len(buffer) == HEADER_SIZE + 4 + count * TRIANGLE_SIZE
+
+
+def mesh_measurements_numpy(buffer, np) -> tuple[float, float, int]:
+    if is_binary_stl(buffer):
+        count = (len(buffer) - HEADER_SIZE - 4) // TRIANGLE_SIZE
+        dtype = np.dtype(
+            [("normal", "<f4", (3,)), ("vertices", "<f4", (9,)), ("attribute", "<u2")]
+        )
+        records = np.frombuffer(buffer, dtype=dtype, count=count, offset=HEADER_SIZE + 4)
+        vertices = records["vertices"]
+    else:
+        values = VERTEX.findall(bytes(buffer))
+        if not values or len(values) % 3:
+            raise StlError("O ficheiro STL nao contem triangulos validos.")
+        vertices = np.array(values, dtype=np.float64).reshape(-1, 9)
+    if not np.isfinite(vertices).all():
+        raise StlError(NON_FINITE_MESSAGE)
+
+    # One float64 copy with a contiguous row per coordinate keeps every
+    # operation below a plain vectorized loop over memory.
+    x0, y0, z0, x1, y1, z1, x2, y2, z2 = np.ascontiguousarray(vertices.T, dtype=np.float64)
+    # Overflow yields inf, which analyze_stl_buffer rejects; no warning needed.
+    with np.errstate(over="ignore", invalid="ignore"):
+        signed = x0 * (y1 * z2 - z1 * y2) - y0 * (x1 * z2 - z1 * x2) + z0 * (x1 * y2 - y1 * x2)
+        volume = abs(signed.sum()) / 6
+        ux, uy, uz = x1 - x0, y1 - y0, z1 - z0
+        wx, wy, wz = x2 - x0, y2 - y0, z2 - z0
+        cx, cy, cz = uy * wz - uz * wy, uz * wx - ux * wz, ux * wy - uy * wx
+        area = np.sqrt(cx * cx + cy * cy + cz * cz).sum() / 2
+    return float(volume), float(area), len(x0)
+
+
+def mesh_measurements_python(buffer) -> tuple[float, float, int]:
+    if is_binary_stl(buffer):
+        count = (len(buffer) - HEADER_SIZE - 4) // TRIANGLE_SIZE
+        view = memoryview(buffer)[HEADER_SIZE + 4 : HEADER_SIZE + 4 + count * TRIANGLE_SIZE]
+        triangles = (
+            (values[3:6], values[6:9], values[9:12])
+            for values in struct.iter_unpack("<12fH", view)
+        )
+    else:
+        values = [tuple(map(float, match)) for match in VERTEX.findall(bytes(buffer))]
+        if not values or len(values) % 3:
+            raise StlError("O ficheiro STL nao contem triangulos validos.")
+        count = len(values) // 3
+        triangles = (values[index : index + 3] for index in range(0, len(values), 3))
+
+    volume = area = 0.0
+    for (ax, ay, az), (bx, by, bz), (cx, cy, cz) in triangles:
+        volume += ax * (by * cz - bz * cy) - ay * (bx * cz - bz * cx) + az * (bx * cy - by * cx)
+        ux, uy, uz = bx - ax, by - ay, bz - az
+        wx, wy, wz = cx - ax, cy - ay, cz - az
+        # hypot, unlike ``x ** 2``, returns inf instead of raising on overflow.
+        area += math.hypot(uy * wz - uz * wy, uz * wx - ux * wz, ux * wy - uy * wx)
+    return abs(volume) / 6, area / 2, count
+
+
+def mesh_measurements(buffer) -> tuple[float, float, int]:
+    """Return ``(volume_mm3, surface_mm2, triangles)`` for an STL buffer."""
+    try:
+        import numpy as np
+    except ImportError:
+        return mesh_measurements_python(buffer)
+    return mesh_measurements_numpy(buffer, np)
+
+
+def material_volume(
+    volume_mm3: float,
+    surface_mm2: float,
+    infill_percentage: float = DEFAULT_INFILL_PERCENTAGE,
+    shell_thickness_mm: float = DEFAULT_SHELL_THICKNESS_MM,
+) -> float:
+    """Volume actually extruded: a solid shell plus the infilled core."""
+    shell = min(surface_mm2 * shell_thickness_mm, volume_mm3)
+    return shell + (volume_mm3 - shell) * infill_percentage / 100
+
+
+def analyze_stl_buffer(
+    buffer,
+    density: float = DEFAULT_FILAMENT_DENSITY,
+    infill_percentage: float = DEFAULT_INFILL_PERCENTAGE,
+    shell_thickness_mm: float = DEFAULT_SHELL_THICKNESS_MM,
+) -> dict:
+    volume, surface, triangles = mesh_measurements(buffer)
+    # Catches NaN/inf coordinates on the pure Python path and coordinates so
+    # large that the sums overflow on either path.
+    if not (math.isfinite(volume) and math.isfinite(surface)):
+        raise StlError(NON_FINITE_MESSAGE)
+    if triangles == 0 or volume <= 0:
+        raise StlError("O ficheiro STL nao contem um volume fechado.")
+    material = material_volume(volume, surface, infill_percentage, shell_thickness_mm)
+    weight = material / 1000 * density
+    hours = material / DEFAULT_VOLUMETRIC_FLOW_MM3_S / 3600
+    return {
+        "filament_weight_g": Decimal(str(weight)).quantize(Decimal("0.01"), ROUND_HALF_UP),
+        "print_time_hours": Decimal(str(hours)).quantize(Decimal("0.01"), ROUND_HALF_UP),
+        "volume_cm3": Decimal(str(volume / 1000)).quantize(Decimal("0.01"), ROUND_HALF_UP),
+        "surface_cm2": Decimal(str(surface / 100)).quantize(Decimal("0.01"), ROUND_HALF_UP),
+        "triangles": triangles,
+    }
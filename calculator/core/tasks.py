@@ -0,0 +1,178 @@
+"""Database-backed background tasks.
+
+Work is stored as ``Task`` rows and executed by ``manage.py runworker``; no
+broker is needed. A worker claims a task with a conditional UPDATE that only
+matches while the row is still claimable and writes a fresh claim token, so
+two workers racing for the same row cannot both win on SQLite or PostgreSQL.
+Every later write from the worker is filtered by that token, which keeps a
+worker whose claim went stale from overwriting the new owner's progress.
+"""
+
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+TASKS: dict[str, tuple] = {}
+
+
+def register(name: str, max_attempts: int = 3):
+    """Register ``func(task, **payload)`` as a task called ``name``.
+
+    The return value must be JSON serializable and is stored in
+    ``Task.result``.
+    """
+
+    def decorator(func):
+        TASKS[name] = (func, max_attempts)
+        return func
+
+    return decorator
+
+
+def enqueue(name: str, payload: dict | None = None, user=None, delay: float = 0) -> Task:
+    if name not in TASKS:
+        raise KeyError(f"Unknown task {name!r}.")
+    return Task.objects.create(
+        name=name,
+        payload=payload or {},
+        user=user,
+        max_attempts=TASKS[name][1],
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claimable(now) -> Q:
+    stale = now - timedelta(seconds=settings.TASK_CLAIM_TIMEOUT)
+    return Q(status=Task.STATUS_PENDING, run_after__lte=now) | Q(
+        status=Task.STATUS_RUNNING, claimed_at__lt=stale
+    )
+
+
+def claim(batch: int = 10) -> Task | None:
+    """Claim the next runnable task, or return ``None`` when there is none.
+
+    Running tasks whose claim is older than ``TASK_CLAIM_TIMEOUT`` belong to
+    a worker that died and are claimed again.
+    """
+    now = timezone.now()
+    Task.objects.filter(
+        claimable(now), status=Task.STATUS_RUNNING, attempts__gte=F("max_attempts")
+    ).update(
+        status=Task.STATUS_FAILED,
+        error="O worker terminou sem concluir a tarefa.",
+        claim_token="",
+        finished_at=now,
+    )
+    candidates = list(
+        Task.objects.filter(claimable(now))
+        .order_by("run_after", "pk")
+        .values_list("pk", flat=True)[:batch]
+    )
+    for pk in candidates:
+        token = uuid.uuid4().hex
+        claimed = Task.objects.filter(claimable(now), pk=pk).update(
+            status=Task.STATUS_RUNNING,
+            claim_token=token,
+            claimed_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def owned(task: Task):
+    return Task.objects.filter(pk=task.pk, claim_token=task.claim_token)
+
+
+def set_progress(task: Task, progress: int, message: str = "") -> None:
+    """Record progress (0-100) and refresh the claim so it does not go stale."""
+    task.progress = max(0, min(100, int(progress)))
+    task.progress_message = message[:200]
+    owned(task).update(
+        progress=task.progress,
+        progress_message=task.progress_message,
+        claimed_at=timezone.now(),
+    )
+
+
+def run(task: Task) -> None:
+    """Run a claimed task and store its result, or schedule a retry."""
+    entry = TASKS.get(task.name)
+    now = timezone.now()
+    if entry is None:
+        owned(task).update(
+            status=Task.STATUS_FAILED,
+            error=f"Tarefa desconhecida: {task.name}.",
+            claim_token="",
+            finished_at=now,
+        )
+        return
+
+    try:
+        result = entry[0](task, **task.payload)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if task.attempts < task.max_attempts:
+            delay = settings.TASK_RETRY_BACKOFF * 2 ** (task.attempts - 1)
+            logger.warning("Task %s #%s failed, retrying in %ss", task.name, task.pk, delay)
+            owned(task).update(
+                status=Task.STATUS_PENDING,
+                error=error,
+                claim_token="",
+                run_after=now + timedelta(seconds=delay),
+            )
+        else:
+            logger.error("Task %s #%s failed: %s", task.name, task.pk, error)
+            owned(task).update(
+                status=Task.STATUS_FAILED,
+                error=error,
+                claim_token="",
+                finished_at=now,
+            )
+        return
+
+    owned(task).update(
+        status=Task.STATUS_SUCCEEDED,
+        result=result,
+        error="",
+        progress=100,
+        claim_token="",
+        finished_at=timezone.now(),
+    )
+
+
+def serialize_task(task: Task) -> dict:
+    return {
+        "pk": task.pk,
+        "name": task.name,
+        "status": task.status,
+        "progress": task.progress,
+        "progress_message": task.progress_message,
+        "attempts": task.attempts,
+        "result": task.result if task.status == Task.STATUS_SUCCEEDED else None,
+        "created_at": task.created_at.isoformat() if task.created_at else None,
+        "finished_at": task.finished_at.isoformat() if task.finished_at else None,
+    }
+
+
+@register("pieces.reprice")
+def reprice_pieces(task: Task, at: str = "", search: str = "") -> dict:
+    """Background variant of ``piece_reprice_api_view`` for large catalogues."""
+    # Imported here: the views import this module.
+    from .views import parse_moment, reprice_summary
+
+    def progress(done: int, total: int) -> None:
+        set_progress(task, done * 100 // max(total, 1), f"{done}/{total} peças")
+
+    return reprice_summary(task.user, parse_moment(at), search, progress)
@@ -0,0 +1,34 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Keep the metrics of test runs in memory, out of the shared METRICS_DIR,
+    and give each run its own file cache instead of the shared CACHE_LOCATION.
+
+    Without a configured replica, an in-memory SQLite database is added under
+    ``DB_REPLICA_ALIAS`` so the replica routing can be tested against a real
+    second database. Nothing is routed to it unless a test enables the router.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.METRICS_WRITE_FILES = False
+        if settings.CACHES["default"]["BACKEND"].endswith("FileBasedCache"):
+            self.cache_directory = tempfile.mkdtemp(prefix="calculator-test-cache-")
+            settings.CACHES["default"]["LOCATION"] = self.cache_directory
+        settings.DATABASES.setdefault(
+            settings.DB_REPLICA_ALIAS,
+            {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+        )
+        # Fill in the defaults (TEST, OPTIONS, ...) of the added alias.
+        connections.configure_settings(settings.DATABASES)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        if getattr(self, "cache_directory", None):
+            shutil.rmtree(self.cache_directory, ignore_errors=True)
@@ -1,3 +1,1753 @@
-from django.test import TestCase
+from datetime import timedelta
+import asyncio
+import gzip
+import importlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import struct
+import subprocess
+import sys
+import time
+import zipfile
+from decimal import Decimal
+from itertools import count
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, router
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from calculator import settings as project_settings
+
+from . import tasks
+from .analysis_cache import analysis_parameters, analyze_upload, evict, store
+from .auth_backends import cache_is_shared
+from .batch_quote import analyze_models, extract_models
+from .bench import build_import_file, create_pieces, random_piece_values
+from .db_routers import read_alias
+from .gcode import GcodeError, analyze_gcode_buffer
+from .management.commands import loadtest
+from .stl import StlError, analyze_stl_buffer, mesh_measurements_python
+from .scheduler import Job, Printer, PrinterState, greedy, schedule
+from .threemf import ThreeMFError, read_3mf_plates
+from .archive import archive_print_jobs
+from .models import (
+    ArchivedPrintJob,
+    FileAnalysis,
+    FilamentPrice,
+    FilamentType,
+    InventoryItem,
+    PrintJob,
+    PrintJobChange,
+    PrintRun,
+    PrintRunItem,
+    Task,
+)
+from .metrics import MetricsRegistry
+from .middleware import PRIMARY_PIN_COOKIE
+from .tasks import serialize_task
+from .views import calculate_print_job, quote_models, unique_piece_names
+
+SMALL_BATCH = 3
+LARGE_BATCH = 30
+
+
+@override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+class QueryCountTestCase(TestCase):
+    """Each view must run the same number of queries whether the user has a
+    few rows or many; ``assertQueriesBounded`` measures both and compares."""
+
+    max_queries = 15
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        self.filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.piece_numbers = count()
+        self.seed(SMALL_BATCH)
+        self.piece = PrintJob.objects.filter(user=self.user).order_by("pk").first()
+        self.client.force_login(self.user)
+        self.client.get(reverse("dashboard"))  # warm the session and user caches
+
+    def seed(self, pieces: int) -> None:
+        start = next(self.piece_numbers) * 1000
+        created = create_pieces(self.user, self.filament, pieces, start=start)
+        # Half of the rows miss filament_type to exercise the filament guess.
+        PrintJob.objects.filter(pk__in=[piece.pk for piece in created[::2]]).update(
+            filament_type=None
+        )
+        FilamentType.objects.create(
+            user=self.user,
+            name="PETG",
+            color=f"Cor {start}",
+            price_per_kg=Decimal("25"),
+            weight_kg=Decimal("1"),
+        )
+        InventoryItem.objects.bulk_create(
+            [
+                InventoryItem(user=self.user, print_job=piece, piece_name=piece.name, quantity=2)
+                for piece in created[1::2]
+            ]
+        )
+
+    def count_queries(self, action) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = action()
+        self.assertLess(response.status_code, 400, response)
+        return len(queries)
+
+    def assertQueriesBounded(self, action, max_queries=None):
+        # The first run may create rows that later runs only update.
+        action()
+        small = self.count_queries(action)
+        self.seed(LARGE_BATCH)
+        large = self.count_queries(action)
+        self.assertEqual(
+            small, large, f"query count grows with rows: {small} -> {large}"
+        )
+        self.assertLessEqual(large, max_queries or self.max_queries)
+
+
+class DashboardQueryCountTests(QueryCountTestCase):
+    def test_dashboard(self):
+        self.assertQueriesBounded(lambda: self.client.get(reverse("dashboard")))
+
+
+class CalculatorQueryCountTests(QueryCountTestCase):
+    def test_list(self):
+        self.assertQueriesBounded(lambda: self.client.get(reverse("calculator")))
+
+    def test_open_edit_modal(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("calculator"), {"open_edit": self.piece.pk})
+        )
+
+    def test_calculate(self):
+        payload = {
+            "piece_name": "",
+            "filament_type": self.filament.pk,
+            "filament_weight_g": "120.50",
+            "print_time_hours": "6.25",
+            "labour_time_minutes": "15",
+            "margin_percentage": "35",
+        }
+        self.assertQueriesBounded(
+            lambda: self.client.post(reverse("calculator"), payload)
+        )
+
+    def test_edit_piece(self):
+        payload = {
+            "piece_id": self.piece.pk,
+            "piece_name": self.piece.name,
+            "filament_type": self.filament.pk,
+            "filament_weight_g": "10",
+            "print_time_hours": "1",
+            "labour_time_minutes": "5",
+            "margin_percentage": "20",
+        }
+        self.assertQueriesBounded(
+            lambda: self.client.post(reverse("calculator"), payload)
+        )
+
+    def test_add_to_inventory(self):
+        payload = {"action": "add_to_inventory", "piece_id": self.piece.pk, "quantity": 1}
+        self.assertQueriesBounded(
+            lambda: self.client.post(reverse("calculator"), payload)
+        )
+
+
+class PiecesListQueryCountTests(QueryCountTestCase):
+    def test_list(self):
+        self.assertQueriesBounded(lambda: self.client.get(reverse("pieces_list")))
+
+    def test_search(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("pieces_list"), {"search": "Pe"})
+        )
+
+    def test_open_edit_modal(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("pieces_list"), {"open_edit": self.piece.pk})
+        )
+
+    def test_edit_piece(self):
+        payload = {
+            "piece_id": self.piece.pk,
+            "piece_name": self.piece.name,
+            "filament_type": self.filament.pk,
+            "filament_weight_g": "10",
+            "print_time_hours": "1",
+            "labour_time_minutes": "5",
+            "margin_percentage": "20",
+        }
+        self.assertQueriesBounded(
+            lambda: self.client.post(reverse("pieces_list"), payload)
+        )
+
+    def test_add_to_inventory(self):
+        payload = {"action": "add_to_inventory", "piece_id": self.piece.pk, "quantity": 1}
+        self.assertQueriesBounded(
+            lambda: self.client.post(reverse("pieces_list"), payload)
+        )
+
+    def test_piece_edit_and_delete_views(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("piece_edit", args=[self.piece.pk]))
+        )
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("piece_delete", args=[self.piece.pk]))
+        )
+
+
+class InventoryQueryCountTests(QueryCountTestCase):
+    def test_filaments_tab(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("inventory"), {"tab": "filaments"})
+        )
+
+    def test_pieces_tab_sorted_by_value(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(
+                reverse("inventory"), {"tab": "pieces", "pieces_sort": "-value"}
+            )
+        )
+
+    def test_search(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("inventory"), {"pieces_search": "Pe"})
+        )
+
+    def test_open_edit_modals(self):
+        item = InventoryItem.objects.filter(user=self.user).first()
+        self.assertQueriesBounded(
+            lambda: self.client.get(
+                reverse("inventory"),
+                {"tab": "pieces", "open_inventory_item_edit": item.pk},
+            )
+        )
+        self.assertQueriesBounded(
+            lambda: self.client.get(
+                reverse("inventory"), {"open_filament_edit": self.filament.pk}
+            )
+        )
+
+    def test_edit_filament(self):
+        payload = {
+            "action": "edit_filament",
+            "filament_id": self.filament.pk,
+            "name": "PLA",
+            "color": "Azul",
+            "price_per_kg": "21",
+            "weight_kg": "1",
+        }
+        self.assertQueriesBounded(
+            lambda: self.client.post(reverse("inventory"), payload)
+        )
+
+    def test_edit_inventory_item(self):
+        item = InventoryItem.objects.filter(user=self.user).first()
+        payload = {"action": "edit_inventory_item", "item_id": item.pk, "quantity": 4}
+        self.assertQueriesBounded(
+            lambda: self.client.post(reverse("inventory"), payload)
+        )
+
+    def test_add_piece_view(self):
+        self.assertQueriesBounded(
+            lambda: self.client.post(
+                reverse("inventory_add_piece", args=[self.piece.pk]), {"quantity": 1}
+            )
+        )
+
+    def test_redirect_and_confirm_views(self):
+        item = InventoryItem.objects.filter(user=self.user).first()
+        for url in (
+            reverse("inventory_filament_edit", args=[self.filament.pk]),
+            reverse("inventory_filament_delete", args=[self.filament.pk]),
+            reverse("inventory_item_edit", args=[item.pk]),
+            reverse("inventory_item_delete", args=[item.pk]),
+        ):
+            with self.subTest(url=url):
+                self.assertQueriesBounded(lambda: self.client.get(url))
+
+
+@override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+class InventoryViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        self.client.force_login(self.user)
+        self.filaments = FilamentType.objects.bulk_create(
+            [
+                FilamentType(
+                    user=self.user,
+                    name=f"PLA {index:02d}",
+                    color="Preto",
+                    price_per_kg=Decimal(10 + index),
+                    weight_kg=Decimal("1"),
+                )
+                for index in range(30)
+            ]
+        )
+
+    def get(self, **params):
+        response = self.client.get(reverse("inventory"), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_search_ignores_accents_and_case(self):
+        FilamentType.objects.create(
+            user=self.user,
+            name="Seda",
+            color="Açafrão",
+            price_per_kg=Decimal("30"),
+            weight_kg=Decimal("1"),
+        )
+        piece = create_pieces(self.user, self.filaments[0], 1)[0]
+        InventoryItem.objects.create(
+            user=self.user, print_job=piece, piece_name=piece.name, quantity=1
+        )
+        for query in ("acafrao", "AÇAFRÃO", "Ç"):
+            filaments = self.get(filaments_search=query).context["filaments"]
+            self.assertEqual([filament.name for filament in filaments], ["Seda"], query)
+        for query in ("peca", "PEÇA", "ç"):
+            items = self.get(pieces_search=query).context["inventory_items"]
+            self.assertEqual([item.piece_name for item in items], [piece.name], query)
+        self.assertEqual(self.get(filaments_search="%").context["filaments"], [])
+
+    def test_sort_and_pagination(self):
+        response = self.get(filaments_sort="-price")
+        page = response.context["filaments_page"]
+        self.assertEqual(page.paginator.count, 30)
+        self.assertEqual(len(page.object_list), 25)
+        self.assertEqual(response.context["filaments"][0].name, "PLA 29")
+
+        response = self.get(filaments_sort="-price", filaments_page=2)
+        names = [filament.name for filament in response.context["filaments"]]
+        self.assertEqual(names, ["PLA 04", "PLA 03", "PLA 02", "PLA 01", "PLA 00"])
+
+        response = self.get(filaments_sort="bogus")
+        self.assertEqual(response.context["filaments_sort"], "name")
+        self.assertEqual(response.context["filaments"][0].name, "PLA 00")
+
+    def test_open_edit_link_for_row_on_another_page(self):
+        target = self.filaments[-1]
+        response = self.get(open_filament_edit=target.pk)
+        self.assertNotIn(target, response.context["filaments"])
+        self.assertEqual(response.context["filament_edit_open_pk"], str(target.pk))
+        self.assertContains(response, f'data-edit-id="{target.pk}"')
+
+        other = get_user_model().objects.create_user(username="other")
+        foreign = FilamentType.objects.create(
+            user=other, name="PETG", price_per_kg=Decimal("25"), weight_kg=Decimal("1")
+        )
+        response = self.get(open_filament_edit=foreign.pk)
+        self.assertIsNone(response.context["filament_edit_open_pk"])
+
+
+class ImportExportQueryCountTests(QueryCountTestCase):
+    def test_export(self):
+        self.assertQueriesBounded(lambda: self.client.get(reverse("piece_export")))
+
+    def test_import(self):
+        batches = count()
+
+        def import_file(rows):
+            content = build_import_file(rows, prefix=f"Importada {next(batches)}")
+            upload = SimpleUploadedFile("pecas.xlsx", content)
+            return self.client.post(reverse("piece_import"), {"file": upload})
+
+        small = self.count_queries(lambda: import_file(SMALL_BATCH))
+        large = self.count_queries(lambda: import_file(LARGE_BATCH))
+        self.assertEqual(small, large)
+        self.assertEqual(
+            PrintJob.objects.filter(name__startswith="Importada").count(),
+            SMALL_BATCH + LARGE_BATCH,
+        )
+
+    def test_import_skips_duplicate_names(self):
+        content = build_import_file(2, prefix="Repetida")
+        for _ in range(2):
+            upload = SimpleUploadedFile("pecas.xlsx", content)
+            response = self.client.post(reverse("piece_import"), {"file": upload})
+        self.assertEqual(len(response.context["warnings"]), 2)
+        self.assertEqual(PrintJob.objects.filter(name__startswith="Repetida").count(), 2)
+
+    def test_search_api(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("piece_search_api"), {"search": "Pe"})
+        )
+
+    def test_detail_api(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("piece_api_detail", args=[self.piece.pk]))
+        )
+
+
+@tasks.register("tests.add", max_attempts=2)
+def add_task(task, a, b):
+    tasks.set_progress(task, 50, "A somar")
+    if a < 0:
+        raise ValueError("negative")
+    return a + b
+
+
+@override_settings(METRICS_ENABLED=True, PERF_INSTRUMENTATION=True)
+class AsyncMiddlewareTests(TestCase):
+    async def test_async_view_runs_on_the_event_loop(self):
+        user = await get_user_model().objects.acreate(username="owner")
+        task = await Task.objects.acreate(name="tests.add", user=user, run_after=timezone.now())
+        await self.async_client.aforce_login(user)
+        loop = asyncio.get_running_loop()
+        loops = []
+
+        def serialize(task):
+            loops.append(asyncio.get_running_loop())
+            return serialize_task(task)
+
+        # A sync-only middleware makes Django wrap the rest of the chain, and
+        # the async view with it, in async_to_sync.
+        with mock.patch("core.views.serialize_task", side_effect=serialize), mock.patch(
+            "django.core.handlers.base.async_to_sync", side_effect=AssertionError
+        ):
+            response = await self.async_client.get(
+                reverse("task_status_api", args=[task.pk])
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loops, [loop])
+        # Queries run on a worker thread and are still counted.
+        self.assertRegex(response["Server-Timing"], r'desc="[1-9]\d* queries"')
+
+
+@override_settings(
+    METRICS_ENABLED=False,
+    PERF_INSTRUMENTATION=False,
+    DATABASE_ROUTERS=["core.db_routers.PrimaryReplicaRouter"],
+)
+class ReplicaRoutingTests(TestCase):
+    # The test runner adds an in-memory SQLite database as the replica.
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=self.user,
+            name="PLA",
+            color="Preto",
+            price_per_kg=Decimal("20"),
+            weight_kg=Decimal("1"),
+        )
+        self.pieces = create_pieces(self.user, filament, 2)
+        # The replica has caught up with everything above, plus one piece the
+        # primary does not have, so reads from it can be told apart.
+        for obj in [self.user, filament, *self.pieces]:
+            obj.save(using="replica", force_insert=True)
+        self.replica_only = PrintJob.objects.using("replica").create(
+            user=self.user,
+            filament_type=filament,
+            name="Só na réplica",
+            **random_piece_values(random.Random(1), filament.price_per_kg),
+        )
+        self.client.force_login(self.user)
+
+    def test_replica_views_read_the_replica(self):
+        response = self.client.get(reverse("pieces_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Só na réplica")
+        # Views that are not marked replica_read stay on the primary.
+        response = self.client.get(reverse("piece_edit", args=[self.replica_only.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_auth_and_sessions_are_read_from_the_primary(self):
+        # The session only exists on the primary; the login must still hold.
+        response = self.client.get(reverse("pieces_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+        token = read_alias.set("replica")
+        try:
+            for model in [get_user_model(), Session, ContentType, PrintJob]:
+                expected = "replica" if model is PrintJob else "default"
+                self.assertEqual(router.db_for_read(model), expected)
+                self.assertEqual(router.db_for_write(model), "default")
+        finally:
+            read_alias.reset(token)
+
+    def test_a_write_pins_reads_to_the_primary(self):
+        deleted = self.pieces[1]
+        response = self.client.post(reverse("piece_delete", args=[deleted.pk]))
+        self.assertEqual(response.status_code, 302)
+        pinned_until = int(response.cookies[PRIMARY_PIN_COOKIE].value)
+        self.assertGreater(pinned_until, time.time())
+        self.assertFalse(PrintJob.objects.filter(pk=deleted.pk).exists())
+        # Replication has not caught up yet.
+        self.assertTrue(PrintJob.objects.using("replica").filter(pk=deleted.pk).exists())
+
+        response = self.client.get(reverse("pieces_list"))
+        self.assertContains(response, self.pieces[0].name)
+        self.assertNotContains(response, deleted.name)
+        self.assertNotContains(response, "Só na réplica")
+
+        # Once the pin expires, reads go back to the replica.
+        self.client.cookies[PRIMARY_PIN_COOKIE] = str(int(time.time()) - 1)
+        response = self.client.get(reverse("pieces_list"))
+        self.assertContains(response, deleted.name)
+        self.assertContains(response, "Só na réplica")
+
+
+@override_settings(
+    METRICS_ENABLED=False, PERF_INSTRUMENTATION=False, ALLOWED_HOSTS=["localhost"]
+)
+class BenchCommandTests(TestCase):
+    def test_bench_rolls_back_its_data(self):
+        stdout = io.StringIO()
+        with mock.patch("core.management.commands.bench.build_import_file") as build:
+            build.side_effect = build_import_file
+            call_command(
+                "bench",
+                users=1,
+                pieces=5,
+                repeat=2,
+                import_rows=3,
+                stdout=stdout,
+                stderr=io.StringIO(),
+            )
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report["views"]["piece_import"]["status"], [302])
+        # Built up front: one file per timed run plus the tracemalloc run.
+        self.assertEqual(build.call_count, 3)
+        self.assertFalse(PrintJob.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class LoadtestCommandTests(SimpleTestCase):
+    def test_only_the_expected_outcome_is_a_success(self):
+        classify = loadtest.Command.classify
+        saved = b"<li>Peca &#x27;Carga 1&#x27; calculada e guardada com sucesso.</li>"
+        self.assertIsNone(classify("calculate", 200, saved))
+        # A form error re-renders the calculator with a 200.
+        self.assertEqual(classify("calculate", 200, b"<form>...</form>"), "not_saved")
+        self.assertIsNone(classify("edit", 302, b""))
+        self.assertEqual(classify("edit", 200, b"<form>...</form>"), "http_200")
+        self.assertEqual(classify("list", 500, b"<h1>Server Error (500)</h1>"), "http_500")
+        self.assertEqual(
+            classify("add_to_inventory", 500, b"OperationalError: database is locked"),
+            "database_locked",
+        )
+
+    def test_server_log_counts_errors_hidden_by_debug_off(self):
+        log = (
+            b'"POST /calculator/ HTTP/1.1" 200 5120\n'
+            b"Internal Server Error: /calculator/\n"
+            b"Traceback (most recent call last):\n"
+            b"sqlite3.OperationalError: database is locked\n"
+            b"\nThe above exception was the direct cause of the following exception:\n\n"
+            b"django.db.utils.OperationalError: database is locked\n"
+            b"Internal Server Error: /pieces/\n"
+            b"ValueError: boom\n"
+        )
+        self.assertEqual(
+            loadtest.Command.read_server_log(log),
+            {"server_errors": 2, "database_locked": 1},
+        )
+
+
+@override_settings(TASK_RETRY_BACKOFF=0)
+class TaskQueueTests(TestCase):
+    def test_claim_run_and_status(self):
+        user = get_user_model().objects.create_user(username="owner")
+        task = tasks.enqueue("tests.add", {"a": 2, "b": 3}, user=user)
+        claimed = tasks.claim()
+        self.assertEqual(claimed.pk, task.pk)
+        self.assertIsNone(tasks.claim())
+        tasks.run(claimed)
+
+        self.client.force_login(user)
+        response = self.client.get(reverse("task_status_api", args=[task.pk]))
+        self.assertEqual(response.json()["status"], Task.STATUS_SUCCEEDED)
+        self.assertEqual(response.json()["result"], 5)
+        self.assertEqual(response.json()["progress"], 100)
+
+    def test_retries_then_fails(self):
+        task = tasks.enqueue("tests.add", {"a": -1, "b": 0})
+        with self.assertLogs("core.tasks", "WARNING"):
+            tasks.run(tasks.claim())
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.STATUS_PENDING, 1))
+        with self.assertLogs("core.tasks", "ERROR"):
+            tasks.run(tasks.claim())
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.STATUS_FAILED, 2))
+        self.assertIn("ValueError", task.error)
+
+    def test_stale_claim_is_taken_over(self):
+        task = tasks.enqueue("tests.add", {"a": 1, "b": 1})
+        first = tasks.claim()
+        Task.objects.filter(pk=task.pk).update(
+            claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        second = tasks.claim()
+        self.assertEqual(second.pk, task.pk)
+        self.assertNotEqual(first.claim_token, second.claim_token)
+
+        # The stale worker can no longer write to the task.
+        tasks.run(first)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_RUNNING)
+        tasks.run(second)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_SUCCEEDED)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.old, self.stocked, self.recent = create_pieces(self.user, filament, 3)
+        PrintJob.objects.filter(pk__in=[self.old.pk, self.stocked.pk]).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+        InventoryItem.objects.create(
+            user=self.user, print_job=self.stocked, piece_name=self.stocked.name
+        )
+
+    def test_archives_old_pieces_outside_inventory(self):
+        self.assertEqual(archive_print_jobs(365, batch_size=1), 1)
+        self.assertEqual(
+            set(PrintJob.objects.values_list("pk", flat=True)),
+            {self.stocked.pk, self.recent.pk},
+        )
+        archived = ArchivedPrintJob.objects.get()
+        self.assertEqual(archived.original_id, self.old.pk)
+        self.assertEqual(archived.price_final, self.old.price_final)
+        self.assertLess(archived.created_at, timezone.now() - timedelta(days=365))
+
+    def test_archived_pieces_are_searchable_on_request(self):
+        archive_print_jobs(365)
+        self.client.force_login(self.user)
+        url = reverse("piece_search_api")
+        hot = self.client.get(url, {"search": str(self.old.pk)}).json()["results"]
+        self.assertNotIn(self.old.pk, [piece["pk"] for piece in hot])
+        cold = self.client.get(url, {"search": str(self.old.pk), "archived": "1"}).json()
+        self.assertEqual([piece["pk"] for piece in cold["results"]], [self.old.pk])
+        response = self.client.get(reverse("piece_export"), {"archived": "1"})
+        self.assertIn("arquivadas", response["Content-Disposition"])
+
+
+class GcodeTests(TestCase):
+    MOVES = b"G90\nM83\nG92 E0\nG1 F6000\n" + b"G1 X100 Y0 E10 ; perimeter\nG1 X0 Y0 E10\n" * 30
+
+    def test_slicer_comments_take_precedence(self):
+        gcode = self.MOVES + (
+            b"; filament used [g] = 12.5, 1.5\n"
+            b"; estimated printing time (normal mode) = 1h 30m 0s\n"
+        )
+        analysis = analyze_gcode_buffer(gcode)
+        self.assertEqual(analysis["source"], "slicer")
+        self.assertEqual(analysis["filament_weight_g"], Decimal("14.00"))
+        self.assertEqual(analysis["print_time_hours"], Decimal("1.50"))
+
+    def test_moves_are_replayed_without_comments(self):
+        analysis = analyze_gcode_buffer(self.MOVES, diameter_mm=1.75, density=1.24)
+        # 600 mm of 1.75 mm filament at 1.24 g/cm3; 6 m at 100 mm/s.
+        self.assertEqual(analysis["source"], "moves")
+        self.assertEqual(analysis["filament_weight_g"], Decimal("1.79"))
+        self.assertEqual(analysis["print_time_hours"], Decimal("0.02"))
+
+    def test_file_without_moves_is_rejected(self):
+        with self.assertRaises(GcodeError):
+            analyze_gcode_buffer(b"; empty\nM104 S200\n")
+
+    def test_exponents_are_read_whole(self):
+        analysis = analyze_gcode_buffer(b"; filament used [g] = 1e1\n;TIME:3.6e3\n")
+        self.assertEqual(analysis["filament_weight_g"], Decimal("10.00"))
+        self.assertEqual(analysis["print_time_hours"], Decimal("1.00"))
+
+    def test_malformed_values_raise_gcode_error(self):
+        time = b";TIME:3600\n"
+        cases = {
+            "1..2": b"; filament used [g] = 1..2\n" + time,
+            "nan": b"; filament used [g] = nan\n" + time,
+            "inf": b";   Plastic weight: inf g\n" + time,
+            "huge": b"; filament used [g] = 1e300\n" + time,
+            "overflow": b"; filament used [g] = 1e308, 1e308\n" + time,
+            "bad move": b"G1 X1..2 E1\n",
+            "short": b"; filament used [g] = 5\n;TIME:10\n",
+        }
+        for label, gcode in cases.items():
+            with self.subTest(label), self.assertRaises(GcodeError):
+                analyze_gcode_buffer(gcode)
+
+    @override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+    def test_bad_uploads_are_form_errors(self):
+        user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.client.force_login(user)
+        for content in (
+            b"; filament used [g] = 1..2\n;TIME:3600\n",
+            b"; filament used [g] = 1e300\n;TIME:3600\n",
+            b"; filament used [g] = 1e9\n;TIME:3600\n",
+        ):
+            with self.subTest(content=content):
+                response = self.client.post(
+                    reverse("calculator"),
+                    {
+                        "piece_name": "Com G-code",
+                        "filament_type": filament.pk,
+                        "gcode_file": SimpleUploadedFile("peca.gcode", content),
+                        "labour_time_minutes": "10",
+                        "margin_percentage": "30",
+                    },
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.context["form"].errors["gcode_file"])
+        self.assertFalse(PrintJob.objects.exists())
+
+        analysis = analyze_gcode_buffer(b"; filament used [g] = 1e9\n;TIME:3600\n")
+        models = [{"name": "a.gcode", "analysis": analysis}]
+        pieces, report = quote_models(user, filament, models, Decimal("0"), Decimal("10"))
+        self.assertEqual((pieces, report[0]["status"]), ([], "error"))
+
+    @override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+    def test_calculator_reads_weight_and_time_from_upload(self):
+        user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.client.force_login(user)
+        upload = SimpleUploadedFile(
+            "peca.gcode", b";TIME:7200\n;Filament used: 1m\n" + self.MOVES
+        )
+        response = self.client.post(
+            reverse("calculator"),
+            {
+                "piece_name": "Com G-code",
+                "filament_type": filament.pk,
+                "gcode_file": upload,
+                "labour_time_minutes": "10",
+                "margin_percentage": "30",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        piece = PrintJob.objects.get(name="Com G-code")
+        self.assertEqual(piece.print_time_hours, Decimal("2.00"))
+        self.assertEqual(piece.filament_weight_g, Decimal("2.98"))
+
+
+def cube_stl(size: float = 20.0) -> bytes:
+    corners = [(x, y, z) for z in (0, size) for y in (0, size) for x in (0, size)]
+    faces = [
+        (0, 2, 3), (0, 3, 1), (4, 5, 7), (4, 7, 6), (0, 1, 5), (0, 5, 4),
+        (1, 3, 7), (1, 7, 5), (3, 2, 6), (3, 6, 7), (2, 0, 4), (2, 4, 6),
+    ]
+    triangles = b"".join(
+        struct.pack("<12fH", 0, 0, 0, *(coord for index in face for coord in corners[index]), 0)
+        for face in faces
+    )
+    return b"\0" * 80 + struct.pack("<I", len(faces)) + triangles
+
+
+class StlTests(TestCase):
+    def test_cube_volume_and_weight(self):
+        estimate = analyze_stl_buffer(
+            cube_stl(), density=1.0, infill_percentage=0, shell_thickness_mm=1
+        )
+        self.assertEqual(estimate["volume_cm3"], Decimal("8.00"))
+        self.assertEqual(estimate["surface_cm2"], Decimal("24.00"))
+        # Only the 1 mm shell is printed: 2400 mm2 x 1 mm at 1 g/cm3.
+        self.assertEqual(estimate["filament_weight_g"], Decimal("2.40"))
+
+    def test_ascii_matches_binary(self):
+        binary = cube_stl()
+        ascii_lines = [b"solid cube"]
+        for offset in range(84, len(binary), 50):
+            values = struct.unpack_from("<12f", binary, offset)
+            ascii_lines += [b"facet normal 0 0 0", b"outer loop"]
+            ascii_lines += [b"vertex %f %f %f" % values[i : i + 3] for i in (3, 6, 9)]
+            ascii_lines += [b"endloop", b"endfacet"]
+        ascii_lines.append(b"endsolid cube")
+        self.assertEqual(
+            analyze_stl_buffer(b"\n".join(ascii_lines)), analyze_stl_buffer(binary)
+        )
+        volume, area, triangles = mesh_measurements_python(binary)
+        self.assertEqual((round(volume), round(area), triangles), (8000, 2400, 12))
+
+    def test_non_finite_coordinates_are_rejected(self):
+        binary = bytearray(cube_stl())
+        struct.pack_into("<f", binary, 84 + 12, float("nan"))
+        ascii_stl = b"solid s\nvertex 0 0 0\nvertex inf 0 0\nvertex 0 1 1\nendsolid s"
+        huge = b"solid s\nvertex 0 0 0\nvertex 1e200 0 0\nvertex 0 1e200 1e200\nendsolid s"
+        for numpy_available in (True, False):
+            modules = {} if numpy_available else {"numpy": None}
+            for buffer in (bytes(binary), ascii_stl, huge):
+                with self.subTest(numpy=numpy_available, buffer=buffer[:20]):
+                    with mock.patch.dict(sys.modules, modules):
+                        with self.assertRaisesMessage(StlError, "NaN ou infinito"):
+                            analyze_upload(
+                                SimpleUploadedFile("m.stl", buffer),
+                                analysis_parameters("stl", density=1.24),
+                                analyze_stl_buffer,
+                            )
+        self.assertFalse(FileAnalysis.objects.exists())
+
+    @override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+    def test_estimate_prefills_calculator(self):
+        user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse("calculator"),
+            {
+                "action": "estimate_stl",
+                "stl_file": SimpleUploadedFile("suporte.stl", cube_stl()),
+                "filament_type": filament.pk,
+                "infill_percentage": "20",
+                "shell_thickness_mm": "1.2",
+            },
+        )
+        initial = response.context["form"].initial
+        self.assertEqual(initial["piece_name"], "suporte")
+        self.assertEqual(initial["filament_type"], filament.pk)
+        self.assertGreater(initial["filament_weight_g"], 0)
+        self.assertFalse(PrintJob.objects.exists())
+
+
+def build_zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class AnalysisCacheTests(TestCase):
+    def test_hit_skips_parsing(self):
+        calls = []
+
+        def analyze(buffer):
+            calls.append(len(buffer))
+            return analyze_stl_buffer(buffer)
+
+        parameters = analysis_parameters("stl", density=1.24)
+        first = analyze_upload(SimpleUploadedFile("a.stl", cube_stl()), parameters, analyze)
+        second = analyze_upload(SimpleUploadedFile("b.stl", cube_stl()), parameters, analyze)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second, first)
+        self.assertIsInstance(second["volume_cm3"], Decimal)
+        self.assertEqual(FileAnalysis.objects.get().hits, 1)
+
+        other_density = analysis_parameters("stl", density=1.04)
+        analyze_upload(SimpleUploadedFile("c.stl", cube_stl()), other_density, analyze)
+        self.assertEqual(len(calls), 2)
+
+    def test_eviction_by_age_and_count(self):
+        analysis = {"filament_weight_g": Decimal("1"), "print_time_hours": Decimal("1")}
+        store({f"{n:064x}": (10, analysis) for n in range(4)}, "gcode:density=1.24")
+        FileAnalysis.objects.filter(sha256=f"{0:064x}").update(
+            last_used_at=timezone.now() - timedelta(days=400)
+        )
+        FileAnalysis.objects.filter(sha256=f"{1:064x}").update(
+            last_used_at=timezone.now() - timedelta(days=1)
+        )
+        with self.settings(FILE_ANALYSIS_CACHE_MAX_ENTRIES=2):
+            self.assertEqual(evict(), 2)
+        self.assertEqual(
+            set(FileAnalysis.objects.values_list("sha256", flat=True)),
+            {f"{2:064x}", f"{3:064x}"},
+        )
+
+
+SLICE_INFO = b"""<?xml version="1.0" encoding="UTF-8"?>
+<config>
+  <plate>
+    <metadata key="index" value="1"/>
+    <metadata key="prediction" value="3600"/>
+    <metadata key="weight" value="12.50"/>
+  </plate>
+  <plate>
+    <metadata key="index" value="2"/>
+    <metadata key="prediction" value="5400"/>
+    <filament id="1" type="PLA" used_m="1.2" used_g="3.25"/>
+    <filament id="2" type="PLA" used_m="0.4" used_g="1.25"/>
+  </plate>
+</config>
+"""
+
+
+def cube_3mf_model(size: float = 20.0) -> bytes:
+    corners = [(x, y, z) for z in (0, size) for y in (0, size) for x in (0, size)]
+    faces = [
+        (0, 2, 3), (0, 3, 1), (4, 5, 7), (4, 7, 6), (0, 1, 5), (0, 5, 4),
+        (1, 3, 7), (1, 7, 5), (3, 2, 6), (3, 6, 7), (2, 0, 4), (2, 4, 6),
+    ]
+    vertices = "".join(f'<vertex x="{x}" y="{y}" z="{z}"/>' for x, y, z in corners)
+    triangles = "".join(f'<triangle v1="{a}" v2="{b}" v3="{c}"/>' for a, b, c in faces)
+    return (
+        '<model xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">'
+        f'<resources><object id="1"><mesh><vertices>{vertices}</vertices>'
+        f"<triangles>{triangles}</triangles></mesh></object></resources></model>"
+    ).encode()
+
+
+class ThreeMFTests(TestCase):
+    def test_reads_each_plate_from_slice_info(self):
+        project = io.BytesIO(
+            build_zip(
+                {"3D/3dmodel.model": cube_3mf_model(), "Metadata/slice_info.config": SLICE_INFO}
+            )
+        )
+        plates = read_3mf_plates(project, density=1.24)
+        self.assertEqual(
+            [(p["plate"], p["filament_weight_g"], p["print_time_hours"]) for p in plates],
+            [(1, Decimal("12.50"), Decimal("1.00")), (2, Decimal("4.50"), Decimal("1.50"))],
+        )
+
+    def test_falls_back_to_plate_gcode_then_mesh(self):
+        gcode = b"; filament used [g] = 7.5\n" + b"G1 X1 E1\n" * 50000
+        gcode += b"; total estimated time: 2h 0m 0s\n"
+        plates = read_3mf_plates(io.BytesIO(build_zip({"Metadata/plate_3.gcode": gcode})), 1.24)
+        self.assertEqual(plates[0]["plate"], 3)
+        self.assertEqual(plates[0]["filament_weight_g"], Decimal("7.50"))
+        self.assertEqual(plates[0]["print_time_hours"], Decimal("2.00"))
+
+        mesh = read_3mf_plates(io.BytesIO(build_zip({"3D/3dmodel.model": cube_3mf_model()})), 1.24)
+        expected = analyze_stl_buffer(cube_stl(), density=1.24)
+        self.assertEqual(mesh[0]["filament_weight_g"], expected["filament_weight_g"])
+        self.assertEqual(mesh[0]["source"], "mesh")
+
+    def test_rejects_projects_without_estimates(self):
+        with self.assertRaises(ThreeMFError):
+            read_3mf_plates(io.BytesIO(build_zip({"Metadata/other.config": b"<config/>"})), 1.24)
+        with self.assertRaises(ThreeMFError):
+            read_3mf_plates(io.BytesIO(b"not a zip"), 1.24)
+
+    def test_rejects_malformed_projects(self):
+        model = cube_3mf_model()
+        cases = {
+            "truncated slice_info": {"Metadata/slice_info.config": SLICE_INFO[:-40]},
+            "vertex without x": {"3D/3dmodel.model": model.replace(b'x="0"', b"", 1)},
+            "triangle past the vertices": {
+                "3D/3dmodel.model": model.replace(b'v3="3"', b'v3="99"', 1)
+            },
+            "negative triangle index": {
+                "3D/3dmodel.model": model.replace(b'v3="3"', b'v3="-1"', 1)
+            },
+        }
+        for case, files in cases.items():
+            with self.subTest(case=case), self.assertRaises(ThreeMFError):
+                read_3mf_plates(io.BytesIO(build_zip(files)), 1.24)
+
+
+@override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+class BatchQuoteTests(TestCase):
+    GCODE = b";TIME:3600\n;Filament used: 1m\n" + GcodeTests.MOVES
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="owner")
+        self.filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.client.force_login(self.user)
+
+    def post_archive(self, files: dict):
+        return self.client.post(
+            reverse("piece_batch_quote"),
+            {
+                "archive": SimpleUploadedFile("modelos.zip", build_zip(files)),
+                "filament_type": self.filament.pk,
+                "labour_time_minutes": "5",
+                "margin_percentage": "30",
+            },
+        )
+
+    def test_creates_pieces_and_reports_each_file(self):
+        PrintJob.objects.create(
+            user=self.user, name="existente", **random_piece_values(random.Random(0), Decimal("20"))
+        )
+        response = self.post_archive(
+            {
+                "pecas/suporte.gcode": self.GCODE,
+                "pecas/cubo.stl": cube_stl(),
+                "existente.stl": cube_stl(10),
+                "vazio.gcode": b"; nada\n",
+                "__MACOSX/._suporte.gcode": b"x",
+                "leia-me.txt": b"ignorado",
+            }
+        )
+        statuses = {row["file"]: row["status"] for row in response.context["report"]}
+        self.assertEqual(
+            statuses,
+            {
+                "pecas/suporte.gcode": "created",
+                "pecas/cubo.stl": "created",
+                "existente.stl": "skipped",
+                "vazio.gcode": "error",
+            },
+        )
+        piece = PrintJob.objects.get(name="suporte")
+        self.assertEqual(piece.print_time_hours, Decimal("1.00"))
+        self.assertEqual(piece.filament_type, self.filament)
+
+    def test_a_malformed_3mf_only_fails_its_own_row(self):
+        broken = build_zip({"Metadata/slice_info.config": SLICE_INFO[:-40]})
+        response = self.post_archive({"partido.3mf": broken, "cubo.stl": cube_stl()})
+        statuses = {row["file"]: row["status"] for row in response.context["report"]}
+        self.assertEqual(statuses, {"partido.3mf": "error", "cubo.stl": "created"})
+
+    def test_results_are_cached_by_content(self):
+        with self.settings(BATCH_QUOTE_WORKERS=1):
+            self.post_archive({"a.gcode": self.GCODE})
+            response = self.post_archive({"b.gcode": self.GCODE})
+        self.assertTrue(response.context["report"][0]["cached"])
+
+    def test_multi_plate_3mf_gives_one_piece_per_plate(self):
+        project = build_zip({"Metadata/slice_info.config": SLICE_INFO})
+        response = self.client.post(
+            reverse("piece_batch_quote"),
+            {
+                "archive": SimpleUploadedFile("suporte.3mf", project),
+                "filament_type": self.filament.pk,
+                "labour_time_minutes": "0",
+                "margin_percentage": "30",
+            },
+        )
+        self.assertEqual(
+            [row["file"] for row in response.context["report"]],
+            ["suporte.3mf (placa 1)", "suporte.3mf (placa 2)"],
+        )
+        piece = PrintJob.objects.get(name="suporte - placa 2")
+        self.assertEqual(piece.filament_weight_g, Decimal("4.50"))
+        self.assertEqual(piece.print_time_hours, Decimal("1.50"))
+
+    def test_process_pool(self):
+        archive = io.BytesIO(build_zip({f"peca{n}.stl": cube_stl(10 + n) for n in range(3)}))
+        with tempfile.TemporaryDirectory() as directory:
+            models = extract_models(archive, Path(directory))
+            analyze_models(models, density=1.24, workers=2)
+        self.assertEqual(
+            [model["analysis"]["volume_cm3"] for model in models],
+            [Decimal("1.00"), Decimal("1.33"), Decimal("1.73")],
+        )
+
+
+class SchedulerTests(TestCase):
+    def test_local_search_improves_lpt(self):
+        jobs = [Job(n, f"p{n}", hours) for n, hours in enumerate([5, 5, 4, 4, 3, 3, 3])]
+        plan = schedule(jobs, [Printer("a", 100), Printer("b", 100)])
+        self.assertEqual(plan["greedy_makespan_hours"], 15)
+        self.assertEqual(plan["makespan_hours"], 14)
+        self.assertEqual(sum(len(printer["jobs"]) for printer in plan["printers"]), 7)
+
+    def test_groups_filaments_and_respects_capacity(self):
+        jobs = [Job("a", "a", 1, "PLA", quantity=2), Job("b", "b", 1, "PETG", quantity=2)]
+        plan = schedule(jobs, [Printer("x", 10), Printer("y", 10)], changeover_hours=1)
+        self.assertEqual(plan["makespan_hours"], 2)
+        self.assertEqual([printer["changeovers"] for printer in plan["printers"]], [0, 0])
+
+        plan = schedule([Job("big", "big", 12, quantity=3)], [Printer("x", 30)])
+        self.assertEqual(plan["unscheduled"], [{"key": "big", "name": "big", "quantity": 1}])
+        self.assertEqual(plan["printers"][0]["jobs"][0]["end_hours"], 24)
+
+    def test_copies_in_bulk_match_one_at_a_time(self):
+        def one_at_a_time(jobs, states):
+            unscheduled = {}
+            for index in sorted(range(len(jobs)), key=lambda index: -jobs[index].hours):
+                for copy in range(jobs[index].quantity):
+                    loads = [state.load_adding(jobs[index]) for state in states]
+                    fitting = [n for n, load in enumerate(loads) if states[n].fits(load)]
+                    if not fitting:
+                        unscheduled[index] = jobs[index].quantity - copy
+                        break
+                    states[min(fitting, key=loads.__getitem__)].add(jobs[index], index)
+            return unscheduled
+
+        rng = random.Random(5)
+        for _ in range(200):
+            jobs = [
+                Job(n, f"p{n}", rng.choice([0.5, 1, 1.5, 2.25, 3]), rng.choice("AB"),
+                    quantity=rng.randint(1, 30))
+                for n in range(rng.randint(1, 4))
+            ]
+            printers = [Printer(f"i{n}", rng.choice([5, 20, 60])) for n in range(rng.randint(1, 4))]
+            results = []
+            for place in (greedy, one_at_a_time):
+                states = [PrinterState(printer, 0.25) for printer in printers]
+                results.append((dict(place(jobs, states)), [state.pieces for state in states]))
+            self.assertEqual(results[0], results[1])
+
+    def test_many_copies_are_planned_quickly(self):
+        printers = [Printer(f"i{n}", 10**6) for n in range(20)]
+        started = time.perf_counter()
+        plan = schedule([Job("a", "a", 0.5, quantity=2_000_000)], printers, time_limit=0)
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(plan["makespan_hours"], 50_000)
+        self.assertEqual(plan["unscheduled"], [])
+
+
+@override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+class PrintScheduleViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        rng = random.Random(0)
+        self.pieces = [
+            PrintJob.objects.create(
+                user=self.user, name=f"peca{n}", **random_piece_values(rng, Decimal("20"))
+            )
+            for n in range(3)
+        ]
+        InventoryItem.objects.create(
+            user=self.user, print_job=self.pieces[0], piece_name="peca0", quantity=4
+        )
+        self.client.force_login(self.user)
+
+    def test_api_plans_inventory_or_requested_pieces(self):
+        url = reverse("print_schedule_api")
+        response = self.client.get(url, {"printers": "A = 1000; B = 1000", "changeover_hours": "0"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["jobs"], 4)
+
+        pieces = f"{self.pieces[1].pk} = 2\n{self.pieces[2].pk} = 1"
+        response = self.client.get(
+            url, {"printers": "A = 1000", "changeover_hours": "0", "pieces": pieces}
+        )
+        plan = response.json()
+        self.assertEqual(plan["jobs"], 3)
+        expected = 2 * self.pieces[1].print_time_hours + self.pieces[2].print_time_hours
+        self.assertAlmostEqual(plan["makespan_hours"], float(expected))
+
+    def test_invalid_input(self):
+        response = self.client.get(
+            reverse("print_schedule_api"),
+            {"printers": "sem horas", "changeover_hours": "0", "pieces": "999999 = 1"},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("printers", response.json()["errors"])
+
+        response = self.client.post(
+            reverse("print_schedule"),
+            {"printers": "A = 10", "changeover_hours": "0", "pieces": "999999 = 1"},
+        )
+        self.assertContains(response, "Pecas nao encontradas: 999999.")
+
+    def test_page_renders_plan(self):
+        response = self.client.post(
+            reverse("print_schedule"), {"printers": "A = 1000", "changeover_hours": "0.25"}
+        )
+        self.assertContains(response, "peca0")
+        self.assertEqual(response.context["plan"]["jobs"], 4)
+
+
+@override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+class PrintRunTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.small, self.large = create_pieces(self.user, filament, 2)
+        PrintJob.objects.filter(pk=self.small.pk).update(filament_weight_g=Decimal("10"))
+        PrintJob.objects.filter(pk=self.large.pk).update(filament_weight_g=Decimal("30"))
+        self.client.force_login(self.user)
+
+    def create_run(self):
+        response = self.client.post(
+            reverse("print_runs"),
+            {
+                "name": "Placa 1",
+                "print_time_hours": "10",
+                "labour_time_minutes": "30",
+                "pieces": f"{self.small.pk} = 4\n{self.large.pk} = 2",
+            },
+        )
+        run = PrintRun.objects.get()
+        self.assertRedirects(response, reverse("print_run_detail", args=[run.pk]))
+        return run
+
+    def test_shared_costs_are_allocated_and_priced_like_pieces(self):
+        run = self.create_run()
+        items = {item.print_job_id: item for item in run.items.all()}
+        small, large = items[self.small.pk], items[self.large.pk]
+        # 100 g in the run: the 4 x 10 g units get 4 h, the 2 x 30 g units 6 h.
+        self.assertEqual(small.print_time_hours, Decimal("4.00"))
+        self.assertEqual(large.print_time_hours, Decimal("6.00"))
+        self.assertEqual(small.filament_weight_g, Decimal("40.00"))
+        self.assertEqual(small.labour_time_minutes, Decimal("20.00"))
+        for item in items.values():
+            inputs = {
+                name: getattr(item, name)
+                for name in (
+                    "filament_price_per_kg",
+                    "filament_weight_g",
+                    "print_time_hours",
+                    "labour_time_minutes",
+                    "margin_percentage",
+                )
+            }
+            for name, value in calculate_print_job(inputs).items():
+                self.assertEqual(getattr(item, name), value)
+
+        response = self.client.get(reverse("print_run_detail", args=[run.pk]))
+        self.assertEqual(response.context["totals"]["units"], 6)
+        self.assertEqual(response.context["totals"]["print_time_hours"], Decimal("10.00"))
+
+        # Pieces in a run stay in the hot table.
+        PrintJob.objects.update(created_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(archive_print_jobs(365), 0)
+
+    def test_many_units_keep_the_whole_run_time_and_labour(self):
+        self.client.post(
+            reverse("print_runs"),
+            {
+                "name": "Lote",
+                "print_time_hours": "1",
+                "labour_time_minutes": "1",
+                "pieces": f"{self.small.pk} = 299\n{self.large.pk} = 1",
+            },
+        )
+        items = list(PrintRun.objects.get().items.all())
+        self.assertEqual(sum(item.print_time_hours for item in items), Decimal("1.00"))
+        self.assertEqual(sum(item.labour_time_minutes for item in items), Decimal("1.00"))
+        # 1 h of printing: 0.20 EUR of machine time, 0.02 EUR of energy.
+        self.assertEqual(sum(item.cost_machine for item in items), Decimal("0.20"))
+        self.assertEqual(sum(item.cost_energy for item in items), Decimal("0.02"))
+        self.assertEqual(
+            [item.labour_time_minutes for item in sorted(items, key=lambda i: i.quantity)],
+            [Decimal("0.00"), Decimal("1.00")],
+        )
+
+    def test_reprice_uses_current_piece_values(self):
+        run = self.create_run()
+        PrintJob.objects.filter(pk=self.small.pk).update(margin_percentage=Decimal("50"))
+        self.client.post(reverse("print_run_detail", args=[run.pk]), {"action": "reprice"})
+        item = PrintRunItem.objects.get(print_job=self.small)
+        self.assertEqual(item.margin_percentage, Decimal("50"))
+        self.assertAlmostEqual(item.price_final, item.cost_total * 2, delta=Decimal("0.01"))
+
+    def test_rejects_unknown_pieces(self):
+        response = self.client.post(
+            reverse("print_runs"),
+            {
+                "name": "x",
+                "print_time_hours": "1",
+                "labour_time_minutes": "0",
+                "pieces": "999999 = 1",
+            },
+        )
+        self.assertContains(response, "Pecas nao encontradas: 999999.")
+        self.assertFalse(PrintRun.objects.exists())
+
+
+class PieceVariantsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        (self.piece,) = create_pieces(self.user, filament, 1)
+        PrintJob.objects.filter(pk=self.piece.pk).update(
+            name="Vaso", filament_weight_g=Decimal("40"), print_time_hours=Decimal("2")
+        )
+        self.piece.refresh_from_db()
+        self.client.force_login(self.user)
+
+    def post(self, **data):
+        return self.client.post(reverse("piece_variants", args=[self.piece.pk]), data)
+
+    def test_long_names_do_not_clash_with_the_base_piece(self):
+        long_name = "A" * 100
+        PrintJob.objects.filter(pk=self.piece.pk).update(name=long_name)
+        names = unique_piece_names(self.user, [f"{long_name} 50%", f"{long_name} 100%"])
+        self.assertEqual(names, [f"{'A' * 96} (2)", f"{'A' * 96} (3)"])
+
+    def test_scales_and_overrides_are_priced_like_pieces(self):
+        response = self.post(
+            scales="50-150/50", overrides="filament_weight_g=12; margin_percentage=10"
+        )
+        self.assertRedirects(response, reverse("pieces_list"))
+        variants = {
+            piece.name: piece for piece in PrintJob.objects.exclude(pk=self.piece.pk)
+        }
+        self.assertEqual(set(variants), {"Vaso 50%", "Vaso 100%", "Vaso 150%", "Vaso v1"})
+        half = variants["Vaso 50%"]
+        self.assertEqual(half.filament_weight_g, Decimal("20.00"))
+        self.assertEqual(half.print_time_hours, Decimal("1.00"))
+        self.assertEqual(variants["Vaso v1"].filament_weight_g, Decimal("12.00"))
+        self.assertEqual(variants["Vaso v1"].print_time_hours, Decimal("2.00"))
+        for piece in variants.values():
+            self.assertEqual(piece.filament_type_id, self.piece.filament_type_id)
+            inputs = {
+                name: getattr(piece, name)
+                for name in (
+                    "filament_price_per_kg",
+                    "filament_weight_g",
+                    "print_time_hours",
+                    "labour_time_minutes",
+                    "margin_percentage",
+                )
+            }
+            for name, value in calculate_print_job(inputs).items():
+                self.assertEqual(getattr(piece, name), value)
+
+    def test_names_stay_unique(self):
+        taken = PrintJob.objects.get(pk=self.piece.pk)
+        taken.pk, taken.name = None, "vaso 50%"
+        taken.save()
+        self.post(scales="50; 50")
+        names = set(PrintJob.objects.values_list("name", flat=True))
+        self.assertEqual(names, {"Vaso", "vaso 50%", "Vaso 50% (2)", "Vaso 50% (3)"})
+
+    def test_rejects_bad_input(self):
+        response = self.post(scales="", overrides="")
+        self.assertContains(response, "Indique escalas ou variantes.")
+        response = self.post(overrides="color=red")
+        self.assertContains(response, "Valor invalido")
+        response = self.post(scales="1-1000/1")
+        self.assertContains(response, "No maximo 500 variantes.")
+        self.assertEqual(PrintJob.objects.count(), 1)
+
+    def test_rejects_values_that_overflow_the_columns(self):
+        for data, error in (
+            ({"scales": "1e30"}, "Indique percentagens entre 0 e 1000"),
+            ({"scales": "100000000"}, "Indique percentagens entre 0 e 1000"),
+            ({"scales": "50-5000/50"}, "Intervalo invalido"),
+            ({"overrides": "filament_weight_g=1e30"}, "Valor invalido"),
+            ({"overrides": "margin_percentage=99.999"}, "A margem deve ser inferior a 100%."),
+            (
+                {"overrides": "labour_time_minutes=99999999; margin_percentage=99"},
+                "Valores demasiado grandes nas variantes: v1.",
+            ),
+        ):
+            with self.subTest(data=data):
+                self.assertContains(self.post(**data), error)
+        self.assertEqual(PrintJob.objects.count(), 1)
+        self.assertEqual(self.client.get(reverse("pieces_list")).status_code, 200)
+
+    def test_other_users_cannot_clone(self):
+        other = get_user_model().objects.create_user(username="other")
+        self.client.force_login(other)
+        self.assertEqual(self.post(scales="50").status_code, 403)
+
+
+class PieceVariantsQueryCountTests(QueryCountTestCase):
+    def test_variants(self):
+        self.assertQueriesBounded(
+            lambda: self.client.post(
+                reverse("piece_variants", args=[self.piece.pk]), {"scales": "50-150/10"}
+            )
+        )
+
+
+@override_settings(PIECE_CHANGES_SAFETY_SECONDS=0)
+class IncrementalExportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        self.filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.kept, self.edited, self.removed = create_pieces(self.user, self.filament, 3)
+        self.client.force_login(self.user)
+
+    def export(self, **params):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse("piece_export"), params)
+        workbook = load_workbook(io.BytesIO(response.content))
+        sheets = {ws.title: list(ws.iter_rows(min_row=2, values_only=True)) for ws in workbook}
+        return response["X-Export-Token"], sheets
+
+    def test_only_changes_after_the_token_are_exported(self):
+        token, sheets = self.export()
+        self.assertEqual(len(sheets["Peças"]), 3)
+
+        self.edited.margin_percentage = Decimal("40")
+        self.edited.save()
+        removed_pk = self.removed.pk
+        self.removed.delete()
+        (added,) = create_pieces(self.user, self.filament, 1, start=10)
+        other = get_user_model().objects.create_user(username="other")
+        create_pieces(other, self.filament, 1, start=20)
+
+        new_token, sheets = self.export(since=token)
+        self.assertGreater(int(new_token), int(token))
+        self.assertEqual([row[0] for row in sheets["Peças"]], [self.edited.pk, added.pk])
+        self.assertEqual([row[0] for row in sheets["Apagadas"]], [removed_pk])
+        self.edited.refresh_from_db()
+        self.assertGreater(self.edited.updated_at, self.edited.created_at)
+
+        same_token, sheets = self.export(since=new_token)
+        self.assertEqual(same_token, new_token)
+        self.assertEqual(sheets, {"Peças": [], "Apagadas": []})
+
+    def test_bulk_writes_and_archiving_are_logged(self):
+        token, _ = self.export()
+        self.kept.margin_percentage = Decimal("10")
+        PrintJob.objects.bulk_update([self.kept], ["margin_percentage"])
+        PrintJob.objects.filter(pk=self.removed.pk).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+        archive_print_jobs(365)
+        _, sheets = self.export(since=token)
+        self.assertEqual([row[0] for row in sheets["Peças"]], [self.kept.pk])
+        # Archived pieces still exist, so they are not reported as deleted.
+        self.assertEqual(sheets["Apagadas"], [])
+        self.assertEqual(
+            PrintJobChange.objects.filter(print_job_id=self.removed.pk).last().action,
+            PrintJobChange.ARCHIVED,
+        )
+
+    def test_deleting_a_filament_logs_its_pieces(self):
+        token, _ = self.export()
+        before = PrintJob.objects.get(pk=self.kept.pk).updated_at
+        self.filament.delete()
+        _, sheets = self.export(since=token)
+        self.assertEqual(
+            [row[0] for row in sheets["Peças"]], [self.kept.pk, self.edited.pk, self.removed.pk]
+        )
+        piece = PrintJob.objects.get(pk=self.kept.pk)
+        self.assertIsNone(piece.filament_type)
+        self.assertGreater(piece.updated_at, before)
+
+    def test_changes_committed_out_of_id_order_are_not_skipped(self):
+        self.kept.save()
+        late = PrintJobChange.objects.latest("id")
+        self.edited.save()
+        # The first change is not visible yet when the export reads the log.
+        PrintJobChange.objects.filter(pk=late.pk).delete()
+        token, _ = self.export(since="0")
+        late.save(force_insert=True)
+
+        # Without a safety window the late change is behind the token and lost.
+        _, sheets = self.export(since=token)
+        self.assertEqual(sheets["Peças"], [])
+        with self.settings(PIECE_CHANGES_SAFETY_SECONDS=300):
+            _, sheets = self.export(since=token)
+        self.assertIn(self.kept.pk, [row[0] for row in sheets["Peças"]])
+
+    def test_rejects_invalid_token(self):
+        response = self.client.get(reverse("piece_export"), {"since": "abc"})
+        self.assertEqual(response.status_code, 400)
+
+
+class IncrementalExportQueryCountTests(QueryCountTestCase):
+    def test_export_since(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("piece_export"), {"since": "0"})
+        )
+
+
+class RepriceQueryCountTests(QueryCountTestCase):
+    def test_reprice_api(self):
+        self.assertQueriesBounded(
+            lambda: self.client.get(reverse("piece_reprice_api"), {"at": "2026-01-01"})
+        )
+
+
+@override_settings(METRICS_ENABLED=False, PERF_INSTRUMENTATION=False)
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        self.filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        self.client.force_login(self.user)
+
+    def set_price(self, price: str, days_ago: int) -> None:
+        self.filament.price_per_kg = Decimal(price)
+        self.filament.save()
+        FilamentPrice.objects.filter(pk=self.filament.price_history.first().pk).update(
+            effective_from=timezone.now() - timedelta(days=days_ago)
+        )
+
+    def test_history_is_appended_on_price_changes_only(self):
+        FilamentPrice.objects.update(effective_from=timezone.now() - timedelta(days=200))
+        self.filament.color = "Preto"
+        self.filament.save()
+        self.set_price("30", days_ago=100)
+        self.assertEqual(
+            list(self.filament.price_history.values_list("price_per_kg", flat=True)),
+            [Decimal("30"), Decimal("20")],
+        )
+        with self.assertRaises(ValueError):
+            self.filament.price_history.first().save()
+
+        url = reverse("filament_price_history_api", args=[self.filament.pk])
+        start = (timezone.now() - timedelta(days=150)).date().isoformat()
+        history = self.client.get(url, {"from": start}).json()["history"]
+        # The price already in effect at the start of the range is included.
+        self.assertEqual([row["price_per_kg"] for row in history], ["20.00", "30.00"])
+
+    def test_reprice_at_a_past_date(self):
+        FilamentPrice.objects.update(effective_from=timezone.now() - timedelta(days=200))
+        self.set_price("40", days_ago=10)
+        piece, unfiled = create_pieces(self.user, self.filament, 2)
+        PrintJob.objects.filter(pk=unfiled.pk).update(filament_type=None)
+
+        past = (timezone.now() - timedelta(days=50)).date().isoformat()
+        response = self.client.get(reverse("piece_reprice_api"), {"at": past})
+        results = {row["pk"]: row for row in response.json()["results"]}
+        self.assertEqual(results[piece.pk]["historical_price_per_kg"], "20.00")
+        # No filament: the quoted price is kept.
+        self.assertEqual(
+            Decimal(results[unfiled.pk]["historical_price_per_kg"]),
+            unfiled.filament_price_per_kg,
+        )
+        for invalid in ("x", "2026-02-30", "2026-13-01"):
+            response = self.client.get(reverse("piece_reprice_api"), {"at": invalid})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {"error": "Data invalida, use AAAA-MM-DD."})
+        history_url = reverse("filament_price_history_api", args=[self.filament.pk])
+        self.assertEqual(self.client.get(history_url, {"to": "2026-02-30"}).status_code, 400)
+        with self.assertRaisesMessage(CommandError, "Data invalida"):
+            call_command("reprice_pieces", at="2026-02-30", stdout=io.StringIO())
+
+        call_command("reprice_pieces", at=past, apply=True, stdout=io.StringIO())
+        piece.refresh_from_db()
+        self.assertEqual(piece.filament_price_per_kg, Decimal("20.00"))
+        values = {
+            name: getattr(piece, name)
+            for name in (
+                "filament_price_per_kg",
+                "filament_weight_g",
+                "print_time_hours",
+                "labour_time_minutes",
+                "margin_percentage",
+            )
+        }
+        self.assertEqual(calculate_print_job(values)["price_final"], piece.price_final)
+
+    @override_settings(TASK_RETRY_BACKOFF=0)
+    def test_reprice_in_background(self):
+        create_pieces(self.user, self.filament, 3)
+        expected = self.client.get(reverse("piece_reprice_api"), {"at": "2026-01-01"}).json()
+
+        response = self.client.post(reverse("piece_reprice_api"), {"at": "2026-01-01"})
+        self.assertEqual(response.status_code, 202)
+        task = Task.objects.get(pk=response.json()["task"]["pk"])
+        self.assertEqual((task.name, task.user), ("pieces.reprice", self.user))
+        with mock.patch("core.views.REPRICE_PROGRESS_EVERY", 2):
+            tasks.run(tasks.claim())
+        status = self.client.get(response.json()["status_url"]).json()
+        self.assertEqual(status["status"], Task.STATUS_SUCCEEDED)
+        self.assertEqual(status["result"], expected)
+
+        response = self.client.post(reverse("piece_reprice_api"), {"at": "2026-02-30"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfilled_price_does_not_reprice_older_quotes(self):
+        migration = importlib.import_module("core.migrations.0009_filamentprice")
+        (piece,) = create_pieces(self.user, self.filament, 1)
+        PrintJob.objects.filter(pk=piece.pk).update(
+            created_at=timezone.now() - timedelta(days=30),
+            filament_price_per_kg=Decimal("15"),
+        )
+        FilamentType.objects.update(created_at=timezone.now() - timedelta(days=60))
+        FilamentPrice.objects.all().delete()
+        migration.record_current_prices(django_apps, None)
+        self.assertGreater(
+            self.filament.price_history.get().effective_from, timezone.now() - timedelta(hours=1)
+        )
+
+        output = io.StringIO()
+        call_command("reprice_pieces", apply=True, stdout=output)
+        self.assertIn("0 atualizada(s)", output.getvalue())
+        piece.refresh_from_db()
+        self.assertEqual(piece.filament_price_per_kg, Decimal("15.00"))
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="owner")
+        filament = FilamentType.objects.create(
+            user=self.user, name="PLA", price_per_kg=Decimal("20"), weight_kg=Decimal("1")
+        )
+        create_pieces(self.user, filament, 20)
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        # Any module with compress() stands in for the optional brotli package.
+        fake_brotli = SimpleNamespace(compress=lambda data, quality: b"br")
+        with mock.patch.dict(sys.modules, {"brotli": fake_brotli}):
+            return self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+    def test_pages_with_a_csrf_token_are_compressed(self):
+        for url in (reverse("pieces_list"), reverse("calculator"), reverse("login")):
+            with self.subTest(url=url):
+                self.assertEqual(self.get(url)["Content-Encoding"], "br")
+                pages = [
+                    gzip.decompress(
+                        self.client.get(url, HTTP_ACCEPT_ENCODING="gzip").content
+                    ).decode()
+                    for _ in range(2)
+                ]
+                # BREACH: the token is masked differently in every response.
+                tokens = [
+                    re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+                    for page in pages
+                ]
+                self.assertNotEqual(tokens[0], tokens[1])
+
+    def test_responses_without_a_token_are_compressed(self):
+        response = self.get(reverse("piece_search_api"))
+        self.assertEqual(response["Content-Encoding"], "br")
+
+
+class MetricsRegistryTests(TestCase):
+    def setUp(self):
+        self.directory = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.registry = MetricsRegistry(directory=self.directory, flush_interval=0)
+
+    def write_worker(self, pid: int, started: int, value: float) -> Path:
+        path = self.directory / f"{pid}-{started}.json"
+        counters = [["calculator_import_rows_total", [], value]]
+        path.write_text(json.dumps({"counters": counters, "histograms": []}))
+        return path
+
+    def test_renders_counters_and_histograms(self):
+        with self.settings(METRICS_WRITE_FILES=False):
+            self.registry.inc("calculator_http_requests_total", view="pieces_list", status=200)
+            self.registry.observe("calculator_import_duration_seconds", 0.7)
+            text = self.registry.render()
+        self.assertIn(
+            'calculator_http_requests_total{status="200",view="pieces_list"} 1', text
+        )
+        self.assertIn('calculator_import_duration_seconds_bucket{le="0.5"} 0', text)
+        self.assertIn('calculator_import_duration_seconds_bucket{le="1"} 1', text)
+        self.assertIn("calculator_import_duration_seconds_count 1", text)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_exited_workers_are_kept_in_the_totals(self):
+        exited = subprocess.Popen([sys.executable, "-c", "pass"])
+        exited.wait()
+        live_pid = os.getppid()
+        kept = self.write_worker(live_pid, 2, 5)
+        stale = [
+            self.write_worker(live_pid, 1, 100),  # an earlier process with that pid
+            self.write_worker(exited.pid, 1, 100),
+            self.write_worker(os.getpid(), 1, 100),
+        ]
+        key = ("calculator_import_rows_total", ())
+        with self.settings(METRICS_WRITE_FILES=True):
+            self.registry.inc("calculator_import_rows_total", 2)
+            counters, _ = self.registry.collect()
+            self.assertEqual(counters[key], 307)
+            self.assertTrue(kept.exists())
+            self.assertFalse(any(path.exists() for path in stale))
+            exited_data = json.loads((self.directory / "exited.json").read_text())
+            self.assertEqual(exited_data["counters"], [["calculator_import_rows_total", [], 300]])
+            # Another exit later adds to the kept totals, never replaces them.
+            self.write_worker(exited.pid, 2, 10)
+            counters, _ = self.registry.collect()
+            self.assertEqual(counters[key], 317)
+        self.assertTrue((self.directory / self.registry.file_name).exists())
+
+    def test_idle_worker_flushes_its_last_changes(self):
+        registry = MetricsRegistry(directory=self.directory, flush_interval=0.05)
+        path = self.directory / registry.file_name
+        with self.settings(METRICS_WRITE_FILES=True):
+            registry.inc("calculator_import_rows_total")
+            registry.inc("calculator_import_rows_total")  # within the interval
+            self.assertEqual(json.loads(path.read_text())["counters"][0][2], 1)
+            registry.timer.join(1)
+            self.assertEqual(json.loads(path.read_text())["counters"][0][2], 2)
+            registry.inc("calculator_import_rows_total")
+            registry.flush_pending()  # what runs at exit
+        self.assertEqual(json.loads(path.read_text())["counters"][0][2], 3)
+
+
+class MetricsViewTests(TestCase):
+    @override_settings(METRICS_ENABLED=True)
+    def test_counts_requests(self):
+        user = get_user_model().objects.create_user(username="owner")
+        self.client.force_login(user)
+        self.client.get(reverse("dashboard"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        self.assertContains(response, "# TYPE calculator_http_requests_total counter")
+        self.assertContains(
+            response, 'calculator_http_requests_total{method="GET",status="200",view="dashboard"}'
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"])
+    def test_only_allowed_ips_may_scrape(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+
+class CachedUserBackendTests(TestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(
+            override_settings(
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                        "LOCATION": directory,
+                    }
+                }
+            )
+        )
+        self.user = get_user_model().objects.create_user(username="owner", password="x")
+        self.client.force_login(self.user)
+
+    def user_queries(self) -> int:
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("dashboard"))
+        return sum('FROM "auth_user"' in query["sql"] for query in context.captured_queries)
+
+    def test_user_is_cached_until_saved(self):
+        self.user_queries()
+        self.assertEqual(self.user_queries(), 0)
+        self.user.first_name = "Ana"
+        self.user.save()
+        self.assertEqual(self.user_queries(), 1)
+
+    def test_password_change_and_deactivation_end_the_session(self):
+        for change in ("password", "deactivate"):
+            with self.subTest(change=change):
+                self.client.force_login(self.user)
+                self.assertEqual(self.client.get(reverse("dashboard")).status_code, 200)
+                if change == "password":
+                    self.user.set_password("y")
+                else:
+                    self.user.is_active = False
+                self.user.save()
+                self.assertRedirects(
+                    self.client.get(reverse("dashboard")),
+                    f"{reverse('login')}?next={reverse('dashboard')}",
+                )
+                self.user.is_active = True
+                self.user.save()
+
+    def test_default_cache_is_shared(self):
+        # The project's CACHES, pointed at this run's directory by TestRunner.
+        self.assertEqual(project_settings.CACHE_BACKEND, "file")
+        with override_settings(CACHES=project_settings.CACHES):
+            self.assertTrue(cache_is_shared())
+
+    def test_process_local_cache_reads_the_database(self):
+        with override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        ):
+            self.user_queries()
+            self.assertEqual(self.user_queries(), 1)
 
-# Create your tests here.
@@ -0,0 +1,169 @@
+"""Read per-plate filament and time estimates from 3MF project files.
+
+A 3MF file is a zip container. Only the members that are needed are
+opened, and they are read as streams. Nothing is extracted to disk, and
+the mesh XML is never loaded into a DOM. Three sources are tried, cheapest
+first:
+
+1. ``Metadata/slice_info.config`` (Bambu Studio, OrcaSlicer): one
+   ``<plate>`` element per plate, holding the predicted seconds and the
+   grams used.
+2. ``Metadata/plate_N.gcode``: sliced G-code stored in the project. Only
+   its head and tail are kept while it streams past, to be searched for
+   slicer comments.
+3. ``3D/3dmodel.model``: the mesh itself, for projects that were never
+   sliced. It is parsed with ``iterparse`` and measured like an STL,
+   giving a single estimate for the whole project.
+"""
+
+import re
+import zipfile
+from decimal import Decimal, ROUND_HALF_UP
+from xml.etree.ElementTree import ParseError, iterparse
+
+from .gcode import DEFAULT_FILAMENT_DIAMETER_MM, HEADER_SCAN_BYTES, read_slicer_comments
+from .stl import DEFAULT_VOLUMETRIC_FLOW_MM3_S, material_volume
+
+SLICE_INFO = "Metadata/slice_info.config"
+MODEL = "3D/3dmodel.model"
+PLATE_GCODE = re.compile(r"^Metadata/plate_(\d+)\.gcode$")
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class ThreeMFError(ValueError):
+    pass
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def quantize(value: float) -> Decimal:
+    return Decimal(str(value)).quantize(Decimal("0.01"), ROUND_HALF_UP)
+
+
+def plate_result(index: int, weight: float, seconds: float, source: str) -> dict:
+    return {
+        "plate": index,
+        "filament_weight_g": quantize(weight),
+        "print_time_hours": quantize(seconds / 3600),
+        "source": source,
+    }
+
+
+def read_slice_info(archive: zipfile.ZipFile) -> list[dict]:
+    plates = []
+    with archive.open(SLICE_INFO) as stream:
+        for _, element in iterparse(stream):
+            if local_name(element.tag) != "plate":
+                continue
+            metadata = {
+                child.get("key"): child.get("value")
+                for child in element
+                if local_name(child.tag) == "metadata"
+            }
+            weight = float(metadata.get("weight") or 0)
+            if not weight:
+                weight = sum(
+                    float(child.get("used_g") or 0)
+                    for child in element
+                    if local_name(child.tag) == "filament"
+                )
+            seconds = float(metadata.get("prediction") or 0)
+            index = int(metadata.get("index") or len(plates) + 1)
+            if weight > 0 and seconds > 0:
+                plates.append(plate_result(index, weight, seconds, "slice_info"))
+            element.clear()
+    return plates
+
+
+def read_gcode_ends(stream) -> bytes:
+    """Keep only the first and last HEADER_SCAN_BYTES of a streamed member."""
+    head = stream.read(HEADER_SCAN_BYTES)
+    tail = b""
+    while chunk := stream.read(STREAM_CHUNK_SIZE):
+        tail = (tail + chunk)[-HEADER_SCAN_BYTES:]
+    return head + b"\n" + tail
+
+
+def read_plate_gcode(archive: zipfile.ZipFile, density: float) -> list[dict]:
+    plates = []
+    for name in archive.namelist():
+        match = PLATE_GCODE.match(name)
+        if not match:
+            continue
+        with archive.open(name) as stream:
+            weight, seconds = read_slicer_comments(
+                read_gcode_ends(stream), DEFAULT_FILAMENT_DIAMETER_MM, density
+            )
+        if weight and seconds:
+            plates.append(plate_result(int(match.group(1)), weight, seconds, "gcode"))
+    return sorted(plates, key=lambda plate: plate["plate"])
+
+
+def read_mesh(archive: zipfile.ZipFile, density: float) -> list[dict]:
+    volume = area = 0.0
+    vertices: list[tuple] = []
+    with archive.open(MODEL) as stream:
+        for event, element in iterparse(stream, events=("start", "end")):
+            tag = local_name(element.tag)
+            if event == "start":
+                if tag == "mesh":
+                    vertices = []
+                continue
+            if tag == "vertex":
+                vertices.append(
+                    (float(element.get("x")), float(element.get("y")), float(element.get("z")))
+                )
+            elif tag == "triangle":
+                indices = [int(element.get(name)) for name in ("v1", "v2", "v3")]
+                if min(indices) < 0:
+                    # Negative indices would silently wrap around the list.
+                    raise IndexError("negative vertex index")
+                (ax, ay, az), (bx, by, bz), (cx, cy, cz) = (vertices[i] for i in indices)
+                volume += (
+                    ax * (by * cz - bz * cy) - ay * (bx * cz - bz * cx) + az * (bx * cy - by * cx)
+                )
+                ux, uy, uz = bx - ax, by - ay, bz - az
+                wx, wy, wz = cx - ax, cy - ay, cz - az
+                area += (
+                    (uy * wz - uz * wy) ** 2 + (uz * wx - ux * wz) ** 2 + (ux * wy - uy * wx) ** 2
+                ) ** 0.5
+            elif tag == "mesh":
+                vertices = []
+            # Drop finished elements so memory holds one mesh's vertices at most.
+            if tag in ("vertex", "triangle", "vertices", "triangles", "mesh", "object"):
+                element.clear()
+    volume, area = abs(volume) / 6, area / 2
+    if volume <= 0:
+        return []
+    material = material_volume(volume, area)
+    seconds = material / DEFAULT_VOLUMETRIC_FLOW_MM3_S
+    return [plate_result(1, material / 1000 * density, seconds, "mesh")]
+
+
+def read_3mf_plates(file, density: float) -> list[dict]:
+    """Return one estimate per plate of a 3MF file (path or binary file object)."""
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as exc:
+        raise ThreeMFError("O ficheiro 3MF esta corrompido.") from exc
+    with archive:
+        names = set(archive.namelist())
+        plates = []
+        try:
+            if SLICE_INFO in names:
+                plates = read_slice_info(archive)
+            if not plates:
+                plates = read_plate_gcode(archive, density)
+            if not plates and MODEL in names:
+                plates = read_mesh(archive, density)
+        # Truncated XML, missing or non-numeric attributes, triangles that
+        # point past the vertex list and damaged zip members.
+        except (
+            ParseError, TypeError, ValueError, IndexError, zipfile.BadZipFile, EOFError
+        ) as exc:
+            raise ThreeMFError("O ficheiro 3MF esta mal formado.") from exc
+    if not plates:
+        raise ThreeMFError("O ficheiro 3MF nao contem estimativas nem uma malha valida.")
+    return plates
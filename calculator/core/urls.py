@@ -3,6 +3,7 @@
 from .views import (
     calculator_view,
     dashboard_view,
+    filament_price_history_api_view,
     inventory_add_piece_view,
     inventory_filament_edit_view,
     inventory_filament_delete_view,
@@ -10,11 +11,22 @@ from .views import (
     inventory_item_delete_view,
     inventory_view,
     logout_view,
+    metrics_view,
+    piece_api_detail_view,
+    piece_batch_quote_view,
     piece_delete_view,
     piece_edit_view,
     piece_export_view,
     piece_import_view,
+    piece_reprice_api_view,
+    piece_search_api_view,
+    piece_variants_view,
     pieces_list_view,
+    print_run_detail_view,
+    print_run_list_view,
+    print_schedule_api_view,
+    print_schedule_view,
+    task_status_api_view,
 )
 
 urlpatterns = [
@@ -26,10 +38,26 @@ urlpatterns = [
     path("inventory/pecas/<int:pk>/editar/", inventory_item_edit_view, name="inventory_item_edit"),
     path("inventory/pecas/<int:pk>/apagar/", inventory_item_delete_view, name="inventory_item_delete"),
     path("logout/", logout_view, name="logout"),
+    path("metrics", metrics_view, name="metrics"),
     path("calculator/", calculator_view, name="calculator"),
     path("pieces/", pieces_list_view, name="pieces_list"),
     path("pieces/exportar/", piece_export_view, name="piece_export"),
     path("pieces/importar/", piece_import_view, name="piece_import"),
+    path("pieces/orcamento-lote/", piece_batch_quote_view, name="piece_batch_quote"),
     path("pieces/<int:pk>/editar/", piece_edit_view, name="piece_edit"),
     path("pieces/<int:pk>/apagar/", piece_delete_view, name="piece_delete"),
+    path("pieces/<int:pk>/variantes/", piece_variants_view, name="piece_variants"),
+    path("api/pieces/", piece_search_api_view, name="piece_search_api"),
+    path("api/pieces/<int:pk>/", piece_api_detail_view, name="piece_api_detail"),
+    path("api/pieces/reprecificar/", piece_reprice_api_view, name="piece_reprice_api"),
+    path(
+        "api/filaments/<int:pk>/precos/",
+        filament_price_history_api_view,
+        name="filament_price_history_api",
+    ),
+    path("api/tasks/<int:pk>/", task_status_api_view, name="task_status_api"),
+    path("tiragens/", print_run_list_view, name="print_runs"),
+    path("tiragens/<int:pk>/", print_run_detail_view, name="print_run_detail"),
+    path("planeamento/", print_schedule_view, name="print_schedule"),
+    path("api/planeamento/", print_schedule_api_view, name="print_schedule_api"),
 ]
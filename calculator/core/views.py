@@ -1,26 +1,59 @@
 ﻿import io
 import json
+import tempfile
+import time
+from datetime import datetime, time as day_time
+from functools import partial
 from pathlib import Path
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
-import unicodedata
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, HttpResponseForbidden
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.http import url_has_allowed_host_and_scheme
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
 
+from .batch_quote import ModelError, analyze_models, extract_models
+from .changelog import changes_since, latest_token
+from .db_routers import replica_read
 from .forms import (
+    BatchQuoteForm,
     FilamentTypeForm,
+    GcodePrintJobForm,
     InventoryQuantityForm,
     PieceImportForm,
+    PieceVariantsForm,
     PrintJobForm,
+    PrintRunForm,
+    ScheduleForm,
+    StlEstimateForm,
 )
-from .models import FilamentType, InventoryItem, PrintJob
+from .metrics import registry as metrics_registry
+from .gcode import DEFAULT_FILAMENT_DENSITY, FILAMENT_DENSITY
+from .models import (
+    ArchivedPrintJob,
+    FilamentType,
+    InventoryItem,
+    PrintJob,
+    PrintJobValues,
+    PrintRun,
+    PrintRunItem,
+    Task,
+    fits_print_job_columns,
+)
+from .pricing import price_history, print_jobs_priced_at
+from .scheduler import Job, schedule
+from .search import normalize_text
+from .tasks import enqueue, serialize_task
 
 VALOR_KWH = Decimal("0.158")
 CONSUMO_W = Decimal("140")
@@ -37,6 +70,42 @@ IMPORT_COLUMNS = [
     "margin_percentage",
 ]
 
+EXPORT_COLUMNS = [
+    "piece_name",
+    "filament_price_per_kg",
+    "filament_weight_g",
+    "print_time_hours",
+    "labour_time_minutes",
+    "margin_percentage",
+    "cost_filament",
+    "cost_energy",
+    "cost_labour",
+    "cost_machine",
+    "cost_total",
+    "price_final",
+    "consumption_kwh",
+    "created_at",
+    "owner",
+]
+
+PIECE_SEARCH_API_LIMIT = 50
+
+INVENTORY_PAGE_SIZE = 25
+
+FILAMENT_SORT_FIELDS = {
+    "name": "name",
+    "price": "price_per_kg",
+    "weight": "weight_kg",
+    "created_at": "created_at",
+}
+
+INVENTORY_ITEM_SORT_FIELDS = {
+    "name": "piece_name",
+    "quantity": "quantity",
+    "value": "inventory_value",
+    "updated_at": "updated_at",
+}
+
 
 def to_currency(value: Decimal) -> Decimal:
     return value.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
@@ -83,7 +152,16 @@ def resolve_next_url(request, fallback: str) -> str:
     return fallback
 
 
-def get_piece_initial_data(piece: PrintJob, user) -> dict:
+def build_filament_price_lookup(user) -> dict:
+    """Map each price to the first filament (by name) with that price, used to
+    guess the filament of pieces saved without one in a single query."""
+    filament_qs = FilamentType.objects.all().order_by("-name")
+    if user and not getattr(user, "is_superuser", False):
+        filament_qs = filament_qs.filter(user=user)
+    return {filament.price_per_kg: filament for filament in filament_qs}
+
+
+def get_piece_initial_data(piece: PrintJob, user, filament_by_price=None) -> dict:
     initial = {
         "piece_name": piece.name,
         "filament_type": piece.filament_type,
@@ -93,17 +171,16 @@ def get_piece_initial_data(piece: PrintJob, user) -> dict:
         "margin_percentage": piece.margin_percentage,
     }
     if initial["filament_type"] is None:
-        filament_qs = FilamentType.objects.all().order_by("name")
-        if user and not getattr(user, "is_superuser", False):
-            filament_qs = filament_qs.filter(user=user)
-        guess = filament_qs.filter(price_per_kg=piece.filament_price_per_kg).first()
+        if filament_by_price is None:
+            filament_by_price = build_filament_price_lookup(user)
+        guess = filament_by_price.get(piece.filament_price_per_kg)
         if guess is not None:
             initial["filament_type"] = guess
     return initial
 
 
-def serialize_piece_edit_payload(piece: PrintJob, user) -> str:
-    initial = get_piece_initial_data(piece, user)
+def serialize_piece_edit_payload(piece: PrintJob, user, filament_by_price=None) -> str:
+    initial = get_piece_initial_data(piece, user, filament_by_price)
     payload = {
         "pk": piece.pk,
         "piece_name": initial["piece_name"] or "",
@@ -222,14 +299,6 @@ def get_safe_redirect(request, default_url: str) -> str:
     return default_url
 
 
-def normalize_text(value: str) -> str:
-    if not value:
-        return ""
-    normalized = unicodedata.normalize("NFKD", value)
-    stripped = "".join(ch for ch in normalized if not unicodedata.combining(ch))
-    return stripped.lower()
-
-
 def parse_decimal(value):
 
     if isinstance(value, Decimal):
@@ -252,6 +321,34 @@ def piece_permission_check(user, piece: PrintJob):
     return piece.user == user
 
 
+def resolve_sort(value: str, sort_fields: dict, default: str) -> tuple[str, list]:
+    descending = value.startswith("-")
+    key = value[1:] if descending else value
+    if key not in sort_fields:
+        key, descending = default, False
+    field = sort_fields[key]
+    ordering = [f"-{field}" if descending else field, "-pk" if descending else "pk"]
+    return (f"-{key}" if descending else key), ordering
+
+
+def build_query_string(request, exclude_keys=(), **overrides) -> str:
+    query_params = request.GET.copy()
+    for key in (*exclude_keys, *overrides):
+        query_params.pop(key, None)
+    for key, value in overrides.items():
+        query_params[key] = value
+    return query_params.urlencode()
+
+
+def annotate_inventory_value(queryset):
+    return queryset.annotate(
+        inventory_value=ExpressionWrapper(
+            F("quantity") * F("print_job__price_final"),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+    )
+
+
 @login_required
 def logout_view(request):
     logout(request)
@@ -281,10 +378,21 @@ def dashboard_view(request):
             "label": "Inventário",
             "description": "Gerir filamentos e peças disponi­veis.",
         },
+        {
+            "url": "print_runs",
+            "label": "Tiragens",
+            "description": "Agrupe peças impressas juntas e reparta o tempo e a mão de obra.",
+        },
+        {
+            "url": "print_schedule",
+            "label": "Planeamento",
+            "description": "Distribua as peças pelas impressoras para terminar mais cedo.",
+        },
     ]
     return render(request, "core/dashboard.html", {"links": links})
 
 
+@replica_read
 @login_required
 def inventory_view(request):
     active_tab = request.GET.get("tab", "filaments")
@@ -296,34 +404,45 @@ def inventory_view(request):
         if request.user.is_superuser
         else FilamentType.objects.filter(user=request.user)
     )
-    filaments = list(filament_base_qs.order_by("name"))
+    inventory_items_qs = InventoryItem.objects.filter(user=request.user)
 
-    inventory_items_qs = (
-        InventoryItem.objects.filter(user=request.user)
-        .select_related("print_job")
-        .order_by("piece_name")
+    filaments_search = request.GET.get("filaments_search", "").strip()
+    filaments_sort, filament_ordering = resolve_sort(
+        request.GET.get("filaments_sort", ""), FILAMENT_SORT_FIELDS, "name"
     )
-    inventory_items_list = list(inventory_items_qs)
+    filaments_qs = filament_base_qs
+    if filaments_search:
+        term = normalize_text(filaments_search)
+        filaments_qs = filaments_qs.filter(
+            Q(name__normalized__contains=term) | Q(color__normalized__contains=term)
+        )
+        active_tab = "filaments"
+    filaments_page = Paginator(
+        filaments_qs.order_by(*filament_ordering), INVENTORY_PAGE_SIZE
+    ).get_page(request.GET.get("filaments_page"))
+    filaments = list(filaments_page.object_list)
 
     pieces_search = request.GET.get("pieces_search", "").strip()
-
+    pieces_sort, inventory_item_ordering = resolve_sort(
+        request.GET.get("pieces_sort", ""), INVENTORY_ITEM_SORT_FIELDS, "name"
+    )
+    inventory_items_filtered_qs = annotate_inventory_value(
+        inventory_items_qs.select_related("print_job")
+    )
     if pieces_search:
-        norm_search = normalize_text(pieces_search)
-        inventory_items_list = [
-            item
-            for item in inventory_items_list
-            if norm_search in normalize_text(item.piece_name or "")
-            or (
-                item.print_job
-                and norm_search in normalize_text(item.print_job.name or "")
-            )
-            or (
-                pieces_search.isdigit()
-                and item.print_job
-                and pieces_search == str(item.print_job.pk)
-            )
-        ]
+        term = normalize_text(pieces_search)
+        filters = Q(piece_name__normalized__contains=term) | Q(
+            print_job__name__normalized__contains=term
+        )
+        if pieces_search.isdigit():
+            filters |= Q(print_job__pk=int(pieces_search))
+        inventory_items_filtered_qs = inventory_items_filtered_qs.filter(filters)
         active_tab = "pieces"
+    inventory_items_page = Paginator(
+        inventory_items_filtered_qs.order_by(*inventory_item_ordering),
+        INVENTORY_PAGE_SIZE,
+    ).get_page(request.GET.get("pieces_page"))
+    inventory_items_list = list(inventory_items_page.object_list)
 
     def build_next_url(tab_name: str, exclude_key: str) -> str:
         query_params = request.GET.copy()
@@ -389,23 +508,36 @@ def inventory_view(request):
             "pieces", "open_inventory_item_edit"
         )
 
-    if filament_edit_open_pk is None:
-        open_filament_pk = request.GET.get("open_filament_edit")
-        if open_filament_pk and filament_base_qs.filter(pk=open_filament_pk).exists():
+    # The edit modal is opened by clicking a row's trigger. The linked row is
+    # fetched on its own and given a hidden trigger, so the link works whatever
+    # page the row is on; it costs one query, and only when the link is used.
+    filament_edit_open_row = None
+    open_filament_pk = request.GET.get("open_filament_edit", "")
+    if filament_edit_open_pk is None and open_filament_pk.isdigit():
+        filament_edit_open_row = filament_base_qs.filter(pk=open_filament_pk).first()
+        if filament_edit_open_row:
             filament_edit_open_pk = open_filament_pk
             active_tab = "filaments"
 
-    if inventory_item_edit_open_pk is None:
-        open_item_pk = request.GET.get("open_inventory_item_edit")
-        if open_item_pk and inventory_items_qs.filter(pk=open_item_pk).exists():
+    inventory_item_edit_open_row = None
+    open_item_pk = request.GET.get("open_inventory_item_edit", "")
+    if inventory_item_edit_open_pk is None and open_item_pk.isdigit():
+        inventory_item_edit_open_row = (
+            inventory_items_qs.select_related("print_job").filter(pk=open_item_pk).first()
+        )
+        if inventory_item_edit_open_row:
             inventory_item_edit_open_pk = open_item_pk
             active_tab = "pieces"
 
-    for filament in filaments:
+    editable_filaments = filaments + ([filament_edit_open_row] if filament_edit_open_row else [])
+    for filament in editable_filaments:
         filament.edit_payload = serialize_filament_edit_payload(filament)
         filament.edit_label = get_filament_label(filament)
 
-    for item in inventory_items_list:
+    editable_items = inventory_items_list + (
+        [inventory_item_edit_open_row] if inventory_item_edit_open_row else []
+    )
+    for item in editable_items:
         item.edit_payload = serialize_inventory_item_edit_payload(item)
         item.edit_label = item.piece_name or f"Item #{item.pk}"
 
@@ -415,14 +547,37 @@ def inventory_view(request):
         {
             "filament_form": filament_form,
             "filaments": filaments,
+            "filaments_page": filaments_page,
+            "filaments_search": filaments_search,
+            "filaments_sort": filaments_sort,
+            "filaments_query": build_query_string(
+                request, ("filaments_page", "open_filament_edit"), tab="filaments"
+            ),
+            "filaments_sort_query": build_query_string(
+                request,
+                ("filaments_page", "filaments_sort", "open_filament_edit"),
+                tab="filaments",
+            ),
             "inventory_items": inventory_items_list,
+            "inventory_items_page": inventory_items_page,
             "active_tab": active_tab,
             "pieces_search": pieces_search,
+            "pieces_sort": pieces_sort,
+            "pieces_query": build_query_string(
+                request, ("pieces_page", "open_inventory_item_edit"), tab="pieces"
+            ),
+            "pieces_sort_query": build_query_string(
+                request,
+                ("pieces_page", "pieces_sort", "open_inventory_item_edit"),
+                tab="pieces",
+            ),
             "filament_edit_form": filament_edit_form,
             "filament_edit_open_pk": filament_edit_open_pk,
+            "filament_edit_open_row": filament_edit_open_row,
             "filament_edit_next_url": filament_edit_next_url,
             "inventory_item_edit_form": inventory_item_edit_form,
             "inventory_item_edit_open_pk": inventory_item_edit_open_pk,
+            "inventory_item_edit_open_row": inventory_item_edit_open_row,
             "inventory_item_edit_next_url": inventory_item_edit_next_url,
         },
     )
@@ -532,7 +687,8 @@ def inventory_item_delete_view(request, pk):
 def calculator_view(request):
     result = None
 
-    form = PrintJobForm(user=request.user)
+    form = GcodePrintJobForm(user=request.user)
+    stl_form = StlEstimateForm(user=request.user)
     piece_edit_form = PrintJobForm(user=request.user)
     piece_edit_open_pk = None
 
@@ -565,6 +721,25 @@ def calculator_view(request):
                 )
             inventory_add_open_pk = str(piece.pk)
             inventory_add_next_url = request.POST.get("next") or request.get_full_path()
+        elif action == "estimate_stl":
+            stl_form = StlEstimateForm(request.POST, request.FILES, user=request.user)
+            if stl_form.is_valid():
+                estimate = stl_form.estimate
+                # Pre-fill the calculator; the user reviews the values before saving.
+                form = GcodePrintJobForm(
+                    user=request.user,
+                    initial={
+                        "piece_name": Path(stl_form.cleaned_data["stl_file"].name).stem[:100],
+                        "filament_type": stl_form.cleaned_data["filament_type"].pk,
+                        "filament_weight_g": estimate["filament_weight_g"],
+                        "print_time_hours": estimate["print_time_hours"],
+                    },
+                )
+                messages.info(
+                    request,
+                    f"Modelo com {estimate['volume_cm3']} cm3 ({estimate['triangles']} "
+                    f"triangulos): cerca de {estimate['filament_weight_g']} g de filamento.",
+                )
         else:
             piece_id = request.POST.get("piece_id")
             if piece_id:
@@ -584,7 +759,7 @@ def calculator_view(request):
                     return redirect(get_safe_redirect(request, reverse("calculator")))
                 piece_edit_open_pk = str(piece.pk)
             else:
-                form = PrintJobForm(request.POST, user=request.user)
+                form = GcodePrintJobForm(request.POST, request.FILES, user=request.user)
                 if form.is_valid():
                     cleaned = form.cleaned_data
                     filament = cleaned["filament_type"]
@@ -613,17 +788,22 @@ def calculator_view(request):
                     )
 
                     piece_label = print_job.name or f"#{print_job.pk}"
+                    gcode_note = (
+                        " Peso e tempo lidos do G-code."
+                        if form.gcode_analysis is not None
+                        else ""
+                    )
                     messages.success(
                         request,
-                        f"Peca '{piece_label}' calculada e guardada com sucesso.",
+                        f"Peca '{piece_label}' calculada e guardada com sucesso.{gcode_note}",
                     )
 
                     result["piece_name"] = print_job.name or f"Peca #{print_job.pk}"
                     result["created_at"] = print_job.created_at
 
-                    form = PrintJobForm(user=request.user)
+                    form = GcodePrintJobForm(user=request.user)
 
-    pieces_qs = PrintJob.objects.select_related("user")
+    pieces_qs = PrintJob.objects.select_related("user", "filament_type")
     if request.user.is_superuser:
         pieces_queryset = pieces_qs.exclude(inventory_records__isnull=False).distinct()
     else:
@@ -634,8 +814,15 @@ def calculator_view(request):
         )
 
     pieces_list = list(pieces_queryset)
+    filament_by_price = (
+        build_filament_price_lookup(request.user)
+        if any(piece.filament_type_id is None for piece in pieces_list)
+        else {}
+    )
     for piece in pieces_list:
-        piece.edit_payload = serialize_piece_edit_payload(piece, request.user)
+        piece.edit_payload = serialize_piece_edit_payload(
+            piece, request.user, filament_by_price
+        )
         piece.edit_label = piece.name or f"Peca #{piece.pk}"
         piece.add_payload = serialize_inventory_add_payload(piece)
 
@@ -670,6 +857,7 @@ def calculator_view(request):
 
     context = {
         "form": form,
+        "stl_form": stl_form,
         "result": result,
         "pieces": pieces_list,
         "has_filaments": has_filaments,
@@ -691,9 +879,10 @@ def calculator_view(request):
     return render(request, "core/calculator.html", context)
 
 
+@replica_read
 @login_required
 def pieces_list_view(request):
-    pieces_qs = PrintJob.objects.select_related("user")
+    pieces_qs = PrintJob.objects.select_related("user", "filament_type")
     if request.user.is_superuser:
         base_queryset = pieces_qs.exclude(inventory_records__isnull=False).distinct()
     else:
@@ -764,8 +953,15 @@ def pieces_list_view(request):
             or norm_query in normalize_text(str(piece.pk))
         ]
 
+    filament_by_price = (
+        build_filament_price_lookup(request.user)
+        if any(piece.filament_type_id is None for piece in pieces_list)
+        else {}
+    )
     for piece in pieces_list:
-        piece.edit_payload = serialize_piece_edit_payload(piece, request.user)
+        piece.edit_payload = serialize_piece_edit_payload(
+            piece, request.user, filament_by_price
+        )
         piece.edit_label = piece.name or f"Peca #{piece.pk}"
         piece.add_payload = serialize_inventory_add_payload(piece)
 
@@ -840,88 +1036,308 @@ def piece_delete_view(request, pk: int):
     return render(request, "core/piece_confirm_delete.html", {"piece": piece})
 
 
+def variant_values(piece: PrintJob, form_data: dict) -> list[tuple[str, dict]]:
+    """(name suffix, inputs and costs) for every variant requested of ``piece``."""
+    base = {field: getattr(piece, field) for field in REPRICE_INPUTS}
+    base["filament_price_per_kg"] = piece.filament_price_per_kg
+    variants = []
+    for scale in form_data["scales"]:
+        factor = scale / Decimal("100")
+        values = {
+            **base,
+            "filament_weight_g": to_currency(piece.filament_weight_g * factor),
+            "print_time_hours": to_currency(piece.print_time_hours * factor),
+        }
+        variants.append((f"{scale.normalize():f}%", values))
+    for number, overrides in enumerate(form_data["overrides"], start=1):
+        variants.append((f"v{number}", {**base, **overrides}))
+    return [(suffix, {**values, **calculate_print_job(values)}) for suffix, values in variants]
+
+
+def unique_piece_names(user, names: list[str]) -> list[str]:
+    """Make ``names`` unique (case-insensitively) among ``user``'s pieces.
+
+    Taken names are read in one query on the shared prefix, instead of one
+    ``iexact`` lookup per name as ``PrintJobForm.clean_piece_name`` does;
+    clashes get " (2)", " (3)"... and are cut to fit the name column.
+    """
+    max_length = PrintJob._meta.get_field("name").max_length
+    prefix = names[0] if names else ""
+    for name in names[1:]:
+        while not name.lower().startswith(prefix.lower()):
+            prefix = prefix[:-1]
+    # Stored names are at most max_length long; a longer prefix matches none.
+    prefix = prefix[:max_length]
+    pieces = PrintJob.objects.filter(user=user, name__istartswith=prefix)
+    taken = {name.lower() for name in pieces.values_list("name", flat=True)}
+    unique = []
+    for name in names:
+        candidate = name[:max_length]
+        copy = 1
+        while candidate.lower() in taken:
+            copy += 1
+            suffix = f" ({copy})"
+            candidate = name[: max_length - len(suffix)] + suffix
+        taken.add(candidate.lower())
+        unique.append(candidate)
+    return unique
+
+
 @login_required
-def piece_export_view(request):
-    pieces = PrintJob.objects.select_related("user")
-    if not request.user.is_superuser:
-        pieces = pieces.filter(user=request.user)
+def piece_variants_view(request, pk: int):
+    piece = get_object_or_404(
+        PrintJob.objects.select_related("user", "filament_type"), pk=pk
+    )
+    if not piece_permission_check(request.user, piece):
+        return HttpResponseForbidden("Sem permissao.")
 
-    try:
-        from openpyxl import Workbook
-    except ImportError:
-        messages.error(
-            request,
-            "Suporte a Excel indisponAvel (biblioteca openpyxl nAo instalada).",
-        )
-        return redirect("pieces_list")
+    form = PieceVariantsForm()
+    if request.method == "POST":
+        form = PieceVariantsForm(request.POST)
+        if form.is_valid():
+            variants = variant_values(piece, form.cleaned_data)
+            too_large = [
+                suffix for suffix, values in variants if not fits_print_job_columns(values)
+            ]
+            if too_large:
+                form.add_error(
+                    None, f"Valores demasiado grandes nas variantes: {', '.join(too_large)}."
+                )
+            else:
+                base_name = piece.name or f"Peca #{piece.pk}"
+                names = unique_piece_names(
+                    piece.user, [f"{base_name} {suffix}" for suffix, values in variants]
+                )
+                pieces = [
+                    PrintJob(
+                        user=piece.user, name=name, filament_type=piece.filament_type, **values
+                    )
+                    for name, (suffix, values) in zip(names, variants)
+                ]
+                PrintJob.objects.bulk_create(pieces, batch_size=500)
+                messages.success(request, f"{len(pieces)} variantes criadas.")
+                return redirect("pieces_list")
+    return render(request, "core/piece_variants.html", {"piece": piece, "form": form})
+
+
+def export_datetime(value):
+    # Excel has no time zones: write local time without tzinfo.
+    if value is not None:
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        value = value.replace(tzinfo=None)
+    return value
+
+
+def build_export_row(piece: PrintJob) -> list:
+    created_at = export_datetime(piece.created_at)
+    return [
+        piece.name or "",
+        float(piece.filament_price_per_kg),
+        float(piece.filament_weight_g),
+        float(piece.print_time_hours),
+        float(piece.labour_time_minutes),
+        float(piece.margin_percentage),
+        float(piece.cost_filament),
+        float(piece.cost_energy),
+        float(piece.cost_labour),
+        float(piece.cost_machine),
+        float(piece.cost_total),
+        float(piece.price_final),
+        float(piece.consumption_kwh),
+        created_at,
+        piece.user.get_username() if piece.user else "",
+    ]
+
+
+def build_export_workbook(rows: list[list]) -> bytes:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Peças")
+    ws.append(EXPORT_COLUMNS)
+    for row in rows:
+        ws.append(row)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def build_changes_workbook(rows: list[list], tombstones: list[list]) -> bytes:
+    """Incremental export: changed pieces keyed by id, then deleted ids."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Peças")
+    ws.append(["piece_id", *EXPORT_COLUMNS, "updated_at"])
+    for row in rows:
+        ws.append(row)
+    ws = wb.create_sheet("Apagadas")
+    ws.append(["piece_id", "deleted_at"])
+    for row in tombstones:
+        ws.append(row)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def serialize_piece_summary(piece: PrintJob | ArchivedPrintJob) -> dict:
+    # Archived pieces keep the id they had in the PrintJob table.
+    pk = getattr(piece, "original_id", piece.pk)
+    return {
+        "pk": pk,
+        "name": piece.name or f"Peca #{pk}",
+        "filament_weight_g": str(piece.filament_weight_g),
+        "print_time_hours": str(piece.print_time_hours),
+        "cost_total": str(piece.cost_total),
+        "price_final": str(piece.price_final),
+        "created_at": piece.created_at.isoformat() if piece.created_at else None,
+    }
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Peças"
-    headers = [
-        "piece_name",
+
+def serialize_piece_detail(piece: PrintJob) -> dict:
+    payload = serialize_piece_summary(piece)
+    for key in (
         "filament_price_per_kg",
-        "filament_weight_g",
-        "print_time_hours",
         "labour_time_minutes",
         "margin_percentage",
         "cost_filament",
         "cost_energy",
         "cost_labour",
         "cost_machine",
-        "cost_total",
-        "price_final",
         "consumption_kwh",
-        "created_at",
-        "owner",
-    ]
-    ws.append(headers)
-
-    for piece in pieces:
-        created_at = piece.created_at
-        if created_at is not None:
-            if timezone.is_aware(created_at):
-                created_at = timezone.localtime(created_at)
-            created_at = created_at.replace(tzinfo=None)
-        ws.append(
-            [
-                piece.name or "",
-                float(piece.filament_price_per_kg),
-                float(piece.filament_weight_g),
-                float(piece.print_time_hours),
-                float(piece.labour_time_minutes),
-                float(piece.margin_percentage),
-                float(piece.cost_filament),
-                float(piece.cost_energy),
-                float(piece.cost_labour),
-                float(piece.cost_machine),
-                float(piece.cost_total),
-                float(piece.price_final),
-                float(piece.consumption_kwh),
-                created_at,
-                piece.user.get_username() if piece.user else "",
-            ]
+    ):
+        payload[key] = str(getattr(piece, key))
+    payload["filament_type"] = piece.filament_type_id
+    return payload
+
+
+@replica_read
+@login_required
+async def piece_export_view(request):
+    """Excel export of the user's pieces.
+
+    ``?since=<token>`` exports only the pieces created, updated or deleted
+    after the token, with a sheet of deleted ids. Live exports return the
+    token to pass next time in the ``X-Export-Token`` header.
+    """
+    user = await request.auser()
+    archived = request.GET.get("archived") == "1"
+    raw_since = request.GET.get("since", "").strip()
+    if raw_since and (archived or not raw_since.isdigit()):
+        return JsonResponse({"error": "Token de exportacao invalido."}, status=400)
+
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        messages.error(
+            request,
+            "Suporte a Excel indisponAvel (biblioteca openpyxl nAo instalada).",
         )
+        return redirect("pieces_list")
+
+    token = None
+    if raw_since:
+        changes = await sync_to_async(changes_since)(user, int(raw_since))
+        token = changes["token"]
+        rows = [
+            [piece.pk, *build_export_row(piece), export_datetime(piece.updated_at)]
+            async for piece in changes["pieces"].select_related("user").order_by("pk")
+        ]
+        tombstones = [
+            [pk, export_datetime(deleted_at)] async for pk, deleted_at in changes["tombstones"]
+        ]
+        build = partial(build_changes_workbook, tombstones=tombstones)
+        prefix = "peças_alteracoes"
+    else:
+        model = ArchivedPrintJob if archived else PrintJob
+        pieces = model.objects.select_related("user")
+        if not user.is_superuser:
+            pieces = pieces.filter(user=user)
+        if not archived:
+            # Read before the rows, so changes made meanwhile are in the next export.
+            token = await sync_to_async(latest_token)(user)
+        rows = [build_export_row(piece) async for piece in pieces]
+        build = build_export_workbook
+        prefix = "peças_arquivadas" if archived else "peças"
+    # openpyxl is CPU-bound and touches no database connection, so it can run
+    # outside the thread-sensitive executor and not block other requests.
+    content = await sync_to_async(build, thread_sensitive=False)(rows)
+    metrics_registry.inc("calculator_export_rows_total", len(rows))
+    metrics_registry.inc("calculator_export_bytes_total", len(content))
 
     response = HttpResponse(
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        content,
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     )
     timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
-    response["Content-Disposition"] = f'attachment; filename="peças_{timestamp}.xlsx"'
-
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    response.write(buffer.getvalue())
+    response["Content-Disposition"] = f'attachment; filename="{prefix}_{timestamp}.xlsx"'
+    if token is not None:
+        response["X-Export-Token"] = str(token)
     return response
 
 
+@replica_read
+@login_required
+async def piece_search_api_view(request):
+    user = await request.auser()
+    # Archived pieces live in their own table and are only searched on request.
+    archived = request.GET.get("archived") == "1"
+    queryset = ArchivedPrintJob.objects.all() if archived else PrintJob.objects.all()
+    if not user.is_superuser:
+        queryset = queryset.filter(user=user)
+
+    search_query = request.GET.get("search", "").strip()
+    if search_query:
+        filters = Q(name__icontains=search_query)
+        if search_query.isdigit():
+            filters |= Q(**{"original_id" if archived else "pk": int(search_query)})
+        queryset = queryset.filter(filters)
+
+    results = []
+    async for piece in queryset[:PIECE_SEARCH_API_LIMIT]:
+        summary = serialize_piece_summary(piece)
+        if archived:
+            summary["archived_at"] = piece.archived_at.isoformat()
+        results.append(summary)
+    return JsonResponse({"search": search_query, "archived": archived, "results": results})
+
+
+@replica_read
+@login_required
+async def piece_api_detail_view(request, pk: int):
+    user = await request.auser()
+    queryset = PrintJob.objects.filter(pk=pk)
+    if not user.is_superuser:
+        queryset = queryset.filter(user=user)
+    piece = await queryset.afirst()
+    if piece is None:
+        raise Http404("Peca nao encontrada.")
+    return JsonResponse(serialize_piece_detail(piece))
+
+
+@login_required
+async def task_status_api_view(request, pk: int):
+    user = await request.auser()
+    queryset = Task.objects.filter(pk=pk)
+    if not user.is_superuser:
+        queryset = queryset.filter(user=user)
+    task = await queryset.afirst()
+    if task is None:
+        raise Http404("Tarefa nao encontrada.")
+    return JsonResponse(serialize_task(task))
+
+
 @login_required
 def piece_import_view(request):
     form = PieceImportForm()
     errors: list[str] = []
     warnings: list[str] = []
     created = 0
+    new_pieces: list[PrintJob] = []
+    existing_names: set[str] | None = None
 
     numeric_fields = [
         "filament_price_per_kg",
@@ -932,16 +1348,20 @@ def piece_import_view(request):
     ]
 
     def process_payload(raw_payload, line_no):
-        nonlocal created, warnings
+        nonlocal existing_names, warnings
         cleaned = {
             "piece_name": (raw_payload.get("piece_name") or "").strip(),
         }
         piece_name = cleaned["piece_name"]
         if piece_name:
-            exists_qs = PrintJob.objects.filter(
-                user=request.user, name__iexact=piece_name
-            )
-            if exists_qs.exists():
+            if existing_names is None:
+                existing_names = {
+                    name.lower()
+                    for name in PrintJob.objects.filter(user=request.user)
+                    .exclude(name="")
+                    .values_list("name", flat=True)
+                }
+            if piece_name.lower() in existing_names:
                 warnings.append(f"Linha {line_no}: Já existe uma peça com este nome.")
                 return False
         for key in numeric_fields:
@@ -955,28 +1375,32 @@ def piece_import_view(request):
 
         result = calculate_print_job(cleaned)
 
-        PrintJob.objects.create(
-            user=request.user,
-            name=cleaned["piece_name"],
-            filament_price_per_kg=cleaned["filament_price_per_kg"],
-            filament_weight_g=cleaned["filament_weight_g"],
-            print_time_hours=cleaned["print_time_hours"],
-            labour_time_minutes=cleaned["labour_time_minutes"],
-            margin_percentage=cleaned["margin_percentage"],
-            cost_filament=result["cost_filament"],
-            cost_energy=result["cost_energy"],
-            cost_labour=result["cost_labour"],
-            cost_machine=result["cost_machine"],
-            cost_total=result["cost_total"],
-            price_final=result["price_final"],
-            consumption_kwh=result["consumption_kwh"],
+        if piece_name:
+            existing_names.add(piece_name.lower())
+        new_pieces.append(
+            PrintJob(
+                user=request.user,
+                name=cleaned["piece_name"],
+                filament_price_per_kg=cleaned["filament_price_per_kg"],
+                filament_weight_g=cleaned["filament_weight_g"],
+                print_time_hours=cleaned["print_time_hours"],
+                labour_time_minutes=cleaned["labour_time_minutes"],
+                margin_percentage=cleaned["margin_percentage"],
+                cost_filament=result["cost_filament"],
+                cost_energy=result["cost_energy"],
+                cost_labour=result["cost_labour"],
+                cost_machine=result["cost_machine"],
+                cost_total=result["cost_total"],
+                price_final=result["price_final"],
+                consumption_kwh=result["consumption_kwh"],
+            )
         )
-        created += 1
         return True
 
     if request.method == "POST":
         form = PieceImportForm(request.POST, request.FILES)
         if form.is_valid():
+            import_started = time.perf_counter()
             uploaded = form.cleaned_data["file"]
             ext = Path(uploaded.name or "").suffix.lower()
 
@@ -1030,6 +1454,13 @@ def piece_import_view(request):
                                         if not processed:
                                             continue
 
+            if new_pieces:
+                created = len(PrintJob.objects.bulk_create(new_pieces, batch_size=500))
+            metrics_registry.observe(
+                "calculator_import_duration_seconds",
+                time.perf_counter() - import_started,
+            )
+            metrics_registry.inc("calculator_import_rows_total", created)
             if created:
                 messages.success(
                     request,
@@ -1048,3 +1479,475 @@ def piece_import_view(request):
             "expected_columns": IMPORT_COLUMNS,
         },
     )
+
+
+def metrics_view(request):
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", [])
+    if allowed_ips and request.META.get("REMOTE_ADDR") not in allowed_ips:
+        return HttpResponseForbidden("Nao autorizado")
+    return HttpResponse(
+        metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def build_print_job(user, filament, name: str, values: dict) -> PrintJob:
+    """Price ``values`` with ``filament``'s current price; the caller saves it."""
+    values = {**values, "filament_price_per_kg": filament.price_per_kg}
+    result = calculate_print_job(values)
+    return PrintJob(
+        user=user,
+        name=name,
+        filament_type=filament,
+        filament_price_per_kg=values["filament_price_per_kg"],
+        filament_weight_g=values["filament_weight_g"],
+        print_time_hours=values["print_time_hours"],
+        labour_time_minutes=values["labour_time_minutes"],
+        margin_percentage=values["margin_percentage"],
+        **result,
+    )
+
+
+def model_quotes(model: dict) -> list[tuple[str, str, dict]]:
+    """Return ``(report label, piece name, analysis)`` for each plate of a model."""
+    stem = Path(model["name"]).stem
+    plates = model["analysis"].get("plates")
+    if plates is None:
+        return [(model["name"], stem[:100], model["analysis"])]
+    if len(plates) == 1:
+        return [(model["name"], stem[:100], plates[0])]
+    return [
+        (
+            f"{model['name']} (placa {plate['plate']})",
+            f"{stem[:90]} - placa {plate['plate']}",
+            plate,
+        )
+        for plate in plates
+    ]
+
+
+def quote_models(user, filament, models: list[dict], labour_time_minutes, margin_percentage):
+    """Turn analyzed model files into unsaved PrintJobs plus a per-file report.
+
+    Multi-plate 3MF projects give one piece, and one report row, per plate.
+    """
+    existing_names = {
+        name.lower()
+        for name in PrintJob.objects.filter(user=user)
+        .exclude(name="")
+        .values_list("name", flat=True)
+    }
+    pieces = []
+    report = []
+    for model in models:
+        cached = model.get("cached", False)
+        if "error" in model:
+            report.append(
+                {
+                    "file": model["name"],
+                    "cached": cached,
+                    "status": "error",
+                    "message": model["error"],
+                }
+            )
+            continue
+        for label, name, analysis in model_quotes(model):
+            row = {"file": label, "cached": cached}
+            report.append(row)
+            if name.lower() in existing_names:
+                row.update(status="skipped", message="Já existe uma peça com este nome.")
+                continue
+            measured = {
+                "filament_weight_g": analysis["filament_weight_g"],
+                "print_time_hours": analysis["print_time_hours"],
+            }
+            piece = fits_print_job_columns(measured) and build_print_job(
+                user,
+                filament,
+                name,
+                {
+                    **measured,
+                    "labour_time_minutes": labour_time_minutes,
+                    "margin_percentage": margin_percentage,
+                },
+            )
+            if not piece or not fits_print_job_columns(
+                {field: getattr(piece, field) for field in PRINT_RUN_VALUE_FIELDS}
+            ):
+                row.update(status="error", message="Valores demasiado grandes para uma peça.")
+                continue
+            existing_names.add(name.lower())
+            pieces.append(piece)
+            row.update(
+                status="created",
+                message="",
+                filament_weight_g=piece.filament_weight_g,
+                print_time_hours=piece.print_time_hours,
+                price_final=piece.price_final,
+            )
+    return pieces, report
+
+
+@login_required
+def piece_batch_quote_view(request):
+    form = BatchQuoteForm(user=request.user)
+    report: list[dict] = []
+    if request.method == "POST":
+        form = BatchQuoteForm(request.POST, request.FILES, user=request.user)
+        if form.is_valid():
+            filament = form.cleaned_data["filament_type"]
+            density = FILAMENT_DENSITY.get(filament.name, DEFAULT_FILAMENT_DENSITY)
+            with tempfile.TemporaryDirectory(prefix="batch-quote-") as directory:
+                try:
+                    models = extract_models(form.cleaned_data["archive"], Path(directory))
+                except ModelError as exc:
+                    form.add_error("archive", str(exc))
+                    models = []
+                else:
+                    if not models:
+                        form.add_error(
+                            "archive", "O arquivo nao contem ficheiros .gcode, .stl ou .3mf."
+                        )
+                    analyze_models(models, density)
+
+            if models:
+                pieces, report = quote_models(
+                    request.user,
+                    filament,
+                    models,
+                    form.cleaned_data["labour_time_minutes"],
+                    form.cleaned_data["margin_percentage"],
+                )
+                created = len(PrintJob.objects.bulk_create(pieces, batch_size=500))
+                if created:
+                    messages.success(request, f"Orçamentadas {created} peça(s).")
+
+    return render(
+        request,
+        "core/piece_batch_quote.html",
+        {"form": form, "report": report},
+    )
+
+
+def build_schedule_jobs(user, quantities: dict) -> tuple[list[Job], list[int]]:
+    """Jobs for the requested piece ids, or for the user's inventory when empty.
+
+    Returns the jobs and the requested ids that were not found.
+    """
+    if quantities:
+        pieces = PrintJob.objects.filter(pk__in=quantities)
+        if not user.is_superuser:
+            pieces = pieces.filter(user=user)
+        wanted = [(piece, quantities[piece.pk]) for piece in pieces.select_related("filament_type")]
+    else:
+        items = InventoryItem.objects.filter(user=user).select_related(
+            "print_job__filament_type"
+        )
+        wanted = [(item.print_job, item.quantity) for item in items]
+
+    jobs = [
+        Job(
+            key=piece.pk,
+            name=piece.name or f"Peca #{piece.pk}",
+            hours=float(piece.print_time_hours),
+            # Spools of the same type and colour need no changeover.
+            filament=get_filament_label(piece.filament_type) if piece.filament_type else None,
+            quantity=quantity,
+        )
+        for piece, quantity in wanted
+    ]
+    found = {job.key for job in jobs}
+    return jobs, sorted(pk for pk in quantities if pk not in found)
+
+
+def plan_print_schedule(request, form: ScheduleForm) -> dict | None:
+    """Run the scheduler for a bound form; returns None if the form has errors."""
+    if not form.is_valid():
+        return None
+    jobs, missing = build_schedule_jobs(request.user, form.cleaned_data["pieces"])
+    if missing:
+        form.add_error(
+            "pieces", f"Pecas nao encontradas: {', '.join(str(pk) for pk in missing)}."
+        )
+        return None
+    plan = schedule(
+        jobs,
+        form.cleaned_data["printers"],
+        float(form.cleaned_data["changeover_hours"]),
+    )
+    metrics_registry.inc("calculator_schedule_jobs_total", plan["jobs"])
+    return plan
+
+
+@login_required
+def print_schedule_view(request):
+    form = ScheduleForm()
+    plan = None
+    if request.method == "POST":
+        form = ScheduleForm(request.POST)
+        plan = plan_print_schedule(request, form)
+        if plan is not None and not plan["jobs"]:
+            messages.info(request, "Nao ha pecas para planear.")
+    return render(request, "core/print_schedule.html", {"form": form, "plan": plan})
+
+
+@login_required
+def print_schedule_api_view(request):
+    """Same plan as ``print_schedule_view``, from query parameters, as JSON."""
+    form = ScheduleForm(request.GET)
+    plan = plan_print_schedule(request, form)
+    if plan is None:
+        return JsonResponse({"errors": form.errors.get_json_data()}, status=400)
+    return JsonResponse(plan)
+
+
+PRINT_RUN_VALUE_FIELDS = [field.name for field in PrintJobValues._meta.concrete_fields]
+
+
+def allocate(total: Decimal, weights: list) -> list[Decimal]:
+    """Split ``total`` in proportion to ``weights`` into whole cents that add
+    up to exactly ``total`` (largest remainder method)."""
+    cents = int(total * 100)
+    weight_sum = sum(weights)
+    if not weight_sum:
+        weights, weight_sum = [1] * len(weights), len(weights)
+    exact = [Decimal(cents) * weight / weight_sum for weight in weights]
+    shares = [int(value) for value in exact]
+    by_remainder = sorted(range(len(weights)), key=lambda i: shares[i] - exact[i])
+    for index in by_remainder[: cents - sum(shares)]:
+        shares[index] += 1
+    return [Decimal(share) / 100 for share in shares]
+
+
+def price_print_run(run: PrintRun, items: list[PrintRunItem]) -> None:
+    """Price every item of ``run`` (all its units), sharing the run's time
+    and labour.
+
+    Print time (and with it energy and machine cost) is split by filament
+    weight, since heavier parts take longer on a shared plate; labour is
+    split by units. Both are allocated in whole cents that add up to the
+    run's values, so nothing is lost to rounding however many units there
+    are. Each item is then priced by ``calculate_print_job`` from its
+    allocated inputs, so its breakdown means the same as a piece's and can
+    be recomputed from its own fields. ``items`` need their ``print_job``
+    loaded.
+    """
+    hours = allocate(
+        run.print_time_hours,
+        [item.print_job.filament_weight_g * item.quantity for item in items],
+    )
+    minutes = allocate(run.labour_time_minutes, [item.quantity for item in items])
+    for item, item_hours, item_minutes in zip(items, hours, minutes):
+        piece = item.print_job
+        values = {
+            "filament_price_per_kg": piece.filament_price_per_kg,
+            "filament_weight_g": piece.filament_weight_g * item.quantity,
+            "print_time_hours": item_hours,
+            "labour_time_minutes": item_minutes,
+            "margin_percentage": piece.margin_percentage,
+        }
+        for name, value in {**values, **calculate_print_job(values)}.items():
+            setattr(item, name, value)
+
+
+def print_run_totals(items: list[PrintRunItem]) -> dict:
+    """Whole-run totals, and what the same pieces cost priced one by one."""
+    totals = {
+        name: sum((getattr(item, name) for item in items), Decimal("0"))
+        for name in ("cost_total", "price_final", "print_time_hours")
+    }
+    totals["units"] = sum(item.quantity for item in items)
+    totals["price_individual"] = sum(
+        (item.print_job.price_final * item.quantity for item in items), Decimal("0")
+    )
+    totals["saving"] = totals["price_individual"] - totals["price_final"]
+    return totals
+
+
+def user_print_runs(user):
+    runs = PrintRun.objects.all()
+    if not user.is_superuser:
+        runs = runs.filter(user=user)
+    return runs
+
+
+@login_required
+def print_run_list_view(request):
+    form = PrintRunForm()
+    if request.method == "POST":
+        form = PrintRunForm(request.POST)
+        if form.is_valid():
+            quantities = form.cleaned_data["pieces"]
+            pieces = PrintJob.objects.filter(pk__in=quantities)
+            if not request.user.is_superuser:
+                pieces = pieces.filter(user=request.user)
+            pieces = {piece.pk: piece for piece in pieces}
+            missing = sorted(pk for pk in quantities if pk not in pieces)
+            if missing:
+                form.add_error(
+                    "pieces",
+                    f"Pecas nao encontradas: {', '.join(str(pk) for pk in missing)}.",
+                )
+            else:
+                with transaction.atomic():
+                    run = PrintRun.objects.create(
+                        user=request.user,
+                        name=form.cleaned_data["name"],
+                        print_time_hours=form.cleaned_data["print_time_hours"],
+                        labour_time_minutes=form.cleaned_data["labour_time_minutes"],
+                    )
+                    items = [
+                        PrintRunItem(run=run, print_job=pieces[pk], quantity=quantity)
+                        for pk, quantity in quantities.items()
+                    ]
+                    price_print_run(run, items)
+                    PrintRunItem.objects.bulk_create(items)
+                messages.success(request, "Tiragem criada com sucesso.")
+                return redirect("print_run_detail", pk=run.pk)
+
+    runs = user_print_runs(request.user).annotate(
+        units=Sum("items__quantity"),
+        price_total=Sum("items__price_final"),
+    )
+    return render(request, "core/print_runs.html", {"form": form, "runs": runs})
+
+
+@login_required
+def print_run_detail_view(request, pk: int):
+    run = get_object_or_404(user_print_runs(request.user), pk=pk)
+    items = list(run.items.select_related("print_job").order_by("pk"))
+    if request.method == "POST" and request.POST.get("action") == "reprice":
+        # Pieces may have been edited since the run was priced.
+        price_print_run(run, items)
+        PrintRunItem.objects.bulk_update(items, PRINT_RUN_VALUE_FIELDS)
+        messages.success(request, "Tiragem recalculada com os valores atuais das peças.")
+        return redirect("print_run_detail", pk=run.pk)
+    return render(
+        request,
+        "core/print_run_detail.html",
+        {"run": run, "items": items, "totals": print_run_totals(items)},
+    )
+
+
+REPRICE_INPUTS = [
+    "filament_weight_g",
+    "print_time_hours",
+    "labour_time_minutes",
+    "margin_percentage",
+]
+
+# Pieces repriced between two progress updates of a ``pieces.reprice`` task.
+REPRICE_PROGRESS_EVERY = 500
+
+
+def parse_moment(value: str):
+    """End of the given YYYY-MM-DD day as an aware datetime, or None."""
+    try:
+        day = parse_date(value or "")
+    except ValueError:  # well formed but impossible, e.g. 2026-02-30
+        return None
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, day_time.max))
+
+
+def reprice_print_jobs(queryset, at=None):
+    """Yield ``(piece, result)``, pricing each piece with the filament price in
+    effect at ``at`` (or when the piece was created).
+
+    Prices are resolved for every piece by the same SQL statement; see
+    ``core.pricing``.
+    """
+    for piece in print_jobs_priced_at(queryset, at).iterator(chunk_size=2000):
+        # SQLite returns computed decimals unscaled.
+        piece.historical_price_per_kg = to_currency(piece.historical_price_per_kg)
+        values = {name: getattr(piece, name) for name in REPRICE_INPUTS}
+        values["filament_price_per_kg"] = piece.historical_price_per_kg
+        yield piece, calculate_print_job(values)
+
+
+def reprice_summary(user, at=None, search_query: str = "", progress=None) -> dict:
+    """Reprice the pieces visible to ``user`` (all of them for a superuser)
+    with the filament prices in effect at ``at``.
+
+    ``progress(done, total)`` is called every ``REPRICE_PROGRESS_EVERY``
+    pieces when given.
+    """
+    pieces = PrintJob.objects.all()
+    if not user.is_superuser:
+        pieces = pieces.filter(user=user)
+    if search_query:
+        pieces = pieces.filter(name__icontains=search_query)
+    total = pieces.count() if progress else 0
+
+    results = []
+    price_total = repriced_total = Decimal("0")
+    for piece, result in reprice_print_jobs(pieces.order_by("pk"), at):
+        price_total += piece.price_final
+        repriced_total += result["price_final"]
+        results.append(
+            {
+                "pk": piece.pk,
+                "name": piece.name or f"Peca #{piece.pk}",
+                "filament_price_per_kg": str(piece.filament_price_per_kg),
+                "historical_price_per_kg": str(piece.historical_price_per_kg),
+                "price_final": str(piece.price_final),
+                "repriced_price_final": str(result["price_final"]),
+            }
+        )
+        if progress and len(results) % REPRICE_PROGRESS_EVERY == 0:
+            progress(len(results), total)
+    return {
+        "at": at.isoformat() if at else None,
+        "count": len(results),
+        "price_final_total": str(price_total),
+        "repriced_price_final_total": str(repriced_total),
+        "results": results,
+    }
+
+
+@login_required
+def piece_reprice_api_view(request):
+    """Quotes repriced with past filament prices, e.g. ``?at=2026-07-01``.
+
+    GET answers right away. POST queues the same work as a background task
+    (``pieces.reprice``) and answers 202 with the task; its result is read
+    from ``task_status_api``.
+    """
+    params = request.POST if request.method == "POST" else request.GET
+    raw_at = params.get("at", "").strip()
+    at = parse_moment(raw_at)
+    if raw_at and at is None:
+        return JsonResponse({"error": "Data invalida, use AAAA-MM-DD."}, status=400)
+    search_query = params.get("search", "").strip()
+
+    if request.method == "POST":
+        task = enqueue(
+            "pieces.reprice", {"at": raw_at, "search": search_query}, user=request.user
+        )
+        return JsonResponse(
+            {
+                "task": serialize_task(task),
+                "status_url": reverse("task_status_api", args=[task.pk]),
+            },
+            status=202,
+        )
+    return JsonResponse(reprice_summary(request.user, at, search_query))
+
+
+@login_required
+def filament_price_history_api_view(request, pk: int):
+    filaments = FilamentType.objects.all()
+    if not request.user.is_superuser:
+        filaments = filaments.filter(user=request.user)
+    filament = get_object_or_404(filaments, pk=pk)
+    raw_start = request.GET.get("from", "").strip()
+    raw_end = request.GET.get("to", "").strip()
+    start = parse_moment(raw_start)
+    end = parse_moment(raw_end)
+    if (raw_start and start is None) or (raw_end and end is None):
+        return JsonResponse({"error": "Data invalida, use AAAA-MM-DD."}, status=400)
+    history = [
+        {"price_per_kg": str(row.price_per_kg), "effective_from": row.effective_from.isoformat()}
+        for row in price_history(filament, start, end)
+    ]
+    return JsonResponse({"filament": filament.pk, "history": history})